@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from itertools import count
+from pathlib import Path
+from time import perf_counter, time
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, MessageId, Update, User
+
+if __package__ in (None, ""):
+    sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from src.bootstrap import _build_dispatcher
+from src.bot.dispatcher import OrderedDispatcher
+from src.bot.routers.match import match_queue_tick
+from src.bot.utils.i18n import button_text
+from src.config import Config
+from src.db.database import Database
+
+BENCH_TOKEN = "42:BENCHMARK"
+BENCH_USER_ID_BASE = 1_000_000
+BENCH_LANG = "ru"
+DEFAULT_USERS = 2000
+DEFAULT_MESSAGES_PER_USER = 5
+DEFAULT_CONCURRENCY = 200
+DEFAULT_TICK_INTERVAL_SEC = 0.05
+DEFAULT_MATCH_TIMEOUT_SEC = 60.0
+POSTGRES_RESET_TABLES = (
+    "users",
+    "queue",
+    "pairs",
+    "pending_ratings",
+    "chat_feedback",
+    "reports",
+    "incidents",
+    "virtual_ab_sessions",
+    "virtual_dialog_memory",
+    "media_archive",
+    "app_settings",
+)
+
+
+class FakeSession(BaseSession):
+    # Answers every Bot API call locally so handlers run end to end without Telegram.
+    def __init__(self, latency_sec: float = 0.0) -> None:
+        super().__init__()
+        self.latency_sec = latency_sec
+        self.calls = 0
+        self._message_ids = count(1)
+
+    async def close(self) -> None:
+        return None
+
+    async def stream_content(self, url: str, headers=None, timeout: int = 30, chunk_size: int = 65536,
+                             raise_for_status: bool = True):  # pragma: no cover - not used by handlers
+        yield b""
+
+    async def make_request(self, bot: Bot, method: Any, timeout: int | None = None) -> Any:
+        self.calls += 1
+        if self.latency_sec > 0:
+            await asyncio.sleep(self.latency_sec)
+        content = json.dumps({"ok": True, "result": self._fake_result(method)})
+        return self.check_response(bot, method, 200, content).result
+
+    def _fake_result(self, method: Any) -> Any:
+        returning = getattr(method, "__returning__", None)
+        if returning is Message:
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time()),
+                "chat": {"id": int(getattr(method, "chat_id", 0) or 0), "type": "private"},
+            }
+        if returning is MessageId:
+            return {"message_id": next(self._message_ids)}
+        return True
+
+
+class StatementCounter:
+    # Counts statements that go through the Database query layer (fetchone/fetchall/execute).
+    def __init__(self, db: Database) -> None:
+        self.count = 0
+        for name in ("_fetchone_impl", "_fetchall_impl", "_execute_impl"):
+            setattr(db, name, self._wrap(getattr(db, name)))
+
+    def _wrap(self, method):
+        async def counted(*args: Any, **kwargs: Any) -> Any:
+            self.count += 1
+            return await method(*args, **kwargs)
+
+        return counted
+
+
+class PhaseStats:
+    def __init__(self, session: FakeSession, statements: StatementCounter) -> None:
+        self._session = session
+        self._statements = statements
+        self.updates = 0
+        self.latencies_ms: list[float] = []
+        self._started_at = 0.0
+        self._calls_at_start = 0
+        self._statements_at_start = 0
+        self.seconds = 0.0
+
+    def start(self) -> None:
+        self._started_at = perf_counter()
+        self._calls_at_start = self._session.calls
+        self._statements_at_start = self._statements.count
+
+    def stop(self) -> None:
+        self.seconds = perf_counter() - self._started_at
+        self.api_calls = self._session.calls - self._calls_at_start
+        self.statements = self._statements.count - self._statements_at_start
+
+    def summary(self) -> dict[str, Any]:
+        updates = max(self.updates, 1)
+        return {
+            "updates": self.updates,
+            "seconds": round(self.seconds, 4),
+            "updates_per_sec": round(self.updates / self.seconds, 2) if self.seconds else 0.0,
+            "latency_ms": percentiles(self.latencies_ms),
+            "db_statements_per_update": round(self.statements / updates, 3),
+            "api_calls_per_update": round(self.api_calls / updates, 3),
+        }
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+        return round(ordered[index], 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(ordered[-1], 3)}
+
+
+def _make_update(update_id: int, user_id: int, text: str) -> Update:
+    user = User(id=user_id, is_bot=False, first_name=f"bench{user_id}", language_code=BENCH_LANG)
+    message = Message(
+        message_id=update_id,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=user_id, type="private"),
+        from_user=user,
+        text=text,
+    )
+    return Update(update_id=update_id, message=message)
+
+
+def _bench_config(db_path: str) -> Config:
+    return Config(
+        token=BENCH_TOKEN,
+        admin_ids=[],
+        db_path=db_path,
+        redis_url=None,
+        promo_codes={},
+        trial_days=3,
+        telegram_proxy=None,
+        telegram_timeout_sec=60.0,
+        telegram_webhook_secret=None,
+        match_tick_interval_sec=0.0,
+    )
+
+
+async def _reset_postgres(dsn: str) -> None:
+    import asyncpg
+
+    connection = await asyncpg.connect(dsn)
+    try:
+        existing = {
+            row["table_name"]
+            for row in await connection.fetch(
+                "SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema()"
+            )
+        }
+        tables = [table for table in POSTGRES_RESET_TABLES if table in existing]
+        if tables:
+            await connection.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+    finally:
+        await connection.close()
+
+
+async def run_scenario(
+    db_path: str,
+    *,
+    users: int = DEFAULT_USERS,
+    messages_per_user: int = DEFAULT_MESSAGES_PER_USER,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    tick_interval_sec: float = DEFAULT_TICK_INTERVAL_SEC,
+    api_latency_sec: float = 0.0,
+    match_timeout_sec: float = DEFAULT_MATCH_TIMEOUT_SEC,
+) -> dict[str, Any]:
+    config = _bench_config(db_path)
+    db = Database(db_path)
+    await db.connect()
+    session = FakeSession(latency_sec=api_latency_sec)
+    bot = Bot(token=BENCH_TOKEN, session=session)
+    dp = _build_dispatcher(db=db, config=config)
+    statements = StatementCounter(db)
+    update_ids = count(1)
+    gate = asyncio.Semaphore(max(1, concurrency))
+
+    async def feed(user_id: int, text: str, stats: PhaseStats) -> None:
+        update = _make_update(next(update_ids), user_id, text)
+        async with gate:
+            started_at = perf_counter()
+            await dp.feed_update(bot, update)
+            stats.latencies_ms.append((perf_counter() - started_at) * 1000)
+            stats.updates += 1
+
+    try:
+        # Only human pairs are measured; virtual companions would hide the matcher.
+        await db.set_virtual_bot_enabled_count(0)
+        user_ids = [BENCH_USER_ID_BASE + index for index in range(users)]
+
+        search = PhaseStats(session, statements)
+        search_started_at: dict[int, float] = {}
+        find_text = button_text("find_partner", BENCH_LANG)
+        stop_ticks = asyncio.Event()
+
+        async def ticker() -> None:
+            while not stop_ticks.is_set():
+                await asyncio.sleep(tick_interval_sec)
+                await match_queue_tick(bot, db, config)
+
+        async def start_search(user_id: int) -> None:
+            search_started_at[user_id] = time()
+            await feed(user_id, find_text, search)
+
+        search.start()
+        tick_task = asyncio.create_task(ticker())
+        try:
+            await asyncio.gather(*(start_search(user_id) for user_id in user_ids))
+            deadline = perf_counter() + match_timeout_sec
+            while await db.get_match_queue_size() > 1 and perf_counter() < deadline:
+                await asyncio.sleep(tick_interval_sec)
+        finally:
+            stop_ticks.set()
+            await tick_task
+        search.stop()
+
+        pair_rows = await db.fetchall(
+            "SELECT id, user1_id, user2_id, started_at FROM pairs WHERE is_active = 1 AND user1_id >= ?",
+            (BENCH_USER_ID_BASE,),
+        )
+        pairs = [(int(row["user1_id"]), int(row["user2_id"])) for row in pair_rows]
+        time_to_match_ms: list[float] = []
+        for row in pair_rows:
+            matched_at = datetime.fromisoformat(row["started_at"]).timestamp()
+            for user_id in (int(row["user1_id"]), int(row["user2_id"])):
+                if user_id in search_started_at:
+                    time_to_match_ms.append(max(0.0, matched_at - search_started_at[user_id]) * 1000)
+
+        relay = PhaseStats(session, statements)
+        relay.start()
+
+        async def chat(user_id: int) -> None:
+            for index in range(messages_per_user):
+                await feed(user_id, f"bench message {index}", relay)
+
+        await asyncio.gather(*(chat(user_id) for pair in pairs for user_id in pair))
+        relay.stop()
+
+        end = PhaseStats(session, statements)
+        end.start()
+        end_text = button_text("end_dialog", BENCH_LANG)
+        skip_text = button_text("skip", BENCH_LANG)
+        await asyncio.gather(
+            *(
+                feed(user1_id, end_text if index % 2 == 0 else skip_text, end)
+                for index, (user1_id, _) in enumerate(pairs)
+            )
+        )
+        end.stop()
+
+        search_summary = search.summary()
+        search_summary.update(
+            {
+                "pairs": len(pairs),
+                "unmatched": users - 2 * len(pairs),
+                "matches_per_sec": round(len(pairs) / search.seconds, 2) if search.seconds else 0.0,
+                "time_to_match_ms": percentiles(time_to_match_ms),
+            }
+        )
+        return {
+            "users": users,
+            "messages_per_user": messages_per_user,
+            "concurrency": concurrency,
+            "api_latency_ms": round(api_latency_sec * 1000, 3),
+            "search": search_summary,
+            "relay": relay.summary(),
+            "end": end.summary(),
+        }
+    finally:
+        if isinstance(dp, OrderedDispatcher):
+            await dp.close_workers()
+        await db.close()
+        await dp.storage.close()
+        await bot.session.close()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Drive the bot routers with simulated users.")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS)
+    parser.add_argument("--messages", type=int, default=DEFAULT_MESSAGES_PER_USER)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--tick-interval", type=float, default=DEFAULT_TICK_INTERVAL_SEC)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=("sqlite", "postgres"),
+        help="Repeat to run several backends (default: sqlite, plus postgres when a DSN is set).",
+    )
+    parser.add_argument(
+        "--postgres-dsn",
+        default=os.getenv("BENCH_POSTGRES_DSN", ""),
+        help="Scratch database only: its bot tables are truncated before the run.",
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    return parser.parse_args(argv)
+
+
+async def _main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    backends = args.backend or (["sqlite", "postgres"] if args.postgres_dsn else ["sqlite"])
+    runs: list[dict[str, Any]] = []
+    for backend in backends:
+        options = {
+            "users": args.users,
+            "messages_per_user": args.messages,
+            "concurrency": args.concurrency,
+            "tick_interval_sec": args.tick_interval,
+            "api_latency_sec": args.api_latency_ms / 1000,
+        }
+        if backend == "postgres":
+            if not args.postgres_dsn:
+                raise SystemExit("--postgres-dsn (or BENCH_POSTGRES_DSN) is required for the postgres backend")
+            await _reset_postgres(args.postgres_dsn)
+            result = await run_scenario(args.postgres_dsn, **options)
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                result = await run_scenario(str(Path(tmp_dir) / "bench.db"), **options)
+        runs.append({"backend": backend, **result})
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "runs": runs,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
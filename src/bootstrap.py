@@ -5,11 +5,20 @@ from dataclasses import dataclass
 from aiogram import Bot, Dispatcher
 from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import TelegramMethod
 
+from .bot.dispatcher import OrderedDispatcher
+from .bot.middlewares.metrics import TelegramApiTimingMiddleware, install_dispatcher_metrics
+from .bot.middlewares.outbound import OutboundSchedulerMiddleware
+from .bot.middlewares.reachability import ReachabilityMiddleware
 from .bot.middlewares.user_context import UserContextMiddleware
 from .bot.routers import admin, chat, interests, match, premium, profile, reports, start
+from .bot.utils.broadcasts import BroadcastEngine
+from .bot.utils.outbound import OutboundScheduler
+from .bot.utils.update_queue import RedisUpdateQueue, UpdateQueue
 from .config import Config, load_config
 from .db.database import Database
+from .metrics import MetricsRegistry
 
 
 class ProxyConfigurationError(RuntimeError):
@@ -22,6 +31,10 @@ class AppContext:
     db: Database
     bot: Bot
     dp: Dispatcher
+    metrics: MetricsRegistry
+    outbound: OutboundScheduler | None = None
+    broadcasts: BroadcastEngine | None = None
+    updates: UpdateQueue | None = None
 
 
 _cached_context: AppContext | None = None
@@ -61,12 +74,97 @@ def _build_storage(config: Config):
     return storage, storage.create_isolation()
 
 
-def _build_dispatcher(db: Database, config: Config) -> Dispatcher:
+def _build_outbound_scheduler(config: Config, metrics: MetricsRegistry) -> OutboundScheduler | None:
+    if config.send_global_rate <= 0:
+        return None
+    return OutboundScheduler(
+        global_rate=config.send_global_rate,
+        chat_rate=config.send_chat_rate,
+        chat_burst=config.send_chat_burst,
+        lane_limit=config.send_queue_limit,
+        max_retries=config.send_max_retries,
+        metrics=metrics,
+    )
+
+
+def _build_update_queue(
+    config: Config,
+    bot: Bot,
+    dp: Dispatcher,
+    metrics: MetricsRegistry,
+) -> UpdateQueue | None:
+    if config.webhook_workers <= 0:
+        return None
+
+    async def process(payload: dict) -> None:
+        result = await dp.feed_raw_update(bot, payload)
+        if isinstance(result, TelegramMethod):
+            await dp.silent_call_request(bot=bot, result=result)
+
+    if not config.redis_url:
+        return UpdateQueue(process, workers=config.webhook_workers, limit=config.webhook_queue_limit, metrics=metrics)
+    try:
+        from redis.asyncio import Redis
+    except ModuleNotFoundError as exc:  # pragma: no cover - optional production dependency
+        raise RuntimeError(
+            "REDIS_URL is set, but redis dependencies are missing. Install requirements.txt."
+        ) from exc
+
+    return RedisUpdateQueue(
+        process,
+        Redis.from_url(config.redis_url),
+        workers=config.webhook_workers,
+        limit=config.webhook_queue_limit,
+        metrics=metrics,
+    )
+
+
+def _is_long_running(config: Config, polling: bool) -> bool:
+    # A serverless webhook freezes once the response is sent, so only long-running processes may
+    # leave work to background tasks.
+    return polling or config.webhook_workers > 0
+
+
+def _build_database(config: Config, metrics: MetricsRegistry, polling: bool) -> Database:
+    long_running = _is_long_running(config, polling)
+    return Database(
+        config.db_path,
+        sqlite_readers=config.sqlite_readers,
+        # Buffered touches would sit in a frozen instance, so serverless writes them through.
+        touch_flush_interval_sec=config.user_touch_flush_sec if long_running else 0.0,
+        group_commit_ms=config.sqlite_group_commit_ms,
+        group_commit_max_statements=config.sqlite_group_commit_max,
+        sqlite_synchronous=config.sqlite_synchronous,
+        statement_cache_size=config.postgres_statement_cache_size,
+        metrics=metrics,
+        slow_query_ms=config.slow_query_ms,
+        # Serverless rollups are driven by the scheduled stats endpoint instead.
+        stats_reconcile_sec=config.stats_reconcile_sec if long_running else 0.0,
+        stats_rollup_sec=config.stats_rollup_sec if long_running else 0.0,
+        # Only a polling process sees every update; webhook instances may run side by side.
+        local_caches=polling,
+    )
+
+
+def _build_dispatcher(db: Database, config: Config, metrics: MetricsRegistry | None = None) -> Dispatcher:
     storage, isolation = _build_storage(config)
-    dp = Dispatcher(storage=storage, events_isolation=isolation)
+    metrics = metrics or MetricsRegistry()
+    if config.dispatch_workers > 0:
+        dp = OrderedDispatcher(
+            workers=config.dispatch_workers,
+            queue_limit=config.dispatch_queue_limit,
+            metrics=metrics,
+            storage=storage,
+            events_isolation=isolation,
+        )
+    else:
+        dp = Dispatcher(storage=storage, events_isolation=isolation)
 
     dp["db"] = db
     dp["config"] = config
+    dp["metrics"] = metrics
+    if metrics.enabled:
+        install_dispatcher_metrics(dp, metrics)
     dp.update.outer_middleware(UserContextMiddleware(db))
 
     dp.include_router(admin.router)
@@ -81,19 +179,47 @@ def _build_dispatcher(db: Database, config: Config) -> Dispatcher:
     return dp
 
 
-async def create_app_context(config: Config | None = None) -> AppContext:
+async def create_app_context(config: Config | None = None, *, polling: bool = False) -> AppContext:
     configure_logging()
     config = config or load_config()
-
-    db = Database(config.db_path)
+    metrics = MetricsRegistry(enabled=config.metrics_enabled)
+    db = _build_database(config, metrics, polling)
     await db.connect()
 
     session = None
     try:
         session = _build_session(config)
+        outbound = _build_outbound_scheduler(config, metrics)
+        # Registered first = outermost, so API timings below exclude time spent queued.
+        if outbound is not None:
+            session.middleware(OutboundSchedulerMiddleware(outbound))
+        session.middleware(ReachabilityMiddleware(db))
+        if metrics.enabled:
+            session.middleware(TelegramApiTimingMiddleware(metrics))
         bot = Bot(token=config.token, session=session)
-        dp = _build_dispatcher(db=db, config=config)
-        return AppContext(config=config, db=db, bot=bot, dp=dp)
+        dp = _build_dispatcher(db=db, config=config, metrics=metrics)
+        # Without background tasks jobs advance only through the scheduled slice endpoint.
+        broadcasts = BroadcastEngine(
+            bot,
+            db,
+            workers=config.broadcast_workers,
+            background=_is_long_running(config, polling),
+        )
+        dp["broadcasts"] = broadcasts
+        if broadcasts.background:
+            # Jobs interrupted by a restart pick up from their last checkpoint.
+            await broadcasts.resume()
+        updates = _build_update_queue(config, bot, dp, metrics)
+        return AppContext(
+            config=config,
+            db=db,
+            bot=bot,
+            dp=dp,
+            metrics=metrics,
+            outbound=outbound,
+            broadcasts=broadcasts,
+            updates=updates,
+        )
     except Exception:
         if session is not None:
             await session.close()
@@ -123,6 +249,14 @@ async def shutdown_app_context(context: AppContext | None = None, reset_cached:
     if reset_cached and target is _cached_context:
         _cached_context = None
 
+    if target.updates is not None:
+        await target.updates.close()
+    if isinstance(target.dp, OrderedDispatcher):
+        await target.dp.close_workers()
+    if target.broadcasts is not None:
+        await target.broadcasts.close()
+    if target.outbound is not None:
+        await target.outbound.close()
     await target.db.close()
     await target.dp.storage.close()
     await target.bot.session.close()
@@ -1,3 +1,5 @@
+from collections.abc import Sequence
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from ..utils.i18n import tr
@@ -21,6 +23,7 @@ def admin_menu_keyboard(lang: str) -> InlineKeyboardMarkup:
         ],
         [InlineKeyboardButton(text=tr(lang, "🧪 A/B режимы", "🧪 A/B Modes"), callback_data="admin:ab_report")],
         [InlineKeyboardButton(text=tr(lang, "🧾 Жалобы", "🧾 Reports"), callback_data="admin:reports")],
+        [InlineKeyboardButton(text=tr(lang, "🐢 Медленные запросы", "🐢 Slow Queries"), callback_data="admin:slow_queries")],
         [InlineKeyboardButton(text=tr(lang, "📥 Экспорт CSV", "📥 Export CSV"), callback_data="admin:export_stats")],
         [
             InlineKeyboardButton(text=tr(lang, "🔒 Забанить", "🔒 Ban"), callback_data="admin:ban"),
@@ -156,9 +159,19 @@ def admin_promos_keyboard(lang: str) -> InlineKeyboardMarkup:
     )
 
 
-def admin_broadcasts_keyboard(lang: str) -> InlineKeyboardMarkup:
+def admin_broadcasts_keyboard(lang: str, running_ids: Sequence[int] = ()) -> InlineKeyboardMarkup:
+    cancel_rows = [
+        [
+            InlineKeyboardButton(
+                text=tr(lang, f"⛔ Остановить #{broadcast_id}", f"⛔ Stop #{broadcast_id}"),
+                callback_data=f"admin:broadcast_cancel:{broadcast_id}",
+            )
+        ]
+        for broadcast_id in running_ids
+    ]
     return InlineKeyboardMarkup(
         inline_keyboard=[
+            *cancel_rows,
             [
                 InlineKeyboardButton(
                     text=tr(lang, "📰 Новости", "📰 News"),
@@ -0,0 +1,96 @@
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from ...metrics import MetricsRegistry
+
+
+class UpdateTimingMiddleware(BaseMiddleware):
+    # Outer middleware on dp.update: wall time of the whole update, keyed by update type.
+    def __init__(self, metrics: MetricsRegistry) -> None:
+        super().__init__()
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started_at = perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.metrics.observe("update", _update_type(event), perf_counter() - started_at)
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    # Inner middleware: the matched handler is only known once filters have passed.
+    def __init__(self, metrics: MetricsRegistry) -> None:
+        super().__init__()
+        self.metrics = metrics
+        self._names: dict[Any, str] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started_at = perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.metrics.observe("handler", self._handler_name(data), perf_counter() - started_at)
+
+    def _handler_name(self, data: Dict[str, Any]) -> str:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        if callback is None:
+            return "unknown"
+        name = self._names.get(callback)
+        if name is None:
+            router_name = getattr(callback, "__module__", "").rsplit(".", 1)[-1]
+            name = f"{router_name}.{getattr(callback, '__name__', 'handler')}"
+            self._names[callback] = name
+        return name
+
+
+class TelegramApiTimingMiddleware(BaseRequestMiddleware):
+    def __init__(self, metrics: MetricsRegistry) -> None:
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        started_at = perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.metrics.observe("telegram_api", type(method).__name__, perf_counter() - started_at)
+
+
+def install_dispatcher_metrics(dp: Dispatcher, metrics: MetricsRegistry) -> None:
+    dp.update.outer_middleware(UpdateTimingMiddleware(metrics))
+    handler_timing = HandlerTimingMiddleware(metrics)
+    # Inner middlewares on the dispatcher apply to handlers of every included router.
+    for event_name, observer in dp.observers.items():
+        if event_name not in {"update", "error"}:
+            observer.middleware(handler_timing)
+
+
+def _update_type(event: TelegramObject) -> str:
+    if not isinstance(event, Update):
+        return type(event).__name__
+    try:
+        return event.event_type
+    except Exception:
+        return "unknown"
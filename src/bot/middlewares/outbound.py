@@ -0,0 +1,83 @@
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    CopyMessage,
+    CopyMessages,
+    ForwardMessage,
+    ForwardMessages,
+    SendAnimation,
+    SendAudio,
+    SendContact,
+    SendDice,
+    SendDocument,
+    SendInvoice,
+    SendLocation,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendPoll,
+    SendSticker,
+    SendVenue,
+    SendVideo,
+    SendVideoNote,
+    SendVoice,
+    TelegramMethod,
+)
+from aiogram.methods.base import TelegramType
+
+from ..utils.outbound import OutboundScheduler, current_send_lane
+
+# Methods that deliver a message to a chat and count against Telegram's flood limits.
+SCHEDULED_METHODS = (
+    CopyMessage,
+    CopyMessages,
+    ForwardMessage,
+    ForwardMessages,
+    SendAnimation,
+    SendAudio,
+    SendContact,
+    SendDice,
+    SendDocument,
+    SendInvoice,
+    SendLocation,
+    SendMediaGroup,
+    SendMessage,
+    SendPhoto,
+    SendPoll,
+    SendSticker,
+    SendVenue,
+    SendVideo,
+    SendVideoNote,
+    SendVoice,
+)
+
+
+class OutboundSchedulerMiddleware(BaseRequestMiddleware):
+    # Session middleware, so every bot.send_*/message.answer goes through the scheduler unchanged.
+    def __init__(self, scheduler: OutboundScheduler) -> None:
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        if not isinstance(method, SCHEDULED_METHODS):
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, "chat_id", None)
+        lane = current_send_lane()
+        attempt = 0
+        while True:
+            await self.scheduler.acquire(chat_id, lane)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                self.scheduler.retry_after(chat_id, exc.retry_after)
+                attempt += 1
+                if attempt > self.scheduler.max_retries:
+                    raise
@@ -0,0 +1,39 @@
+import logging
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from ...db.database import Database
+from .outbound import SCHEDULED_METHODS
+
+logger = logging.getLogger(__name__)
+
+
+class ReachabilityMiddleware(BaseRequestMiddleware):
+    # Any send that Telegram forbids (bot blocked, account deleted) marks the user unreachable,
+    # so broadcasts, active-user lists and the matcher stop selecting them.
+    def __init__(self, db: Database) -> None:
+        self.db = db
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        try:
+            return await make_request(bot, method)
+        except TelegramForbiddenError:
+            chat_id = getattr(method, "chat_id", None)
+            # Only private chats map to users; group ids are negative.
+            if isinstance(method, SCHEDULED_METHODS) and isinstance(chat_id, int) and chat_id > 0:
+                try:
+                    if await self.db.set_user_reachable(chat_id, False):
+                        logger.info("User %s is unreachable", chat_id)
+                except Exception:
+                    logger.exception("Failed to mark user %s unreachable", chat_id)
+            raise
@@ -18,7 +18,8 @@ class UserContextMiddleware(BaseMiddleware):
         data: Dict[str, Any],
     ) -> Any:
         user = self._resolve_user(event, data)
-        if user is not None:
+        # Blocking or unblocking the bot is not activity; the reachability handlers own that update.
+        if user is not None and getattr(event, "my_chat_member", None) is None:
             await self.db.touch_user_context(
                 user_id=user.id,
                 username=user.username or "",
@@ -1,4 +1,3 @@
-import asyncio
 import csv
 import io
 import secrets
@@ -17,7 +16,9 @@ from aiogram.types import (
 )
 
 from ...config import Config
-from ...db.database import Database
+from ...db.database import EXPORT_TABLES, Database
+from ...db.stats_rollups import ROLLUP_BUCKET_SECONDS, ROLLUP_CSV_COLUMNS, rollup_csv_row
+from ...metrics import MetricsRegistry
 from ..keyboards.admin_menu import (
     admin_ab_report_keyboard,
     admin_bot_settings_keyboard,
@@ -32,6 +33,7 @@ from ..keyboards.admin_menu import (
     report_action_keyboard,
 )
 from ..keyboards.report_menu import report_reason_label
+from ..utils.broadcasts import BroadcastEngine
 from ..utils.chat import (
     end_chat,
     safe_edit_message_reply_markup,
@@ -42,6 +44,7 @@ from ..utils.constants import (
     STATE_IDLE,
     premium_info_text,
 )
+from ..utils.exports import SpooledInputFile, gzip_csv_parts
 from ..utils.i18n import button_variants, normalize_lang, tr
 from ..utils.premium import add_premium_days
 from ..utils.users import format_until_text
@@ -59,6 +62,10 @@ MEDIA_PAGE_SIZE = 5
 USER_SEARCH_LIMIT = 8
 PROMO_LIST_LIMIT = 8
 BROADCAST_LIST_LIMIT = 6
+METRICS_TOP_LIMIT = 8
+SLOW_QUERY_TOP_LIMIT = 8
+SLOW_QUERY_PLAN_LIMIT = 3
+SLOW_QUERY_PLAN_MAX_LEN = 600
 
 class AdminStates(StatesGroup):
     waiting_ban_id = State()
@@ -91,6 +98,26 @@ def _parse_target_id(text: str) -> int | None:
         return None
 
 
+def _parse_export_range(parts: list[str]) -> tuple[int, int, str] | None:
+    # /export_stats FROM [TO] [hour|day]: UTC dates, TO inclusive and defaulting to today.
+    bucket = "day"
+    if parts and parts[-1].lower() in ROLLUP_BUCKET_SECONDS:
+        bucket = parts.pop().lower()
+    if not 1 <= len(parts) <= 2:
+        return None
+    try:
+        dates = [datetime.strptime(part, "%Y-%m-%d").replace(tzinfo=timezone.utc) for part in parts]
+    except ValueError:
+        return None
+    since = dates[0]
+    until = dates[1] if len(dates) > 1 else datetime.now(timezone.utc)
+    since_ts = int(since.timestamp())
+    until_ts = int(until.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()) + 86400
+    if until_ts <= since_ts:
+        return None
+    return since_ts, until_ts, bucket
+
+
 def _parse_positive_hours(text: str) -> int | None:
     try:
         value = int(text)
@@ -211,6 +238,51 @@ def _chunk_lines(lines: list[str], max_len: int = 3500) -> list[str]:
     return chunks
 
 
+def _metrics_lines(metrics: MetricsRegistry, families: list[str], lang: str) -> list[str]:
+    uptime_min = int((datetime.now(timezone.utc).timestamp() - metrics.started_at) // 60)
+    lines = [tr(lang, f"⏱ Метрики (за {uptime_min} мин)", f"⏱ Metrics (last {uptime_min} min)")]
+    for family in families:
+        lines.append("")
+        lines.append(f"[{family}]")
+        for name, _ in metrics.top(family, METRICS_TOP_LIMIT):
+            data = metrics.summary(family, name)
+            lines.append(
+                f"{_short_text(name, 60)}: n={data['count']} avg={data['avg_ms']}ms "
+                f"p95={data['p95_ms']}ms max={data['max_ms']}ms"
+            )
+    gauges = metrics.gauges()
+    if gauges:
+        lines.append("")
+        lines.append("[gauges]")
+        lines.extend(f"{name}: {value:g}" for name, value in sorted(gauges.items()))
+    return lines
+
+
+def _slow_queries_text(db: Database, lang: str) -> str:
+    log = db.slow_queries
+    if not log.enabled:
+        return tr(
+            lang,
+            "🐢 Лог медленных запросов выключен (SLOW_QUERY_MS).",
+            "🐢 Slow-query log is disabled (SLOW_QUERY_MS).",
+        )
+    lines = [tr(lang, f"🐢 Медленные запросы (≥ {log.threshold_ms:g} мс)", f"🐢 Slow queries (≥ {log.threshold_ms:g} ms)")]
+    totals = log.totals()
+    if not totals:
+        lines.append(tr(lang, "Пока нет.", "None yet."))
+        return "\n".join(lines)
+    for name, count, max_ms in totals[:SLOW_QUERY_TOP_LIMIT]:
+        lines.append(f"- {_short_text(name, 60)}: {count}× max {max_ms:g} ms")
+    for entry in log.entries()[:SLOW_QUERY_PLAN_LIMIT]:
+        lines.append("")
+        lines.append(f"{entry.name} · {entry.duration_ms:g} ms · {entry.param_shape} · {_format_dt(entry.occurred_at)}")
+        plan = entry.plan or tr(lang, "(план ещё собирается)", "(plan pending)")
+        if len(plan) > SLOW_QUERY_PLAN_MAX_LEN:
+            plan = plan[: SLOW_QUERY_PLAN_MAX_LEN - 1] + "…"
+        lines.append(plan)
+    return "\n".join(lines)
+
+
 def _short_text(value: str, max_len: int = 120) -> str:
     normalized = " ".join((value or "").split())
     if len(normalized) <= max_len:
@@ -292,6 +364,15 @@ def _promo_panel_text(rows, lang: str) -> str:
     return "\n".join(lines)
 
 
+def _broadcast_status_label(status: str, lang: str) -> str:
+    labels = {
+        "running": tr(lang, "⏳ идёт", "⏳ running"),
+        "done": tr(lang, "✅ готово", "✅ done"),
+        "cancelled": tr(lang, "⛔ остановлена", "⛔ stopped"),
+    }
+    return labels.get(status, status)
+
+
 def _broadcast_panel_text(rows, lang: str) -> str:
     lines = [
         tr(lang, "📣 Рассылка", "📣 Broadcast"),
@@ -303,8 +384,13 @@ def _broadcast_panel_text(rows, lang: str) -> str:
         ),
         tr(
             lang,
-            "После выбора бот попросит текст и отправит его выбранной аудитории.",
-            "After choosing, the bot will ask for text and send it to the selected audience.",
+            "После выбора бот попросит текст и отправит его выбранной аудитории в фоне.",
+            "After choosing, the bot will ask for text and send it to the selected audience in the background.",
+        ),
+        tr(
+            lang,
+            "Прогресс: доставлено/обработано/всего.",
+            "Progress: delivered/processed/total.",
         ),
         "",
         tr(lang, "Последние рассылки:", "Recent broadcasts:"),
@@ -315,9 +401,12 @@ def _broadcast_panel_text(rows, lang: str) -> str:
         return "\n".join(lines)
 
     for row in rows:
+        done_count = int(row["sent_count"]) + int(row["failed_count"])
+        total = str(row["total_count"]) if row["enumerated"] else f"{row['total_count']}+"
         lines.append(
             f"#{row['id']} | {_broadcast_audience_label(row['audience'], lang)} | "
-            f"{row['sent_count']}/{int(row['sent_count']) + int(row['failed_count'])} | "
+            f"{_broadcast_status_label(row['status'], lang)} | "
+            f"{row['sent_count']}/{done_count}/{total} | "
             f"{_format_dt(row['created_at'])}"
         )
         lines.append(f"   {_short_text(row['message'] or '', 90)}")
@@ -879,6 +968,23 @@ async def admin_stats(callback: CallbackQuery, db: Database, config: Config) ->
     await callback.answer()
 
 
+@router.callback_query(F.data == "admin:slow_queries")
+async def admin_slow_queries(callback: CallbackQuery, db: Database, config: Config) -> None:
+    lang = await db.get_lang(callback.from_user.id)
+    if not _is_admin(callback.from_user.id, config):
+        await callback.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."), show_alert=True)
+        return
+
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=tr(lang, "🔄 Обновить", "🔄 Refresh"), callback_data="admin:slow_queries")],
+            [InlineKeyboardButton(text=tr(lang, "↩️ В админ-панель", "↩️ Back to panel"), callback_data="admin:stats")],
+        ]
+    )
+    await safe_edit_message_text(callback.message, _slow_queries_text(db, lang), reply_markup=keyboard)
+    await callback.answer()
+
+
 @router.callback_query(F.data == "admin:export_stats")
 async def admin_export_stats(callback: CallbackQuery, db: Database, config: Config) -> None:
     lang = await db.get_lang(callback.from_user.id)
@@ -1404,13 +1510,49 @@ async def admin_broadcasts(callback: CallbackQuery, db: Database, config: Config
         await callback.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."), show_alert=True)
         return
 
+    await _show_broadcasts_panel(callback, db, lang)
+    await callback.answer()
+
+
+async def _show_broadcasts_panel(callback: CallbackQuery, db: Database, lang: str) -> None:
     rows = await db.get_recent_broadcasts(BROADCAST_LIST_LIMIT)
+    running_ids = [int(row["id"]) for row in rows if row["status"] == "running"]
     await safe_edit_message_text(
         callback.message,
         _broadcast_panel_text(rows, lang),
-        reply_markup=admin_broadcasts_keyboard(lang),
+        reply_markup=admin_broadcasts_keyboard(lang, running_ids),
+    )
+
+
+@router.callback_query(F.data.startswith("admin:broadcast_cancel:"))
+async def admin_broadcast_cancel(
+    callback: CallbackQuery,
+    db: Database,
+    config: Config,
+    broadcasts: BroadcastEngine | None = None,
+) -> None:
+    lang = await db.get_lang(callback.from_user.id)
+    if not _is_admin(callback.from_user.id, config):
+        await callback.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."), show_alert=True)
+        return
+
+    try:
+        broadcast_id = int((callback.data or "").split(":")[-1])
+    except ValueError:
+        await callback.answer()
+        return
+
+    # Another instance may own the job; it notices the status change after its current page.
+    if broadcasts is not None:
+        cancelled = await broadcasts.cancel(broadcast_id)
+    else:
+        cancelled = await db.finish_broadcast(broadcast_id, "cancelled")
+    await _show_broadcasts_panel(callback, db, lang)
+    await callback.answer(
+        tr(lang, f"Рассылка #{broadcast_id} остановлена.", f"Broadcast #{broadcast_id} stopped.")
+        if cancelled
+        else tr(lang, "Рассылка уже завершена.", "Broadcast has already finished.")
     )
-    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("admin:broadcast:"))
@@ -1442,7 +1584,11 @@ async def admin_broadcast_start(
 
 @router.message(AdminStates.waiting_broadcast_text)
 async def admin_broadcast_text_input(
-    message: Message, db: Database, state: FSMContext, config: Config
+    message: Message,
+    db: Database,
+    state: FSMContext,
+    config: Config,
+    broadcasts: BroadcastEngine | None = None,
 ) -> None:
     lang = await db.get_lang(message.from_user.id)
     if not _is_admin(message.from_user.id, config):
@@ -1464,38 +1610,19 @@ async def admin_broadcast_text_input(
         )
         return
 
-    user_ids = await db.get_broadcast_user_ids(audience)
-    sent_count = 0
-    failed_count = 0
-    for index, user_id in enumerate(user_ids, start=1):
-        if await safe_send_message(message.bot, user_id, text):
-            sent_count += 1
-        else:
-            failed_count += 1
-        if index % 25 == 0:
-            await asyncio.sleep(0.05)
-
-    await db.add_broadcast_log(
-        audience=audience,
-        message=text,
-        sent_count=sent_count,
-        failed_count=failed_count,
-        created_by=message.from_user.id,
-    )
-    await db.add_incident(
-        message.from_user.id,
-        None,
-        "broadcast",
-        f"{audience}|{sent_count}|{failed_count}",
-    )
+    broadcast_id = await db.create_broadcast(audience, text, message.from_user.id)
+    if broadcasts is not None:
+        broadcasts.start(broadcast_id)
     await state.clear()
     await message.answer(
         tr(
             lang,
-            f"📣 Рассылка завершена\nТип: {_broadcast_audience_label(audience, lang)}\nОтправлено: {sent_count}\nОшибок: {failed_count}",
-            f"📣 Broadcast completed\nType: {_broadcast_audience_label(audience, lang)}\nSent: {sent_count}\nFailed: {failed_count}",
+            f"📣 Рассылка #{broadcast_id} запущена\nТип: {_broadcast_audience_label(audience, lang)}\n"
+            "Прогресс — в разделе рассылок, итог придёт сообщением.",
+            f"📣 Broadcast #{broadcast_id} started\nType: {_broadcast_audience_label(audience, lang)}\n"
+            "Progress is shown in the broadcasts panel; you will get a summary when it completes.",
         ),
-        reply_markup=admin_broadcasts_keyboard(lang),
+        reply_markup=admin_broadcasts_keyboard(lang, [broadcast_id]),
     )
 
 
@@ -2185,6 +2312,105 @@ async def stats(message: Message, db: Database, config: Config) -> None:
     await message.answer(text)
 
 
+@router.message(Command("metrics"))
+async def metrics_command(
+    message: Message,
+    db: Database,
+    config: Config,
+    metrics: MetricsRegistry | None = None,
+) -> None:
+    lang = await db.get_lang(message.from_user.id)
+    if not _is_admin(message.from_user.id, config):
+        await message.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."))
+        return
+    if metrics is None or not metrics.enabled:
+        await message.answer(
+            tr(lang, "Метрики выключены (METRICS_ENABLED=1).", "Metrics are disabled (METRICS_ENABLED=1).")
+        )
+        return
+
+    parts = (message.text or "").split()
+    argument = parts[1].lower() if len(parts) > 1 else ""
+    if argument == "reset":
+        metrics.reset()
+        await message.answer(tr(lang, "Метрики сброшены.", "Metrics reset."))
+        return
+
+    families = [argument] if argument in metrics.families() else metrics.families()
+    if not families and not metrics.gauges():
+        await message.answer(tr(lang, "Пока нет данных.", "No data yet."))
+        return
+    for chunk in _chunk_lines(_metrics_lines(metrics, families, lang)):
+        await message.answer(chunk)
+
+
+@router.message(Command("stats_rebuild"))
+async def stats_rebuild(message: Message, db: Database, config: Config) -> None:
+    lang = await db.get_lang(message.from_user.id)
+    if not _is_admin(message.from_user.id, config):
+        await message.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."))
+        return
+
+    before = await db.get_stats_counters()
+    after = await db.rebuild_stats_counters()
+    drift = [f"- {name}: {before[name]} → {after[name]}" for name in after if before[name] != after[name]]
+    if not drift:
+        await message.answer(tr(lang, "Счётчики пересчитаны, расхождений нет.", "Counters rebuilt, no drift."))
+        return
+    await message.answer(
+        tr(lang, "Счётчики пересчитаны, исправлено:\n", "Counters rebuilt, corrected:\n") + "\n".join(drift)
+    )
+
+
+@router.message(Command("export"))
+async def export_table(message: Message, db: Database, config: Config) -> None:
+    lang = await db.get_lang(message.from_user.id)
+    if not _is_admin(message.from_user.id, config):
+        await message.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."))
+        return
+
+    parts = (message.text or "").split()
+    table = parts[1].lower() if len(parts) > 1 else ""
+    if table not in EXPORT_TABLES:
+        tables = "|".join(EXPORT_TABLES)
+        await message.answer(tr(lang, f"Формат: /export {tables}", f"Usage: /export {tables}"))
+        return
+
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M")
+    total_rows = 0
+    part_number = 0
+    # Rows stream page by page into gzip parts; only the part being uploaded is held at a time.
+    async for part in gzip_csv_parts(db.export_columns(table), db.iter_export_rows(table)):
+        part_number += 1
+        total_rows += part.rows
+        with part.file:
+            await message.answer_document(
+                SpooledInputFile(part.file, filename=f"{table}_{stamp}_part{part_number}.csv.gz")
+            )
+    await message.answer(
+        tr(
+            lang,
+            f"Экспорт {table}: {total_rows} строк, файлов: {part_number}.",
+            f"Export {table}: {total_rows} rows in {part_number} file(s).",
+        )
+    )
+
+
+async def _export_stats_rollups(message: Message, db: Database, since_ts: int, until_ts: int, bucket: str) -> None:
+    # Reads only the rollup table; the newest hours appear once the rollup job has closed them.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ROLLUP_CSV_COLUMNS)
+    async for row in db.iter_stats_rollups(bucket, since_ts, until_ts):
+        writer.writerow(rollup_csv_row(row, bucket))
+
+    since = datetime.fromtimestamp(since_ts, timezone.utc).date()
+    until = datetime.fromtimestamp(until_ts - 1, timezone.utc).date()
+    content = buffer.getvalue().encode("utf-8")
+    file = BufferedInputFile(content, filename=f"stats_{bucket}_{since}_{until}.csv")
+    await message.answer_document(file)
+
+
 @router.message(Command("export_stats"))
 async def export_stats(message: Message, db: Database, config: Config) -> None:
     lang = await db.get_lang(message.from_user.id)
@@ -2192,6 +2418,21 @@ async def export_stats(message: Message, db: Database, config: Config) -> None:
         await message.answer(tr(lang, "Недостаточно прав.", "Insufficient permissions."))
         return
 
+    parts = (message.text or "").split()[1:]
+    if parts:
+        export_range = _parse_export_range(parts)
+        if export_range is None:
+            await message.answer(
+                tr(
+                    lang,
+                    "Формат: /export_stats 2026-01-01 [2026-01-31] [hour|day]",
+                    "Usage: /export_stats 2026-01-01 [2026-01-31] [hour|day]",
+                )
+            )
+            return
+        await _export_stats_rollups(message, db, *export_range)
+        return
+
     data = await db.stats()
 
     buffer = io.StringIO()
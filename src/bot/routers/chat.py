@@ -18,6 +18,7 @@ from ..utils.chat import (
 from ..utils.content_filter import contains_blocked_content
 from ..utils.constants import SKIP_COOLDOWN_SECONDS, STATE_CHATTING, STATE_IDLE, STATE_SEARCHING
 from ..utils.i18n import any_button, tr
+from ..utils.outbound import LANE_RELAY, send_lane
 from ..utils.admin import is_admin
 from ..utils.users import (
     ensure_user,
@@ -479,6 +480,12 @@ def _filterable_text(message: Message) -> str:
 
 @router.message()
 async def relay_message(message: Message, db: Database, config: Config) -> None:
+    # Everything sent while relaying (partner delivery, virtual replies, notices) rides the top lane.
+    with send_lane(LANE_RELAY):
+        await _relay_message(message, db, config)
+
+
+async def _relay_message(message: Message, db: Database, config: Config) -> None:
     user_id = message.from_user.id
     await ensure_user(db, user_id)
     user = await get_user_snapshot(db, user_id)
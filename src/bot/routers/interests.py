@@ -17,7 +17,7 @@ from ..utils.interests import (
     parse_interests,
     serialize_interests,
 )
-from ..utils.premium import is_premium_until
+from ..utils.premium import is_premium_from_snapshot
 from ..utils.users import (
     ensure_user,
     get_lang_from_snapshot,
@@ -71,7 +71,7 @@ async def interests_menu(message: Message, db: Database, state: FSMContext, conf
 
     selected = set(parse_interests(user["interests"] or ""))
     only_interest = bool(user["only_interest"])
-    is_premium = is_premium_until(user["premium_until"] or "")
+    is_premium = is_premium_from_snapshot(user)
 
     await state.set_state(InterestStates.choosing)
     await state.update_data(
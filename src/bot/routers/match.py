@@ -1,23 +1,30 @@
-from datetime import datetime, timezone
+import asyncio
+import logging
+from dataclasses import dataclass
 
-from aiogram import F, Router
+from aiogram import Bot, F, Router
 from aiogram.types import Message
 
 from ...config import Config
 from ...db.database import Database
+from ...db.timestamps import seconds_since_epoch
 from ..keyboards.main_menu import main_menu_keyboard
 from ..keyboards.match_menu import searching_keyboard
 from ..utils.chat import end_chat, safe_send_message
 from ..utils.constants import (
-    MATCH_SOFT_EXPAND_SECONDS,
     STATE_CHATTING,
     STATE_IDLE,
     STATE_SEARCHING,
 )
 from ..utils.admin import is_admin
 from ..utils.i18n import any_button, tr
-from ..utils.interests import parse_interests
-from ..utils.premium import is_premium_until
+from ..utils.match_scoring import (
+    build_candidate_columns,
+    candidate_score,
+    needs_interest,
+    pick_candidate,
+)
+from ..utils.premium import is_premium_from_snapshot
 from ..utils.users import (
     ensure_user,
     get_lang_from_snapshot,
@@ -32,8 +39,23 @@ from ..utils.virtual_companions import (
     pick_virtual_companion,
     pick_virtual_variant,
 )
+from ..utils.weighted_matching import max_weight_matching
 
 router = Router()
+logger = logging.getLogger(__name__)
+
+# The exact batch plan is O(n^3) in pure Python; larger queues fall back to a greedy plan per tick.
+MATCH_EXACT_MAX_USERS = 96
+
+
+@dataclass(slots=True)
+class _MatchProfile:
+    user_id: int
+    interests_mask: int
+    is_premium: bool
+    only_interest: bool
+    wait_seconds: int
+    needs_interest: bool
 
 
 @router.message(
@@ -110,20 +132,22 @@ async def _attempt_match(message: Message, db: Database, config: Config, user_id
     if not user or (user["state"] or "") != STATE_SEARCHING:
         return False
 
-    raw_interests = (user["interests"] or "").strip()
-    user_interests = set(parse_interests(raw_interests))
-    premium_until = user["premium_until"] or ""
-    user_is_premium = is_premium_until(premium_until)
+    user_mask = int(user["interests_mask"] or 0)
+    user_is_premium = is_premium_from_snapshot(user)
     user_only_interest = bool(user["only_interest"]) and user_is_premium
-    user_wait_seconds = _seconds_since(user["joined_at"] or "")
+    user_wait_seconds = seconds_since_epoch(user["joined_at_ts"])
     user_lang = get_lang_from_snapshot(user)
 
-    candidates = await db.get_queue_candidates_limited(user_id)
-    candidate_id = _pick_candidate(
-        user_interests=user_interests,
+    candidates = await db.get_match_candidates(
+        user_id,
+        user_mask,
+        overlap_only=needs_interest(user_mask, user_only_interest, user_wait_seconds),
+    )
+    candidate_id = pick_candidate(
+        build_candidate_columns(candidates),
+        user_mask=user_mask,
         user_only=user_only_interest,
         user_wait_seconds=user_wait_seconds,
-        candidates=candidates,
     )
 
     matched_virtual_id: int | None = None
@@ -131,7 +155,7 @@ async def _attempt_match(message: Message, db: Database, config: Config, user_id
     ab_settings: dict[str, list[str]] | None = None
     if candidate_id is None:
         bot_settings = await db.get_virtual_bot_settings()
-        queue_size = await db.get_queue_size()
+        queue_size = await db.get_match_queue_size()
         if queue_size > int(bot_settings["queue_threshold"]):
             return False
         ab_settings = await db.get_virtual_ab_settings()
@@ -206,10 +230,20 @@ async def _attempt_match(message: Message, db: Database, config: Config, user_id
         await db.add_incident(user_id, matched_virtual_id, "virtual_match", variant_key)
         return True
 
-    candidate = await db.get_user_snapshot(candidate_id)
-    candidate_lang = get_lang_from_snapshot(candidate)
+    return await _announce_human_match(message.bot, db, config, user_id, candidate_id)
+
+
+async def _announce_human_match(
+    bot: Bot,
+    db: Database,
+    config: Config,
+    user_id: int,
+    candidate_id: int,
+) -> bool:
+    user_lang = await db.get_lang(user_id)
+    candidate_lang = await db.get_lang(candidate_id)
     sent_user = await safe_send_message(
-        message.bot,
+        bot,
         user_id,
         tr(
             user_lang,
@@ -223,7 +257,7 @@ async def _attempt_match(message: Message, db: Database, config: Config, user_id
         ),
     )
     sent_candidate = await safe_send_message(
-        message.bot,
+        bot,
         candidate_id,
         tr(
             candidate_lang,
@@ -240,7 +274,7 @@ async def _attempt_match(message: Message, db: Database, config: Config, user_id
     if not sent_user or not sent_candidate:
         await end_chat(
             db,
-            message.bot,
+            bot,
             user_id if sent_user else candidate_id,
             collect_feedback=False,
             reason_ru="Собеседник недоступен. Попробуйте еще раз.",
@@ -253,92 +287,142 @@ async def _attempt_match(message: Message, db: Database, config: Config, user_id
     return True
 
 
-def _pick_candidate(
-    user_interests: set[str],
-    user_only: bool,
-    user_wait_seconds: int,
-    candidates,
-) -> int | None:
-    if user_only and not user_interests:
-        return None
-
-    user_needs_interest = user_only or (
-        bool(user_interests) and user_wait_seconds < MATCH_SOFT_EXPAND_SECONDS
+def _match_profile(row) -> _MatchProfile:
+    mask = int(row["interests_mask"] or 0)
+    is_premium = is_premium_from_snapshot(row)
+    only_interest = bool(row["only_interest"]) and is_premium
+    wait_seconds = seconds_since_epoch(row["joined_at_ts"])
+    return _MatchProfile(
+        user_id=int(row["user_id"]),
+        interests_mask=mask,
+        is_premium=is_premium,
+        only_interest=only_interest,
+        wait_seconds=wait_seconds,
+        needs_interest=needs_interest(mask, only_interest, wait_seconds),
     )
 
-    best_candidate_id: int | None = None
-    best_score: int | None = None
-
-    for row in candidates:
-        candidate_id = int(row["user_id"])
-        cand_interests = set(parse_interests(row["interests"] or ""))
-        cand_premium = is_premium_until(row["premium_until"] or "")
-        cand_only = bool(row["only_interest"]) and cand_premium
-        cand_wait_seconds = _seconds_since(row["joined_at"] or "")
-        cand_needs_interest = cand_only or (
-            bool(cand_interests) and cand_wait_seconds < MATCH_SOFT_EXPAND_SECONDS
-        )
-        has_overlap = _has_intersection(user_interests, cand_interests)
-        seen_before = bool(row["seen_before"])
 
-        if not has_overlap and (user_needs_interest or cand_needs_interest):
-            continue
+def _candidate_score(candidate: _MatchProfile, *, has_overlap: bool, seen_before: bool) -> int:
+    return candidate_score(
+        has_overlap=has_overlap,
+        seen_before=seen_before,
+        is_premium=candidate.is_premium,
+        wait_seconds=candidate.wait_seconds,
+    )
 
-        score = 0
-        if has_overlap:
-            score += 40
-        if not seen_before:
-            score += 80
-        if cand_premium:
-            score += 5
-        score += min(cand_wait_seconds, 180) // 15
 
-        if best_score is None or score > best_score:
-            best_score = score
-            best_candidate_id = candidate_id
+def _directional_score(
+    user: _MatchProfile,
+    candidate: _MatchProfile,
+    *,
+    seen_before: bool,
+) -> tuple[int, int] | None:
+    # (tier, score): tier 1 is a regular `pick_candidate` hit, tier 0 its last-resort fallback.
+    if user.only_interest and not user.interests_mask:
+        return None
+    has_overlap = (user.interests_mask & candidate.interests_mask) != 0
+    if has_overlap or not (user.needs_interest or candidate.needs_interest):
+        return 1, _candidate_score(candidate, has_overlap=has_overlap, seen_before=seen_before)
+    if not user.needs_interest and not candidate.only_interest:
+        return 0, 0 if seen_before else 1
+    return None
 
-    if best_candidate_id is not None:
-        return best_candidate_id
 
-    if user_needs_interest:
-        return None
+def _plan_batch_matches(batch) -> list[tuple[int, int]]:
+    profiles: dict[int, _MatchProfile] = {}
+    order: dict[int, int] = {}
+    for index, (user_row, _) in enumerate(batch):
+        profile = _match_profile(user_row)
+        profiles[profile.user_id] = profile
+        order[profile.user_id] = index
+
+    edges: dict[tuple[int, int], tuple[int, int]] = {}
+    for user_row, candidate_rows in batch:
+        user = profiles[int(user_row["user_id"])]
+        for row in candidate_rows:
+            candidate = profiles.get(int(row["user_id"]))
+            if candidate is None:
+                continue
+            key = (user.user_id, candidate.user_id)
+            if order[candidate.user_id] < order[user.user_id]:
+                key = (candidate.user_id, user.user_id)
+            if key in edges:
+                continue
+            seen_before = bool(row["seen_before"])
+            forward = _directional_score(user, candidate, seen_before=seen_before)
+            backward = _directional_score(candidate, user, seen_before=seen_before)
+            scored = [item for item in (forward, backward) if item is not None]
+            if not scored:
+                continue
+            tier = max(item[0] for item in scored)
+            edges[key] = (tier, sum(item[1] for item in scored if item[0] == tier))
+
+    if not edges:
+        return []
+    if len(profiles) <= MATCH_EXACT_MAX_USERS:
+        return _exact_plan(edges, order)
+    return _greedy_plan(edges, order)
+
+
+def _exact_plan(edges: dict[tuple[int, int], tuple[int, int]], order: dict[int, int]) -> list[tuple[int, int]]:
+    # Maximum-weight matching on (tier, score) edges. Each edge weighs score + 1 plus a tier bonus
+    # larger than any matching's total of those, so the plan maximises the number of tier-1 pairs
+    # first and the total score (one extra point per pair) second.
+    bonus = (len(order) // 2 + 1) * (max(score for _, score in edges.values()) + 1) + 1
+    user_ids = sorted(order, key=order.__getitem__)
+    mate = max_weight_matching(
+        [
+            (order[user_id], order[partner_id], tier * bonus + score + 1)
+            for (user_id, partner_id), (tier, score) in edges.items()
+        ]
+    )
+    return [(user_ids[index], user_ids[partner]) for index, partner in enumerate(mate) if index < partner]
+
 
-    fallback_fresh: list[int] = []
-    fallback_repeat: list[int] = []
-    for row in candidates:
-        candidate_id = int(row["user_id"])
-        cand_premium = is_premium_until(row["premium_until"] or "")
-        cand_only = bool(row["only_interest"]) and cand_premium
-        if cand_only:
+def _greedy_plan(edges: dict[tuple[int, int], tuple[int, int]], order: dict[int, int]) -> list[tuple[int, int]]:
+    # Too large to solve exactly within a tick: the best remaining pair is taken first (older
+    # searchers win ties), which can reach as little as half the best total.
+    ranked = sorted(
+        edges.items(),
+        key=lambda item: (item[1][0], item[1][1], -order[item[0][0]], -order[item[0][1]]),
+        reverse=True,
+    )
+    matched: set[int] = set()
+    plan: list[tuple[int, int]] = []
+    for (user_id, partner_id), _ in ranked:
+        if user_id in matched or partner_id in matched:
             continue
-        if bool(row["seen_before"]):
-            fallback_repeat.append(candidate_id)
-        else:
-            fallback_fresh.append(candidate_id)
+        matched.update((user_id, partner_id))
+        plan.append((user_id, partner_id))
+    return plan
 
-    if fallback_fresh:
-        return fallback_fresh[0]
-    if fallback_repeat:
-        return fallback_repeat[0]
 
-    return None
+async def match_queue_tick(bot: Bot, db: Database, config: Config) -> int:
+    plan = _plan_batch_matches(await db.get_match_batch())
+    if not plan:
+        return 0
+    results = await db.finalize_matches(plan)
+    committed = [pair for pair, result in zip(plan, results) if result is not None]
+    announced = await asyncio.gather(
+        *(_announce_human_match(bot, db, config, user_id, partner_id) for user_id, partner_id in committed)
+    )
+    return sum(1 for ok in announced if ok)
 
 
-def _has_intersection(a: set[str], b: set[str]) -> bool:
-    if not a or not b:
-        return False
-    return not a.isdisjoint(b)
+async def run_batch_matcher(bot: Bot, db: Database, config: Config) -> None:
+    while True:
+        await asyncio.sleep(config.match_tick_interval_sec)
+        try:
+            await match_queue_tick(bot, db, config)
+        except Exception:
+            logger.exception("Batch matching tick failed")
 
 
 async def _search_status_text(db: Database, user_id: int, lang: str) -> str:
     snapshot = await db.get_search_status_snapshot(user_id)
     position = int(snapshot["position"]) if snapshot else 0
     queue_size = int(snapshot["queue_size"]) if snapshot else 0
-    raw_interests = (snapshot["interests"] or "").strip() if snapshot else ""
-    premium_until = (snapshot["premium_until"] or "") if snapshot else ""
-    is_premium = is_premium_until(premium_until)
-    only_interest = bool(snapshot["only_interest"]) and is_premium if snapshot else False
-    eta_seconds = _estimate_wait_seconds(position, bool(raw_interests), only_interest)
+    eta_seconds = snapshot["eta_seconds"] if snapshot else None
 
     if position <= 0:
         return tr(
@@ -347,31 +431,23 @@ async def _search_status_text(db: Database, user_id: int, lang: str) -> str:
             "Refresh search if no partner is found for a long time.",
         )
 
+    if eta_seconds is None:
+        eta_text = tr(lang, "оцениваем…", "estimating…", "оцінюємо…", "wird geschätzt…")
+    else:
+        eta_text = _format_eta(eta_seconds, lang)
     return tr(
         lang,
         (
             f"Позиция в очереди: {position}/{max(queue_size, position)}\n"
-            f"Ориентировочное ожидание: {_format_eta(eta_seconds, lang)}"
+            f"Ориентировочное ожидание: {eta_text}"
         ),
         (
             f"Queue position: {position}/{max(queue_size, position)}\n"
-            f"Estimated wait: {_format_eta(eta_seconds, lang)}"
+            f"Estimated wait: {eta_text}"
         ),
     )
 
 
-def _estimate_wait_seconds(position: int, has_interest: bool, only_interest: bool) -> int:
-    if position <= 1:
-        base = 15
-    else:
-        base = 15 + (position - 1) * 18
-    if has_interest:
-        base += 12
-    if only_interest:
-        base += 24
-    return min(base, 6 * 60)
-
-
 def _format_eta(seconds: int, lang: str) -> str:
     if seconds < 60:
         return tr(lang, f"~{seconds} сек", f"~{seconds} sec", f"~{seconds} с", f"~{seconds} Sek.")
@@ -379,21 +455,6 @@ def _format_eta(seconds: int, lang: str) -> str:
     return tr(lang, f"~{minutes} мин", f"~{minutes} min", f"~{minutes} хв", f"~{minutes} Min.")
 
 
-def _seconds_since(raw_iso: str) -> int:
-    if not raw_iso:
-        return 0
-    try:
-        dt = datetime.fromisoformat(raw_iso)
-    except ValueError:
-        return 0
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    now = datetime.now(timezone.utc)
-    if dt >= now:
-        return 0
-    return int((now - dt).total_seconds())
-
-
 @router.message(F.text.in_(any_button("cancel_search")))
 async def cancel_search(message: Message, db: Database, config: Config) -> None:
     user_id = message.from_user.id
@@ -10,7 +10,7 @@ from ..utils.chat import safe_edit_message_reply_markup, safe_edit_message_text
 from ..utils.i18n import button_variants, tr, yes_no
 from ..utils.admin import is_admin
 from ..utils.interests import format_interest_list, parse_interests
-from ..utils.premium import format_premium_until, is_premium_until
+from ..utils.premium import format_premium_until, is_premium_from_snapshot
 from ..utils.users import (
     ensure_user,
     format_until_text,
@@ -56,7 +56,7 @@ async def my_profile(message: Message, db: Database, config: Config) -> None:
     interests = parse_interests(user["interests"] or "")
     interest_text = format_interest_list(interests, lang)
     premium_until = user["premium_until"] or ""
-    premium_active = is_premium_until(premium_until)
+    premium_active = is_premium_from_snapshot(user)
     premium_line = tr(lang, "⭐ Premium", "⭐ Premium") if premium_active else tr(
         lang, "Обычный", "Standard"
     )
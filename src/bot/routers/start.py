@@ -1,6 +1,6 @@
 from aiogram import F, Router
-from aiogram.filters import CommandStart
-from aiogram.types import Message
+from aiogram.filters import KICKED, MEMBER, ChatMemberUpdatedFilter, CommandStart
+from aiogram.types import ChatMemberUpdated, Message
 
 from ...config import Config
 from ...db.database import Database
@@ -24,6 +24,9 @@ async def _send_main_menu(message: Message, db: Database, config: Config) -> Non
     await ensure_user(db, user_id)
     user = await get_user_snapshot(db, user_id)
     lang = get_lang_from_snapshot(user)
+    # Touches are batched and never restore reachability, so a returning user is re-enabled here.
+    if user and not user["reachable"]:
+        await db.set_user_reachable(user_id, True)
 
     if is_banned_from_snapshot(user):
         await message.answer(
@@ -64,3 +67,13 @@ async def start_handler(message: Message, db: Database, config: Config) -> None:
 @router.message(F.text.in_(button_variants("menu")))
 async def menu_handler(message: Message, db: Database, config: Config) -> None:
     await _send_main_menu(message, db, config)
+
+
+@router.my_chat_member(F.chat.type == "private", ChatMemberUpdatedFilter(member_status_changed=KICKED))
+async def bot_blocked_handler(event: ChatMemberUpdated, db: Database) -> None:
+    await db.set_user_reachable(event.from_user.id, False)
+
+
+@router.my_chat_member(F.chat.type == "private", ChatMemberUpdatedFilter(member_status_changed=MEMBER))
+async def bot_unblocked_handler(event: ChatMemberUpdated, db: Database) -> None:
+    await db.set_user_reachable(event.from_user.id, True)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import secrets
+import socket
+from time import monotonic
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from ...db.database import Database
+from .chat import safe_send_message
+from .i18n import tr
+from .outbound import LANE_BROADCAST, send_lane
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROADCAST_WORKERS = 8
+BROADCAST_PAGE_SIZE = 500
+# Results are checkpointed in batches; after a crash at most this many recipients are sent twice.
+BROADCAST_FLUSH_SIZE = 50
+BROADCAST_LEASE_SEC = 120
+BROADCAST_RETRY_DELAY_SEC = 5.0
+DEFAULT_BROADCAST_SLICE_SEC = 8.0
+# Transient failures leave the recipient pending so a later pass (or a restart) retries it.
+TRANSIENT_SEND_ERRORS = (TelegramNetworkError, TelegramRetryAfter, TelegramServerError)
+
+
+class BroadcastEngine:
+    # One background task per running job; progress lives in broadcasts/broadcast_deliveries.
+    # Without background tasks (serverless webhooks freeze work after the response) jobs only
+    # advance through run_slice, called from a scheduled request.
+    def __init__(
+        self,
+        bot: Bot,
+        db: Database,
+        *,
+        workers: int = DEFAULT_BROADCAST_WORKERS,
+        page_size: int = BROADCAST_PAGE_SIZE,
+        flush_size: int = BROADCAST_FLUSH_SIZE,
+        lease_sec: int = BROADCAST_LEASE_SEC,
+        background: bool = True,
+    ) -> None:
+        self.bot = bot
+        self.db = db
+        self.workers = max(1, workers)
+        self.page_size = max(1, page_size)
+        self.flush_size = max(1, flush_size)
+        self.lease_sec = max(1, lease_sec)
+        self.background = background
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def start(self, broadcast_id: int) -> None:
+        if not self.background or self.is_running(broadcast_id):
+            return
+        task = asyncio.create_task(self._run(broadcast_id))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def resume(self) -> list[int]:
+        broadcast_ids = await self.db.get_running_broadcast_ids()
+        for broadcast_id in broadcast_ids:
+            self.start(broadcast_id)
+        return broadcast_ids
+
+    async def run_slice(self, budget_sec: float = DEFAULT_BROADCAST_SLICE_SEC) -> int:
+        # Advances every running job for at most budget_sec, then drops the leases so the next
+        # slice (on any instance) carries on. Returns how many jobs are still running.
+        deadline = monotonic() + max(0.0, budget_sec)
+        for broadcast_id in await self.db.get_running_broadcast_ids():
+            if monotonic() >= deadline:
+                break
+            try:
+                await self._deliver(broadcast_id, deadline)
+            except Exception:
+                logger.exception("Broadcast #%s slice failed; the next slice retries it", broadcast_id)
+            finally:
+                await self.db.release_broadcast(broadcast_id, self.owner)
+        return len(await self.db.get_running_broadcast_ids())
+
+    def is_running(self, broadcast_id: int) -> bool:
+        task = self._tasks.get(broadcast_id)
+        return task is not None and not task.done()
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        cancelled = await self.db.finish_broadcast(broadcast_id, "cancelled")
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+        return cancelled
+
+    async def close(self) -> None:
+        # Jobs stay 'running' and the lease is dropped, so any instance resumes them from the checkpoint.
+        running = dict(self._tasks)
+        for task in running.values():
+            task.cancel()
+        if running:
+            await asyncio.gather(*running.values(), return_exceptions=True)
+        for broadcast_id in running:
+            await self.db.release_broadcast(broadcast_id, self.owner)
+
+    async def _run(self, broadcast_id: int) -> None:
+        try:
+            await self._deliver(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Broadcast #%s stopped; it resumes from its checkpoint on restart", broadcast_id)
+
+    async def _deliver(self, broadcast_id: int, deadline: float | None = None) -> None:
+        if not await self.db.claim_broadcast(broadcast_id, self.owner, self.lease_sec):
+            return
+        with send_lane(LANE_BROADCAST):
+            while True:
+                job = await self.db.get_broadcast(broadcast_id)
+                if not job or job["status"] != "running":
+                    return
+                if deadline is not None and monotonic() >= deadline:
+                    return
+                recipients = await self.db.get_pending_broadcast_recipients(broadcast_id, self.page_size)
+                if recipients:
+                    stalled = await self._send_page(broadcast_id, job["message"], recipients, deadline)
+                    if stalled and deadline is not None:
+                        # A slice does not wait out transient errors; the next slice retries.
+                        return
+                    if stalled:
+                        await asyncio.sleep(BROADCAST_RETRY_DELAY_SEC)
+                elif job["enumerated"]:
+                    break
+                else:
+                    await self.db.enqueue_broadcast_recipients(
+                        broadcast_id,
+                        job["audience"],
+                        int(job["cursor_user_id"]),
+                        self.page_size,
+                    )
+                if not await self.db.claim_broadcast(broadcast_id, self.owner, self.lease_sec):
+                    return
+        if await self.db.finish_broadcast(broadcast_id, "done"):
+            await self._report_done(broadcast_id)
+
+    async def _send_page(
+        self,
+        broadcast_id: int,
+        text: str,
+        recipients: list[int],
+        deadline: float | None = None,
+    ) -> bool:
+        # Returns True when a transient error left some recipients pending.
+        pending = iter(recipients)
+        results: list[tuple[int, bool]] = []
+        stalled = False
+
+        async def worker() -> None:
+            nonlocal stalled
+            # The shared iterator hands each recipient to exactly one worker.
+            for user_id in pending:
+                # Recipients not reached before the deadline simply stay pending.
+                if deadline is not None and monotonic() >= deadline:
+                    return
+                try:
+                    delivered = await safe_send_message(self.bot, user_id, text)
+                except TRANSIENT_SEND_ERRORS as exc:
+                    logger.warning("Broadcast #%s: will retry %s later (%s)", broadcast_id, user_id, exc)
+                    stalled = True
+                    continue
+                results.append((user_id, delivered))
+                if len(results) >= self.flush_size:
+                    batch = results[:]
+                    results.clear()
+                    await self.db.record_broadcast_results(broadcast_id, batch)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(recipients)))))
+        await self.db.record_broadcast_results(broadcast_id, results)
+        return stalled
+
+    async def _report_done(self, broadcast_id: int) -> None:
+        job = await self.db.get_broadcast(broadcast_id)
+        sent_count = int(job["sent_count"])
+        failed_count = int(job["failed_count"])
+        await self.db.add_incident(
+            job["created_by"],
+            None,
+            "broadcast",
+            f"{job['audience']}|{sent_count}|{failed_count}",
+        )
+        if job["created_by"]:
+            lang = await self.db.get_lang(int(job["created_by"]))
+            await safe_send_message(
+                self.bot,
+                int(job["created_by"]),
+                tr(
+                    lang,
+                    f"📣 Рассылка #{broadcast_id} завершена\nОтправлено: {sent_count}\nОшибок: {failed_count}",
+                    f"📣 Broadcast #{broadcast_id} completed\nSent: {sent_count}\nFailed: {failed_count}",
+                ),
+            )
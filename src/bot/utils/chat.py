@@ -11,11 +11,11 @@ from .i18n import tr
 
 
 async def get_partner(db: Database, user_id: int) -> Tuple[Optional[int], Optional[int]]:
-    pair = await db.get_active_pair(user_id)
-    if not pair:
+    route = await db.get_active_route(user_id)
+    if route is None:
         return None, None
-    partner_id = pair["user2_id"] if pair["user1_id"] == user_id else pair["user1_id"]
-    return int(partner_id), int(pair["id"])
+    pair_id, partner_id = route
+    return partner_id, pair_id
 
 
 async def safe_send_message(bot: Bot, user_id: int, text: str, reply_markup=None) -> bool:
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+from collections.abc import AsyncGenerator, AsyncIterable, Sequence
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any
+
+from aiogram import Bot
+from aiogram.types import InputFile
+
+# Bots may upload documents up to 50 MB; leave headroom for zlib/TextIOWrapper buffers not yet flushed.
+EXPORT_PART_MAX_BYTES = 45 * 1024 * 1024
+# Parts stay in memory up to this size, then spill to a temp file on disk.
+EXPORT_SPOOL_MAX_MEMORY = 4 * 1024 * 1024
+
+
+class SpooledInputFile(InputFile):
+    # Uploads straight from an open (possibly disk-backed) file instead of a bytes copy.
+    def __init__(self, file: IO[bytes], filename: str) -> None:
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
+
+
+@dataclass(slots=True)
+class ExportPart:
+    file: IO[bytes]
+    rows: int
+    size: int
+
+
+async def gzip_csv_parts(
+    header: Sequence[str],
+    rows: AsyncIterable[Sequence[Any]],
+    *,
+    part_max_bytes: int = EXPORT_PART_MAX_BYTES,
+    spool_max_memory: int = EXPORT_SPOOL_MAX_MEMORY,
+) -> AsyncGenerator[ExportPart, None]:
+    # Each part is a complete .csv.gz with its own header; the caller closes a part once it is sent.
+    spool: Any = None
+    gzip_file: Any = None
+    text: Any = None
+    writer: Any = None
+    part_rows = 0
+
+    def open_part() -> None:
+        nonlocal spool, gzip_file, text, writer, part_rows
+        spool = SpooledTemporaryFile(max_size=spool_max_memory)
+        gzip_file = gzip.GzipFile(fileobj=spool, mode="wb")
+        text = io.TextIOWrapper(gzip_file, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(header)
+        part_rows = 0
+
+    def close_part() -> ExportPart:
+        nonlocal spool
+        text.flush()
+        text.detach()
+        gzip_file.close()
+        part = ExportPart(file=spool, rows=part_rows, size=spool.tell())
+        spool = None
+        return part
+
+    parts = 0
+    open_part()
+    try:
+        async for row in rows:
+            writer.writerow(row)
+            part_rows += 1
+            # spool.tell() trails the written rows only by what the compressor still buffers.
+            if spool.tell() >= part_max_bytes:
+                parts += 1
+                yield close_part()
+                open_part()
+        if part_rows or not parts:
+            yield close_part()
+    finally:
+        # A part that was never handed to the caller (header-only tail, or an aborted export).
+        if spool is not None:
+            spool.close()
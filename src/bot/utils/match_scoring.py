@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+from time import time
+from typing import Any, Iterable, Optional
+
+try:
+    import numpy as np
+except ModuleNotFoundError:  # pragma: no cover - optional speedup
+    np = None
+
+from .constants import MATCH_SOFT_EXPAND_SECONDS
+
+SCORE_OVERLAP = 40
+SCORE_FRESH = 80
+SCORE_PREMIUM = 5
+WAIT_SCORE_CAP_SECONDS = 180
+WAIT_SCORE_STEP_SECONDS = 15
+# Below this size the per-call array setup costs more than the Python loop it replaces.
+VECTORIZE_MIN_CANDIDATES = 256
+
+
+@dataclass(slots=True)
+class CandidateColumns:
+    user_ids: list[int]
+    masks: list[int]
+    premium: list[bool]
+    only_interest: list[bool]
+    wait_seconds: list[int]
+    seen_before: list[bool]
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+
+def build_candidate_columns(rows: Iterable[Any]) -> CandidateColumns:
+    now = int(time())
+    columns = CandidateColumns([], [], [], [], [], [])
+    for row in rows:
+        premium = int(row["premium_until_ts"] or 0) > now
+        joined_at_ts = int(row["joined_at_ts"] or 0)
+        columns.user_ids.append(int(row["user_id"]))
+        columns.masks.append(int(row["interests_mask"] or 0))
+        columns.premium.append(premium)
+        columns.only_interest.append(premium and bool(row["only_interest"]))
+        columns.wait_seconds.append(max(0, now - joined_at_ts) if joined_at_ts else 0)
+        columns.seen_before.append(bool(row["seen_before"]))
+    return columns
+
+
+def needs_interest(mask: int, only_interest: bool, wait_seconds: int) -> bool:
+    return only_interest or (mask != 0 and wait_seconds < MATCH_SOFT_EXPAND_SECONDS)
+
+
+def candidate_score(*, has_overlap: bool, seen_before: bool, is_premium: bool, wait_seconds: int) -> int:
+    score = 0
+    if has_overlap:
+        score += SCORE_OVERLAP
+    if not seen_before:
+        score += SCORE_FRESH
+    if is_premium:
+        score += SCORE_PREMIUM
+    score += min(wait_seconds, WAIT_SCORE_CAP_SECONDS) // WAIT_SCORE_STEP_SECONDS
+    return score
+
+
+def pick_candidate(
+    columns: CandidateColumns,
+    *,
+    user_mask: int,
+    user_only: bool,
+    user_wait_seconds: int,
+) -> Optional[int]:
+    if user_only and not user_mask:
+        return None
+    if not len(columns):
+        return None
+
+    user_needs_interest = needs_interest(user_mask, user_only, user_wait_seconds)
+    if np is not None and len(columns) >= VECTORIZE_MIN_CANDIDATES:
+        index = _pick_index_numpy(columns, user_mask, user_needs_interest)
+    else:
+        index = _pick_index_python(columns, user_mask, user_needs_interest)
+    return None if index is None else columns.user_ids[index]
+
+
+def _pick_index_python(columns: CandidateColumns, user_mask: int, user_needs_interest: bool) -> Optional[int]:
+    best_index: Optional[int] = None
+    best_score = -1
+    for index, mask in enumerate(columns.masks):
+        has_overlap = (mask & user_mask) != 0
+        if not has_overlap and (
+            user_needs_interest
+            or needs_interest(mask, columns.only_interest[index], columns.wait_seconds[index])
+        ):
+            continue
+        score = candidate_score(
+            has_overlap=has_overlap,
+            seen_before=columns.seen_before[index],
+            is_premium=columns.premium[index],
+            wait_seconds=columns.wait_seconds[index],
+        )
+        if score > best_score:
+            best_score = score
+            best_index = index
+
+    if best_index is not None or user_needs_interest:
+        return best_index
+
+    fallback_repeat: Optional[int] = None
+    for index, only_interest in enumerate(columns.only_interest):
+        if only_interest:
+            continue
+        if not columns.seen_before[index]:
+            return index
+        if fallback_repeat is None:
+            fallback_repeat = index
+    return fallback_repeat
+
+
+def _pick_index_numpy(columns: CandidateColumns, user_mask: int, user_needs_interest: bool) -> Optional[int]:
+    masks = np.asarray(columns.masks, dtype=np.int64)
+    premium = np.asarray(columns.premium, dtype=bool)
+    only_interest = np.asarray(columns.only_interest, dtype=bool)
+    wait_seconds = np.asarray(columns.wait_seconds, dtype=np.int64)
+    seen_before = np.asarray(columns.seen_before, dtype=bool)
+
+    overlap = (masks & user_mask) != 0
+    if user_needs_interest:
+        eligible = overlap
+    else:
+        candidate_needs = only_interest | ((masks != 0) & (wait_seconds < MATCH_SOFT_EXPAND_SECONDS))
+        eligible = overlap | ~candidate_needs
+
+    eligible_indexes = np.flatnonzero(eligible)
+    if eligible_indexes.size:
+        scores = (
+            overlap[eligible_indexes] * SCORE_OVERLAP
+            + ~seen_before[eligible_indexes] * SCORE_FRESH
+            + premium[eligible_indexes] * SCORE_PREMIUM
+            + np.minimum(wait_seconds[eligible_indexes], WAIT_SCORE_CAP_SECONDS) // WAIT_SCORE_STEP_SECONDS
+        )
+        # argmax returns the first maximum, i.e. the longest-waiting of the best candidates.
+        return int(eligible_indexes[int(np.argmax(scores))])
+
+    if user_needs_interest:
+        return None
+    allowed = ~only_interest
+    for bucket in (allowed & ~seen_before, allowed & seen_before):
+        indexes = np.flatnonzero(bucket)
+        if indexes.size:
+            return int(indexes[0])
+    return None
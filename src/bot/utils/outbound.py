@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+from typing import Iterator
+
+from ...metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+LANE_RELAY = "relay"
+LANE_MATCH = "match"
+LANE_BROADCAST = "broadcast"
+# Highest priority first: a waiting relay message always gets the next global token.
+SEND_LANES = (LANE_RELAY, LANE_MATCH, LANE_BROADCAST)
+
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_CHAT_RATE = 1.0
+DEFAULT_CHAT_BURST = 3
+DEFAULT_LANE_LIMIT = 1000
+DEFAULT_MAX_RETRIES = 3
+CHAT_BUCKETS_PRUNE_AT = 10_000
+
+# Anything not explicitly tagged (replies, match and system notifications) uses the middle lane.
+_current_lane: ContextVar[str] = ContextVar("send_lane", default=LANE_MATCH)
+
+
+@contextmanager
+def send_lane(lane: str) -> Iterator[None]:
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def current_send_lane() -> str:
+    return _current_lane.get()
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated_at", "paused_until")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def reserve(self, now: float) -> float:
+        # Takes a token on credit and returns how long to wait for it; debt keeps per-chat FIFO order.
+        self._refill(now)
+        self.tokens -= 1
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 0:
+            wait = max(wait, -self.tokens / self.rate)
+        return wait
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class OutboundScheduler:
+    # Paces every outgoing send: per-chat bucket first, then a global bucket granted in lane order.
+    def __init__(
+        self,
+        *,
+        global_rate: float = DEFAULT_GLOBAL_RATE,
+        chat_rate: float = DEFAULT_CHAT_RATE,
+        chat_burst: int = DEFAULT_CHAT_BURST,
+        lane_limit: int = DEFAULT_LANE_LIMIT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        now = monotonic()
+        self.chat_rate = chat_rate
+        self.chat_burst = max(1, chat_burst)
+        self.max_retries = max(0, max_retries)
+        self._global = TokenBucket(global_rate, max(1.0, global_rate), now)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._waiters: dict[str, deque[asyncio.Future[None]]] = {lane: deque() for lane in SEND_LANES}
+        # Bounded lanes: producers past the limit wait here, which is the backpressure on broadcasts.
+        self._slots = {lane: asyncio.Semaphore(max(1, lane_limit)) for lane in SEND_LANES}
+        self._lane_paused_until = dict.fromkeys(SEND_LANES, 0.0)
+        self._depth = dict.fromkeys(SEND_LANES, 0)
+        self._max_depth = dict.fromkeys(SEND_LANES, 0)
+        self._granted = dict.fromkeys(SEND_LANES, 0)
+        self._blocked = dict.fromkeys(SEND_LANES, 0)
+        self._retry_after = 0
+        self._wakeup = asyncio.Event()
+        self._grant_task: asyncio.Task | None = None
+        self._metrics = metrics if metrics is not None and metrics.enabled else None
+        if metrics is not None:
+            metrics.add_gauges(self.gauges)
+
+    async def acquire(self, chat_id: int | str | None, lane: str) -> None:
+        started_at = monotonic()
+        slots = self._slots[lane]
+        if slots.locked():
+            self._blocked[lane] += 1
+        async with slots:
+            self._depth[lane] += 1
+            self._max_depth[lane] = max(self._max_depth[lane], self._depth[lane])
+            try:
+                if chat_id is not None:
+                    await self._wait_for_chat(chat_id)
+                future = asyncio.get_running_loop().create_future()
+                self._waiters[lane].append(future)
+                self._wakeup.set()
+                self._ensure_grant_task()
+                await future
+            finally:
+                self._depth[lane] -= 1
+        if self._metrics is not None:
+            self._metrics.observe("send_wait", lane, monotonic() - started_at)
+
+    def retry_after(self, chat_id: int | str | None, seconds: float) -> None:
+        # A 429 means the chat must pause; broadcasts also back off globally so live traffic keeps the headroom.
+        self._retry_after += 1
+        until = monotonic() + max(0.0, seconds)
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id, monotonic())
+            bucket.paused_until = max(bucket.paused_until, until)
+        self._lane_paused_until[LANE_BROADCAST] = max(self._lane_paused_until[LANE_BROADCAST], until)
+        self._wakeup.set()
+        logger.warning("Telegram asked to retry after %ss (chat %s)", seconds, chat_id)
+
+    def stats(self) -> dict[str, dict[str, int] | int]:
+        return {
+            "depth": dict(self._depth),
+            "max_depth": dict(self._max_depth),
+            "granted": dict(self._granted),
+            "blocked": dict(self._blocked),
+            "retry_after": self._retry_after,
+            "chats": len(self._chats),
+        }
+
+    def gauges(self) -> dict[str, float]:
+        values: dict[str, float] = {"send_retry_after_total": self._retry_after, "send_chat_buckets": len(self._chats)}
+        for lane in SEND_LANES:
+            values[f"send_queue_depth_{lane}"] = self._depth[lane]
+            values[f"send_queue_max_depth_{lane}"] = self._max_depth[lane]
+            values[f"send_granted_total_{lane}"] = self._granted[lane]
+            values[f"send_backpressure_total_{lane}"] = self._blocked[lane]
+        return values
+
+    async def close(self) -> None:
+        if self._grant_task is not None:
+            self._grant_task.cancel()
+            try:
+                await self._grant_task
+            except asyncio.CancelledError:
+                pass
+            self._grant_task = None
+        for waiters in self._waiters.values():
+            while waiters:
+                waiters.popleft().cancel()
+
+    async def _wait_for_chat(self, chat_id: int | str) -> None:
+        now = monotonic()
+        bucket = self._chat_bucket(chat_id, now)
+        wait = bucket.reserve(now)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            # A RetryAfter may have extended the pause while this sender slept.
+            wait = bucket.paused_until - monotonic()
+
+    def _chat_bucket(self, chat_id: int | str, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= CHAT_BUCKETS_PRUNE_AT:
+                self._prune_chat_buckets(now)
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _prune_chat_buckets(self, now: float) -> None:
+        # A refilled, unpaused bucket behaves exactly like a new one, so it can be dropped.
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    def _ensure_grant_task(self) -> None:
+        if self._grant_task is None or self._grant_task.done():
+            self._grant_task = asyncio.create_task(self._run_grants())
+
+    def _next_lane(self, now: float) -> tuple[str | None, float | None]:
+        # Highest-priority lane with a live waiter, or how long until a paused lane resumes.
+        resume_in: float | None = None
+        for lane in SEND_LANES:
+            waiters = self._waiters[lane]
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if not waiters:
+                continue
+            paused_for = self._lane_paused_until[lane] - now
+            if paused_for > 0:
+                resume_in = paused_for if resume_in is None else min(resume_in, paused_for)
+                continue
+            return lane, None
+        return None, resume_in
+
+    async def _run_grants(self) -> None:
+        while True:
+            now = monotonic()
+            lane, resume_in = self._next_lane(now)
+            if lane is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), resume_in)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay = self._global.delay(now)
+            if delay > 0:
+                # Re-pick afterwards: a higher-priority sender may have arrived meanwhile.
+                await asyncio.sleep(delay)
+                continue
+            self._global.take(now)
+            self._granted[lane] += 1
+            self._waiters[lane].popleft().set_result(None)
@@ -1,4 +1,7 @@
 from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from ...db.timestamps import is_active_epoch
 
 
 def _parse_iso(value: str) -> datetime | None:
@@ -19,6 +22,12 @@ def is_premium_until(value: str) -> bool:
     return dt > datetime.now(timezone.utc)
 
 
+def is_premium_from_snapshot(user: Any) -> bool:
+    if not user:
+        return False
+    return is_active_epoch(user["premium_until_ts"])
+
+
 def format_premium_until(value: str) -> str:
     dt = _parse_iso(value)
     if not dt:
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import socket
+from collections import deque
+from collections.abc import Awaitable, Callable
+from time import monotonic
+from typing import Any
+
+from ...metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPDATE_WORKERS = 8
+DEFAULT_UPDATE_QUEUE_LIMIT = 1000
+UPDATE_QUEUE_CLOSE_TIMEOUT_SEC = 10.0
+REDIS_UPDATE_STREAM = "ghostchat:updates"
+REDIS_UPDATE_GROUP = "ghostchat"
+REDIS_READ_BLOCK_MS = 1000
+# Entries left unacknowledged this long by a dead consumer are claimed by a live one.
+REDIS_RECLAIM_IDLE_MS = 60_000
+
+UpdateProcessor = Callable[[dict[str, Any]], Awaitable[None]]
+AckCallback = Callable[[], Awaitable[None]]
+
+
+def update_user_key(payload: dict[str, Any]) -> int:
+    # The user (or chat) an update belongs to; updates with the same key are handled in order.
+    for name, value in payload.items():
+        if name == "update_id" or not isinstance(value, dict):
+            continue
+        for field in ("from", "user", "chat"):
+            owner = value.get(field)
+            if isinstance(owner, dict) and isinstance(owner.get("id"), int):
+                return owner["id"]
+        message = value.get("message")
+        if isinstance(message, dict) and isinstance(message.get("chat"), dict):
+            return int(message["chat"].get("id") or 0)
+    return int(payload.get("update_id") or 0)
+
+
+class UserShards:
+    # Each key with queued jobs gets its own FIFO and task, so its jobs run strictly in submission
+    # order and never wait behind another key's backlog; the task exits once the FIFO drains.
+    # A semaphore caps how many jobs run at once. Bounded overall and per key.
+    def __init__(self, *, workers: int, limit: int, key_limit: int | None = None) -> None:
+        self.workers = max(1, workers)
+        self.limit = max(1, limit)
+        self.key_limit = key_limit
+        self._slots = asyncio.Semaphore(self.workers)
+        self._queues: dict[int, deque] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._pending = 0
+        self._max_pending = 0
+        self._closing = False
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def max_pending(self) -> int:
+        return self._max_pending
+
+    def depths(self) -> list[int]:
+        return [len(queue) for queue in self._queues.values()]
+
+    def submit(self, key: int, job: Callable[[], Awaitable[Any]]) -> asyncio.Future | None:
+        # None means the job was shed: the shards are full or this key already has too much queued.
+        if self._closing or self._pending >= self.limit:
+            return None
+        queue = self._queues.get(key)
+        if queue is not None and self.key_limit is not None and len(queue) >= self.key_limit:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._tasks[key] = asyncio.create_task(self._run_key(key, queue))
+        # The job runs in the submitter's context, as it would without the shards.
+        queue.append((job, future, contextvars.copy_context()))
+        self._pending += 1
+        self._max_pending = max(self._max_pending, self._pending)
+        return future
+
+    async def close(self, timeout: float = UPDATE_QUEUE_CLOSE_TIMEOUT_SEC) -> int:
+        # Lets queued jobs finish within the timeout and returns how many were dropped.
+        self._closing = True
+        if not self._tasks:
+            return 0
+        _, still_running = await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+        dropped = self._pending
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            await asyncio.gather(*still_running, return_exceptions=True)
+        return dropped if still_running else 0
+
+    async def _run_key(self, key: int, queue: deque) -> None:
+        # The running job stays at the head of the FIFO, so len(queue) counts everything the key holds.
+        try:
+            while queue:
+                job, future, context = queue[0]
+                try:
+                    async with self._slots:
+                        result = await asyncio.create_task(job(), context=context)
+                except Exception as exc:
+                    if not future.done():
+                        future.set_exception(exc)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    if not future.done():
+                        future.cancel()
+                    queue.popleft()
+                    self._pending -= 1
+        finally:
+            # Only a cancelled task leaves jobs behind; their submitters see them cancelled.
+            for _, future, _ in queue:
+                future.cancel()
+            self._pending -= len(queue)
+            queue.clear()
+            del self._queues[key]
+            del self._tasks[key]
+
+
+class UpdateQueue:
+    # Bounded in-process queue of raw webhook updates, handled in order per user.
+    def __init__(
+        self,
+        process: UpdateProcessor,
+        *,
+        workers: int = DEFAULT_UPDATE_WORKERS,
+        limit: int = DEFAULT_UPDATE_QUEUE_LIMIT,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        self.process = process
+        self.workers = max(1, workers)
+        self.limit = max(1, limit)
+        self._shards = UserShards(workers=self.workers, limit=self.limit)
+        self._accepted = 0
+        self._shed = 0
+        self._failed = 0
+        self._closing = False
+        if metrics is not None:
+            metrics.add_gauges(self.gauges)
+
+    @property
+    def pending(self) -> int:
+        return self._shards.pending
+
+    async def start(self) -> None:
+        # Per-user tasks are created on demand; subclasses start their intake here.
+        return None
+
+    async def put(self, payload: dict[str, Any]) -> bool:
+        # False means the queue is full; the webhook answers 503 and Telegram redelivers later.
+        if self._closing or not self._dispatch(payload, None):
+            self._shed += 1
+            return False
+        return True
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self.pending,
+            "accepted": self._accepted,
+            "shed": self._shed,
+            "failed": self._failed,
+        }
+
+    def gauges(self) -> dict[str, float]:
+        return {
+            "update_queue_pending": self.pending,
+            "update_queue_accepted_total": self._accepted,
+            "update_queue_shed_total": self._shed,
+            "update_queue_failed_total": self._failed,
+        }
+
+    async def close(self, timeout: float = UPDATE_QUEUE_CLOSE_TIMEOUT_SEC) -> None:
+        # Accepted updates were already acknowledged to Telegram, so give them a chance to finish.
+        self._closing = True
+        dropped = await self._shards.close(timeout)
+        if dropped:
+            logger.warning("Dropped %s queued updates on shutdown", dropped)
+
+    def _dispatch(self, payload: dict[str, Any], ack: AckCallback | None) -> bool:
+        if self._shards.submit(update_user_key(payload), lambda: self._handle(payload, ack)) is None:
+            return False
+        self._accepted += 1
+        return True
+
+    async def _handle(self, payload: dict[str, Any], ack: AckCallback | None) -> None:
+        try:
+            await self.process(payload)
+        except Exception:
+            self._failed += 1
+            logger.exception("Failed to process Telegram update %s", payload.get("update_id"))
+        if ack is not None:
+            try:
+                await ack()
+            except Exception:
+                logger.exception("Failed to acknowledge Telegram update %s", payload.get("update_id"))
+
+
+class RedisUpdateQueue(UpdateQueue):
+    # Updates survive a crash in a Redis stream and are acknowledged only after processing.
+    # Ordering per user holds within one consumer; several instances split the stream between them.
+    def __init__(
+        self,
+        process: UpdateProcessor,
+        redis: Any,
+        *,
+        stream: str = REDIS_UPDATE_STREAM,
+        group: str = REDIS_UPDATE_GROUP,
+        workers: int = DEFAULT_UPDATE_WORKERS,
+        limit: int = DEFAULT_UPDATE_QUEUE_LIMIT,
+        metrics: MetricsRegistry | None = None,
+    ) -> None:
+        super().__init__(process, workers=workers, limit=limit, metrics=metrics)
+        self.redis = redis
+        self.stream = stream
+        self.group = group
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._reader_task: asyncio.Task | None = None
+        # Entries handed to local workers; a reclaim must not dispatch them a second time.
+        self._inflight: set[Any] = set()
+        self._reclaimed_at = 0.0
+
+    async def start(self) -> None:
+        if self._reader_task is not None:
+            return
+        await super().start()
+        self._reader_task = asyncio.create_task(self._run_reader())
+
+    async def _ensure_group(self) -> None:
+        from redis.exceptions import ResponseError
+
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def put(self, payload: dict[str, Any]) -> bool:
+        await self.start()
+        # The stream holds only unprocessed entries (they are deleted on ack), so its length is the backlog.
+        if self._closing or await self.redis.xlen(self.stream) >= self.limit:
+            self._shed += 1
+            return False
+        await self.redis.xadd(self.stream, {"update": json.dumps(payload)})
+        return True
+
+    async def close(self, timeout: float = UPDATE_QUEUE_CLOSE_TIMEOUT_SEC) -> None:
+        # Unfinished entries stay pending in the group and are reclaimed after REDIS_RECLAIM_IDLE_MS.
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+        await super().close(timeout)
+        await self.redis.aclose()
+
+    async def _run_reader(self) -> None:
+        group_ready = False
+        while True:
+            try:
+                if not group_ready:
+                    # Created from id 0, so entries added before the group existed are still read.
+                    await self._ensure_group()
+                    group_ready = True
+                await self._read_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to read Telegram updates from Redis")
+                await asyncio.sleep(1.0)
+
+    async def _read_once(self) -> None:
+        room = self.limit - self.pending
+        if room <= 0:
+            await asyncio.sleep(0.05)
+            return
+        entries: list[Any] = []
+        if monotonic() - self._reclaimed_at >= REDIS_RECLAIM_IDLE_MS / 2000:
+            self._reclaimed_at = monotonic()
+            claimed = await self.redis.xautoclaim(
+                self.stream,
+                self.group,
+                self.consumer,
+                min_idle_time=REDIS_RECLAIM_IDLE_MS,
+                start_id="0-0",
+                count=room,
+            )
+            entries = [entry for entry in (claimed[1] if claimed else ()) if entry[0] not in self._inflight]
+        if not entries:
+            response = await self.redis.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.stream: ">"},
+                count=room,
+                block=REDIS_READ_BLOCK_MS,
+            )
+            entries = [entry for _, stream_entries in response or () for entry in stream_entries]
+        for entry_id, fields in entries:
+            fields = fields or {}
+            raw = fields.get(b"update", fields.get("update"))
+            if raw is None:
+                await self._ack(entry_id)
+                continue
+            if self._dispatch(json.loads(raw), lambda entry_id=entry_id: self._ack(entry_id)):
+                self._inflight.add(entry_id)
+
+    async def _ack(self, entry_id: Any) -> None:
+        self._inflight.discard(entry_id)
+        await self.redis.xack(self.stream, self.group, entry_id)
+        await self.redis.xdel(self.stream, entry_id)
@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from typing import Any, Optional
 
 from ...db.database import Database
+from ...db.timestamps import is_active_epoch
 
 
 async def ensure_user(db: Database, user_id: int) -> None:
@@ -24,25 +25,21 @@ def is_banned_from_snapshot(user: Any) -> bool:
         return False
     if bool(user["is_banned"]):
         return True
-    return _is_active_until(user["banned_until"] or "")
+    return is_active_epoch(user["banned_until_ts"])
 
 
 def is_muted_from_snapshot(user: Any) -> bool:
     if not user:
         return False
-    return _is_active_until(user["muted_until"] or "")
+    return is_active_epoch(user["muted_until_ts"])
 
 
 def get_active_restrictions_from_snapshot(user: Any) -> tuple[str, str]:
     if not user:
         return "", ""
 
-    banned_until = user["banned_until"] or ""
-    muted_until = user["muted_until"] or ""
-    if not _is_active_until(banned_until):
-        banned_until = ""
-    if not _is_active_until(muted_until):
-        muted_until = ""
+    banned_until = (user["banned_until"] or "") if is_active_epoch(user["banned_until_ts"]) else ""
+    muted_until = (user["muted_until"] or "") if is_active_epoch(user["muted_until_ts"]) else ""
     return banned_until, muted_until
 
 
@@ -86,12 +83,3 @@ def _parse_iso(value: str) -> datetime | None:
         return datetime.fromisoformat(value)
     except ValueError:
         return None
-
-
-def _is_active_until(value: str) -> bool:
-    dt = _parse_iso(value)
-    if not dt:
-        return False
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt > datetime.now(timezone.utc)
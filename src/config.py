@@ -16,6 +16,30 @@ class Config:
     telegram_proxy: Optional[str]
     telegram_timeout_sec: float
     telegram_webhook_secret: Optional[str]
+    match_tick_interval_sec: float = 2.0
+    sqlite_readers: int = 4
+    user_touch_flush_sec: float = 5.0
+    sqlite_group_commit_ms: float = 0.0
+    sqlite_group_commit_max: int = 64
+    sqlite_synchronous: str = ""
+    postgres_statement_cache_size: int = 1024
+    metrics_enabled: bool = False
+    metrics_token: Optional[str] = None
+    slow_query_ms: float = 0.0
+    stats_reconcile_sec: float = 0.0
+    stats_rollup_sec: float = 300.0
+    send_global_rate: float = 30.0
+    send_chat_rate: float = 1.0
+    send_chat_burst: int = 3
+    send_queue_limit: int = 1000
+    send_max_retries: int = 3
+    broadcast_workers: int = 8
+    broadcast_slice_sec: float = 8.0
+    cron_secret: Optional[str] = None
+    webhook_workers: int = 0
+    webhook_queue_limit: int = 1000
+    dispatch_workers: int = 0
+    dispatch_queue_limit: int = 2000
 
 
 def _parse_admin_ids(raw: str) -> List[int]:
@@ -54,6 +78,33 @@ def _parse_positive_float(raw: str, default: float) -> float:
     return value if value > 0 else default
 
 
+def _parse_non_negative_float(raw: str, default: float) -> float:
+    if not raw:
+        return default
+    try:
+        value = float(raw.strip())
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def _parse_non_negative_int(raw: str, default: int) -> int:
+    if not raw:
+        return default
+    try:
+        value = int(raw.strip())
+    except ValueError:
+        return default
+    return value if value >= 0 else default
+
+
+def _parse_bool(raw: str, default: bool) -> bool:
+    value = raw.strip().lower()
+    if not value:
+        return default
+    return value in {"1", "true", "yes", "on"}
+
+
 def _resolve_telegram_proxy() -> Optional[str]:
     for key in (
         "TELEGRAM_PROXY",
@@ -106,6 +157,45 @@ def load_config() -> Config:
         default=60.0,
     )
     telegram_webhook_secret = os.getenv("TELEGRAM_WEBHOOK_SECRET", "").strip() or None
+    match_tick_interval_sec = _parse_non_negative_float(
+        os.getenv("MATCH_TICK_INTERVAL_SEC", ""),
+        default=2.0,
+    )
+    sqlite_readers = _parse_non_negative_int(os.getenv("SQLITE_READERS", ""), default=4)
+    user_touch_flush_sec = _parse_non_negative_float(
+        os.getenv("USER_TOUCH_FLUSH_SEC", ""),
+        default=5.0,
+    )
+    sqlite_group_commit_ms = _parse_non_negative_float(
+        os.getenv("SQLITE_GROUP_COMMIT_MS", ""),
+        default=0.0,
+    )
+    sqlite_group_commit_max = _parse_non_negative_int(
+        os.getenv("SQLITE_GROUP_COMMIT_MAX", ""),
+        default=64,
+    )
+    sqlite_synchronous = os.getenv("SQLITE_SYNCHRONOUS", "").strip().upper()
+    postgres_statement_cache_size = _parse_non_negative_int(
+        os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", ""),
+        default=1024,
+    )
+    metrics_enabled = _parse_bool(os.getenv("METRICS_ENABLED", ""), default=False)
+    metrics_token = os.getenv("METRICS_TOKEN", "").strip() or None
+    slow_query_ms = _parse_non_negative_float(os.getenv("SLOW_QUERY_MS", ""), default=0.0)
+    stats_reconcile_sec = _parse_non_negative_float(os.getenv("STATS_RECONCILE_SEC", ""), default=0.0)
+    stats_rollup_sec = _parse_non_negative_float(os.getenv("STATS_ROLLUP_SEC", ""), default=300.0)
+    send_global_rate = _parse_non_negative_float(os.getenv("SEND_GLOBAL_RATE", ""), default=30.0)
+    send_chat_rate = _parse_positive_float(os.getenv("SEND_CHAT_RATE", ""), default=1.0)
+    send_chat_burst = _parse_non_negative_int(os.getenv("SEND_CHAT_BURST", ""), default=3)
+    send_queue_limit = _parse_non_negative_int(os.getenv("SEND_QUEUE_LIMIT", ""), default=1000)
+    send_max_retries = _parse_non_negative_int(os.getenv("SEND_MAX_RETRIES", ""), default=3)
+    broadcast_workers = max(1, _parse_non_negative_int(os.getenv("BROADCAST_WORKERS", ""), default=8))
+    broadcast_slice_sec = _parse_positive_float(os.getenv("BROADCAST_SLICE_SEC", ""), default=8.0)
+    cron_secret = os.getenv("CRON_SECRET", "").strip() or None
+    webhook_workers = _parse_non_negative_int(os.getenv("WEBHOOK_WORKERS", ""), default=0)
+    webhook_queue_limit = max(1, _parse_non_negative_int(os.getenv("WEBHOOK_QUEUE_LIMIT", ""), default=1000))
+    dispatch_workers = _parse_non_negative_int(os.getenv("DISPATCH_WORKERS", ""), default=0)
+    dispatch_queue_limit = max(1, _parse_non_negative_int(os.getenv("DISPATCH_QUEUE_LIMIT", ""), default=2000))
 
     return Config(
         token=token,
@@ -117,4 +207,28 @@ def load_config() -> Config:
         telegram_proxy=telegram_proxy,
         telegram_timeout_sec=telegram_timeout_sec,
         telegram_webhook_secret=telegram_webhook_secret,
+        match_tick_interval_sec=match_tick_interval_sec,
+        sqlite_readers=sqlite_readers,
+        user_touch_flush_sec=user_touch_flush_sec,
+        sqlite_group_commit_ms=sqlite_group_commit_ms,
+        sqlite_group_commit_max=sqlite_group_commit_max,
+        sqlite_synchronous=sqlite_synchronous,
+        postgres_statement_cache_size=postgres_statement_cache_size,
+        metrics_enabled=metrics_enabled,
+        metrics_token=metrics_token,
+        slow_query_ms=slow_query_ms,
+        stats_reconcile_sec=stats_reconcile_sec,
+        stats_rollup_sec=stats_rollup_sec,
+        send_global_rate=send_global_rate,
+        send_chat_rate=send_chat_rate,
+        send_chat_burst=send_chat_burst,
+        send_queue_limit=send_queue_limit,
+        send_max_retries=send_max_retries,
+        broadcast_workers=broadcast_workers,
+        broadcast_slice_sec=broadcast_slice_sec,
+        cron_secret=cron_secret,
+        webhook_workers=webhook_workers,
+        webhook_queue_limit=webhook_queue_limit,
+        dispatch_workers=dispatch_workers,
+        dispatch_queue_limit=dispatch_queue_limit,
     )
@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import random
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from functools import wraps
 from pathlib import Path
-from time import monotonic
-from typing import Any, Optional
+from time import monotonic, perf_counter
+from typing import Any, AsyncIterator, Callable, Optional
 
 import aiosqlite
 
@@ -15,15 +19,98 @@ try:
 except ModuleNotFoundError:  # pragma: no cover - optional production dependency
     asyncpg = None
 
+from ..metrics import MetricsRegistry
+from .interests import interests_mask
+from .locks import KeyedLockManager
+from .match_queue import MatchQueue
+from .pair_routes import PairRoutes
+from .queue_stats import MatchRateEstimator
+from .partner_index import PartnerIndex
+from .slow_queries import SlowQuery, SlowQueryLog, is_explainable
+from .stats_counters import STATS_COUNTER_NAMES, counter_shards, payment_amount_from_payload
+from .stats_rollups import ROLLUP_WATERMARK_KEY, aggregate_rollups, bucket_start
+from .timestamps import is_active_epoch, now_epoch, to_epoch
+from .user_cache import UserSnapshotCache
 from .migrations import apply_migrations
 from . import queries
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_VIRTUAL_COMPANION_IDS = (-101, -102, -103, -104, -105)
 DEFAULT_VIRTUAL_QUEUE_THRESHOLD = 4
 DEFAULT_VIRTUAL_AB_VARIANTS = ("spark", "soft", "bold")
 USER_CONTEXT_TOUCH_INTERVAL_SEC = 30.0
+USER_CONTEXT_FLUSH_INTERVAL_SEC = 5.0
+USER_CONTEXT_FLUSH_BATCH_SIZE = 500
 MEDIA_ARCHIVE_CLEANUP_INTERVAL_SEC = 3600.0
-MATCH_CANDIDATES_LIMIT = 64
+DEFAULT_SQLITE_READERS = 4
+DEFAULT_POSTGRES_STATEMENT_CACHE_SIZE = 1024
+DEFAULT_GROUP_COMMIT_MAX_STATEMENTS = 64
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+PAIR_ROUTES_RESYNC_INTERVAL_SEC = 30.0
+MATCH_CANDIDATES_LIMIT = 2048
+MATCH_BATCH_CANDIDATES_LIMIT = 64
+MATCH_QUEUE_RESYNC_INTERVAL_SEC = 30.0
+EXPORT_PAGE_SIZE = 1000
+# Below any Telegram user id or BIGSERIAL id, and still a valid BIGINT parameter.
+EXPORT_KEYSET_START = -(2**63)
+# Keyset-paginated admin exports: table -> (page query, key column, CSV columns in SELECT order).
+EXPORT_TABLES: dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "users": (
+        queries.EXPORT_USERS_PAGE,
+        "user_id",
+        (
+            "user_id",
+            "created_at",
+            "state",
+            "username",
+            "first_name",
+            "last_name",
+            "last_seen_at",
+            "is_banned",
+            "banned_until",
+            "muted_until",
+            "rating",
+            "chats_count",
+            "interests",
+            "premium_until",
+            "lang",
+        ),
+    ),
+    "incidents": (
+        queries.EXPORT_INCIDENTS_PAGE,
+        "id",
+        ("id", "actor_id", "target_id", "type", "payload", "created_at"),
+    ),
+    "reports": (
+        queries.EXPORT_REPORTS_PAGE,
+        "id",
+        ("id", "reporter_id", "reported_id", "reason", "status", "created_at", "resolved_at", "resolved_by"),
+    ),
+    "pairs": (
+        queries.EXPORT_PAIRS_PAGE,
+        "id",
+        ("id", "user1_id", "user2_id", "started_at", "ended_at", "is_active"),
+    ),
+}
+
+# Reverse index of the shared statements so timings are reported by constant name.
+QUERY_NAMES = {
+    value: name
+    for name, value in vars(queries).items()
+    if name.isupper() and isinstance(value, str)
+}
+INLINE_QUERY_NAME_LENGTH = 48
+
+
+def query_name(query: str) -> str:
+    name = QUERY_NAMES.get(query)
+    if name is not None:
+        return name
+    return "inline:" + " ".join(query.split())[:INLINE_QUERY_NAME_LENGTH]
+
+
+POSTGRES_LOCK_STATS_COUNTERS = "LOCK TABLE stats_counters IN EXCLUSIVE MODE"
 
 POSTGRES_QUERY_OVERRIDES = {
     queries.INSERT_USER: """
@@ -32,9 +119,14 @@ VALUES (?, ?, ?, 0, 0, 0)
 ON CONFLICT(user_id) DO NOTHING
 """,
     queries.INSERT_QUEUE: """
-INSERT INTO queue (user_id, joined_at)
-VALUES (?, ?)
-ON CONFLICT(user_id) DO UPDATE SET joined_at = EXCLUDED.joined_at
+INSERT INTO queue (user_id, joined_at, joined_at_ts, interests_mask)
+SELECT user_id, ?::text, ?::bigint, interests_mask
+FROM users
+WHERE user_id = ?::bigint
+ON CONFLICT(user_id) DO UPDATE SET
+    joined_at = EXCLUDED.joined_at,
+    joined_at_ts = EXCLUDED.joined_at_ts,
+    interests_mask = EXCLUDED.interests_mask
 """,
     queries.INSERT_PENDING_RATING: """
 INSERT INTO pending_ratings (user_id, pair_id, target_id, created_at)
@@ -55,9 +147,11 @@ INSERT INTO virtual_ab_sessions (
     user_messages,
     companion_messages,
     media_messages,
-    ended_by_user
+    ended_by_user,
+    started_at_ts,
+    ended_at_ts
 )
-VALUES (?, ?, ?, ?, ?, '', 0, 0, 0, 0)
+VALUES (?, ?, ?, ?, ?, '', 0, 0, 0, 0, ?, 0)
 ON CONFLICT(pair_id) DO UPDATE SET
     user_id = EXCLUDED.user_id,
     companion_id = EXCLUDED.companion_id,
@@ -67,16 +161,214 @@ ON CONFLICT(pair_id) DO UPDATE SET
     user_messages = EXCLUDED.user_messages,
     companion_messages = EXCLUDED.companion_messages,
     media_messages = EXCLUDED.media_messages,
-    ended_by_user = EXCLUDED.ended_by_user
+    ended_by_user = EXCLUDED.ended_by_user,
+    started_at_ts = EXCLUDED.started_at_ts,
+    ended_at_ts = EXCLUDED.ended_at_ts
 """,
 }
 
+POSTGRES_INSERT_BROADCAST = """
+INSERT INTO broadcasts (audience, message, created_by, created_at, status)
+VALUES (?, ?, ?, ?, 'running')
+RETURNING id
+"""
+
 POSTGRES_INSERT_PAIR = """
 INSERT INTO pairs (user1_id, user2_id, started_at, ended_at, is_active)
 VALUES (?, ?, ?, NULL, 1)
 RETURNING id
 """
 
+# Single-statement versions of the hot transactional flows: one round trip each on Postgres.
+POSTGRES_COMMIT_MATCH = """
+WITH eligible AS (
+    SELECT u.user_id
+    FROM users u
+    JOIN queue q ON q.user_id = u.user_id
+    WHERE u.user_id IN (?::bigint, ?::bigint)
+      AND u.state = 'searching'
+      AND u.is_banned = 0
+      AND u.banned_until_ts <= ?::bigint
+    FOR UPDATE OF u
+),
+ready AS (
+    SELECT COUNT(*) = ?::bigint AS ok FROM eligible
+),
+dequeued AS (
+    DELETE FROM queue
+    WHERE user_id IN (SELECT user_id FROM eligible) AND (SELECT ok FROM ready)
+),
+updated AS (
+    UPDATE users
+    SET state = 'chatting', chats_count = chats_count + 1
+    WHERE user_id IN (SELECT user_id FROM eligible) AND (SELECT ok FROM ready)
+)
+INSERT INTO pairs (user1_id, user2_id, started_at, ended_at, is_active)
+SELECT ?::bigint, ?::bigint, ?::text, NULL, 1
+WHERE (SELECT ok FROM ready)
+RETURNING id
+"""
+
+POSTGRES_END_CHAT_SESSION = """
+WITH pair AS (
+    SELECT id, CASE WHEN user1_id = ?::bigint THEN user2_id ELSE user1_id END AS partner_id
+    FROM pairs
+    WHERE is_active = 1 AND (user1_id = ?::bigint OR user2_id = ?::bigint)
+    LIMIT 1
+    FOR UPDATE
+),
+ended AS (
+    UPDATE pairs SET ended_at = ?::text, is_active = 0
+    WHERE id IN (SELECT id FROM pair)
+),
+finished_ab AS (
+    UPDATE virtual_ab_sessions
+    SET ended_at = ?::text,
+        ended_at_ts = ?::bigint,
+        ended_by_user = CASE WHEN ?::int = 1 THEN 1 ELSE ended_by_user END
+    WHERE pair_id IN (SELECT id FROM pair WHERE partner_id < 0)
+),
+idled AS (
+    UPDATE users SET state = 'idle'
+    WHERE (user_id = ?::bigint AND EXISTS (SELECT 1 FROM pair))
+       OR user_id IN (SELECT partner_id FROM pair WHERE partner_id >= 0)
+),
+targets AS (
+    SELECT ?::bigint AS user_id, partner_id AS target_id, ?::boolean AND partner_id >= 0 AS feedback
+    FROM pair
+    UNION ALL
+    SELECT partner_id, ?::bigint, ?::boolean
+    FROM pair
+    WHERE partner_id >= 0
+),
+cleared AS (
+    DELETE FROM pending_ratings
+    WHERE user_id IN (SELECT user_id FROM targets WHERE NOT feedback)
+),
+requested AS (
+    INSERT INTO pending_ratings (user_id, pair_id, target_id, created_at)
+    SELECT t.user_id, pair.id, t.target_id, ?::text
+    FROM targets t
+    CROSS JOIN pair
+    WHERE t.feedback
+    ON CONFLICT(user_id) DO UPDATE SET
+        pair_id = EXCLUDED.pair_id,
+        target_id = EXCLUDED.target_id,
+        created_at = EXCLUDED.created_at
+)
+SELECT id, partner_id FROM pair
+"""
+
+POSTGRES_SKIP_CHAT_SESSION = """
+WITH pair AS (
+    SELECT id, CASE WHEN user1_id = ?::bigint THEN user2_id ELSE user1_id END AS partner_id
+    FROM pairs
+    WHERE is_active = 1 AND (user1_id = ?::bigint OR user2_id = ?::bigint)
+    LIMIT 1
+    FOR UPDATE
+),
+ended AS (
+    UPDATE pairs SET ended_at = ?::text, is_active = 0
+    WHERE id IN (SELECT id FROM pair)
+),
+finished_ab AS (
+    UPDATE virtual_ab_sessions
+    SET ended_at = ?::text, ended_at_ts = ?::bigint, ended_by_user = 1
+    WHERE pair_id IN (SELECT id FROM pair WHERE partner_id < 0)
+),
+moved AS (
+    UPDATE users
+    SET state = CASE WHEN user_id = ?::bigint THEN 'searching' ELSE 'idle' END,
+        skip_until = CASE WHEN user_id = ?::bigint THEN ?::text ELSE skip_until END,
+        skip_until_ts = CASE WHEN user_id = ?::bigint THEN ?::bigint ELSE skip_until_ts END
+    WHERE (user_id = ?::bigint AND EXISTS (SELECT 1 FROM pair))
+       OR user_id IN (SELECT partner_id FROM pair WHERE partner_id >= 0)
+),
+cleared AS (
+    DELETE FROM pending_ratings
+    WHERE (user_id = ?::bigint AND EXISTS (SELECT 1 FROM pair))
+       OR user_id IN (SELECT partner_id FROM pair WHERE partner_id >= 0)
+),
+queued AS (
+    INSERT INTO queue (user_id, joined_at, joined_at_ts, interests_mask)
+    SELECT user_id, ?::text, ?::bigint, interests_mask
+    FROM users
+    WHERE user_id = ?::bigint AND EXISTS (SELECT 1 FROM pair)
+    ON CONFLICT(user_id) DO UPDATE SET
+        joined_at = EXCLUDED.joined_at,
+        joined_at_ts = EXCLUDED.joined_at_ts,
+        interests_mask = EXCLUDED.interests_mask
+),
+logged AS (
+    INSERT INTO incidents (actor_id, target_id, type, payload, created_at)
+    SELECT ?::bigint, partner_id, 'skip', '', ?::text
+    FROM pair
+)
+SELECT id, partner_id FROM pair
+"""
+
+# Chats with a virtual companion cannot be reported, so the flow only touches human pairs.
+POSTGRES_REPORT_CHAT_SESSION = """
+WITH pair AS (
+    SELECT id, CASE WHEN user1_id = ?::bigint THEN user2_id ELSE user1_id END AS partner_id
+    FROM pairs
+    WHERE is_active = 1 AND (user1_id = ?::bigint OR user2_id = ?::bigint)
+    LIMIT 1
+    FOR UPDATE
+),
+target AS (
+    SELECT id, partner_id FROM pair WHERE partner_id >= 0
+),
+reported AS (
+    INSERT INTO reports (reporter_id, reported_id, reason, created_at)
+    SELECT ?::bigint, partner_id, ?::text, ?::text
+    FROM target
+),
+logged AS (
+    INSERT INTO incidents (actor_id, target_id, type, payload, created_at)
+    SELECT ?::bigint, partner_id, 'report', ?::text, ?::text
+    FROM target
+),
+ended AS (
+    UPDATE pairs SET ended_at = ?::text, is_active = 0
+    WHERE id IN (SELECT id FROM target)
+),
+idled AS (
+    UPDATE users SET state = 'idle'
+    WHERE (user_id = ?::bigint AND EXISTS (SELECT 1 FROM target))
+       OR user_id IN (SELECT partner_id FROM target)
+),
+cleared AS (
+    DELETE FROM pending_ratings
+    WHERE (user_id = ?::bigint AND EXISTS (SELECT 1 FROM target))
+       OR user_id IN (SELECT partner_id FROM target)
+)
+SELECT id, partner_id FROM target
+"""
+
+POSTGRES_UPSERT_USER_CONTEXT_BATCH = """
+INSERT INTO users (
+    user_id,
+    created_at,
+    state,
+    username,
+    first_name,
+    last_name,
+    last_seen_at,
+    is_banned,
+    rating,
+    chats_count
+)
+SELECT t.user_id, t.created_at, 'idle', t.username, t.first_name, t.last_name, t.last_seen_at, 0, 0, 0
+FROM unnest(?::bigint[], ?::text[], ?::text[], ?::text[], ?::text[], ?::text[])
+    AS t(user_id, created_at, username, first_name, last_name, last_seen_at)
+ON CONFLICT(user_id) DO UPDATE SET
+    username = EXCLUDED.username,
+    first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    last_seen_at = EXCLUDED.last_seen_at
+"""
+
 
 @dataclass(slots=True)
 class MatchCommitResult:
@@ -101,20 +393,86 @@ class PromoRedemptionResult:
     premium_until: str | None = None
 
 
+@dataclass(slots=True)
+class _TransactionScope:
+    touched_users: set[int] = field(default_factory=set)
+    on_commit: list[Callable[[], None]] = field(default_factory=list)
+
+
+_TRANSACTION_SCOPE: ContextVar[_TransactionScope | None] = ContextVar(
+    "transaction_scope",
+    default=None,
+)
+
+
 class Database:
-    def __init__(self, db_path: str) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        *,
+        sqlite_readers: int = DEFAULT_SQLITE_READERS,
+        touch_flush_interval_sec: float = USER_CONTEXT_FLUSH_INTERVAL_SEC,
+        group_commit_ms: float = 0.0,
+        group_commit_max_statements: int = DEFAULT_GROUP_COMMIT_MAX_STATEMENTS,
+        sqlite_synchronous: str = "",
+        statement_cache_size: int = DEFAULT_POSTGRES_STATEMENT_CACHE_SIZE,
+        metrics: MetricsRegistry | None = None,
+        slow_query_ms: float = 0.0,
+        stats_reconcile_sec: float = 0.0,
+        stats_rollup_sec: float = 0.0,
+        local_caches: bool = True,
+    ) -> None:
         self.db_path = db_path
+        self._statement_cache_size = max(0, statement_cache_size)
         self._conn: Optional[aiosqlite.Connection] = None
+        self._sqlite_readers = max(0, sqlite_readers)
+        self._readers: list[aiosqlite.Connection] = []
+        self._idle_readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
         self._pool: Any = None
         self._dialect = "sqlite"
         self._compiled_query_cache: dict[str, str] = {}
-        # Simple lock to serialize critical DB operations like matching.
-        self.lock = asyncio.Lock()
+        # Per-user (and per-promo-code) locks for read-validate-write flows like matching.
+        self.locks = KeyedLockManager()
         self._transaction_lock = asyncio.Lock()
+        # Opt-in SQLite group commit: standalone writes share one commit per window/batch.
+        self._group_commit_sec = max(0.0, group_commit_ms) / 1000
+        self._group_commit_max = max(1, group_commit_max_statements)
+        self._sqlite_synchronous = sqlite_synchronous.strip().upper()
+        self._group_size = 0
+        self._group_done: asyncio.Future[None] | None = None
+        self._group_timer: asyncio.Task | None = None
         self._known_users: set[int] = set()
         self._lang_cache: dict[int, str] = {}
         self._user_touch_cache: dict[int, tuple[str, str, str, float]] = {}
+        self._touch_flush_interval_sec = max(0.0, touch_flush_interval_sec)
+        self._pending_touches: dict[int, tuple[int, str, str, str, str, str]] = {}
+        self._touch_flush_wakeup = asyncio.Event()
+        self._touch_flush_task: asyncio.Task | None = None
         self._media_cleanup_deadlines: dict[int, float] = {}
+        self._match_queue = MatchQueue()
+        self._match_rate = MatchRateEstimator()
+        self._partner_index = PartnerIndex()
+        # The snapshot cache, the pair route table, the match queue mirror and the partner index
+        # are kept current in-process only, so they are safe just when this process owns every
+        # update (polling); webhook instances read the tables directly.
+        self._local_caches = local_caches
+        self._user_cache = UserSnapshotCache()
+        self._pair_routes = PairRoutes()
+        self._pair_routes_synced_at = 0.0
+        self._match_queue_synced_at = 0.0
+        self._match_queue_version = 0
+        self._stats_reconcile_sec = max(0.0, stats_reconcile_sec)
+        self._stats_reconcile_task: asyncio.Task | None = None
+        self._stats_rollup_sec = max(0.0, stats_rollup_sec)
+        self._stats_rollup_task: asyncio.Task | None = None
+        self._metrics = metrics if metrics is not None and metrics.enabled else None
+        self.slow_queries = SlowQueryLog(slow_query_ms)
+        self._plan_tasks: set[asyncio.Task] = set()
+        if self._metrics is not None or self.slow_queries.enabled:
+            # Wrapped per instance so the untimed path costs nothing when both are off.
+            self._fetchone_impl = self._timed_query(self._fetchone_impl)
+            self._fetchall_impl = self._timed_query(self._fetchall_impl)
+            self._execute_impl = self._timed_query(self._execute_impl)
 
     def _is_postgres_url(self) -> bool:
         normalized = self.db_path.strip().lower()
@@ -136,6 +494,12 @@ class Database:
     async def connect(self) -> None:
         if self._is_postgres_url():
             await self._connect_postgres()
+            await self.reload_match_queue()
+            await self.reload_pair_routes()
+            await self._ensure_stats_counters()
+            self._start_touch_flusher()
+            self._start_stats_reconciler()
+            self._start_stats_rollups()
             return
 
         db_file = self._resolve_db_file()
@@ -149,10 +513,70 @@ class Database:
         await self._conn.execute("PRAGMA busy_timeout = 5000")
         if db_file is not None:
             await self._conn.execute("PRAGMA journal_mode = WAL")
+        if self._sqlite_synchronous in SQLITE_SYNCHRONOUS_MODES:
+            await self._conn.execute(f"PRAGMA synchronous = {self._sqlite_synchronous}")
         await apply_migrations(self._conn, self._dialect)
         await self._conn.commit()
+        if db_file is not None:
+            # WAL lets read-only connections run next to the single writer.
+            await self._open_sqlite_readers()
+        await self.reload_match_queue()
+        await self.reload_pair_routes()
+        await self._ensure_stats_counters()
+        self._start_touch_flusher()
+        self._start_stats_reconciler()
+        self._start_stats_rollups()
+
+    async def _open_sqlite_readers(self) -> None:
+        for _ in range(self._sqlite_readers):
+            reader = await aiosqlite.connect(self.db_path)
+            reader.row_factory = aiosqlite.Row
+            await reader.execute("PRAGMA busy_timeout = 5000")
+            await reader.execute("PRAGMA query_only = ON")
+            self._readers.append(reader)
+            self._idle_readers.put_nowait(reader)
+
+    @asynccontextmanager
+    async def _sqlite_reader(self):
+        if not self._readers:
+            yield self._conn
+            return
+        reader = await self._idle_readers.get()
+        try:
+            yield reader
+        finally:
+            self._idle_readers.put_nowait(reader)
 
     async def close(self) -> None:
+        for task in (self._stats_reconcile_task, self._stats_rollup_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._stats_reconcile_task = None
+        self._stats_rollup_task = None
+        for task in list(self._plan_tasks):
+            task.cancel()
+        if self._plan_tasks:
+            await asyncio.gather(*self._plan_tasks, return_exceptions=True)
+        if self._touch_flush_task is not None:
+            self._touch_flush_task.cancel()
+            try:
+                await self._touch_flush_task
+            except asyncio.CancelledError:
+                pass
+            self._touch_flush_task = None
+        if self._conn is not None or self._pool is not None:
+            await self.flush_user_touches()
+        if self._conn is not None:
+            async with self._writer():
+                pass
+        for reader in self._readers:
+            await reader.close()
+        self._readers.clear()
+        self._idle_readers = asyncio.Queue()
         if self._conn:
             await self._conn.close()
             self._conn = None
@@ -166,7 +590,13 @@ class Database:
                 "PostgreSQL backend requires asyncpg. Install dependencies from requirements.txt."
             )
         self._dialect = "postgres"
-        self._pool = await asyncpg.create_pool(dsn=self.db_path, min_size=1, max_size=10)
+        # asyncpg prepares each statement once per connection and keeps it in this LRU.
+        self._pool = await asyncpg.create_pool(
+            dsn=self.db_path,
+            min_size=1,
+            max_size=10,
+            statement_cache_size=self._statement_cache_size,
+        )
         async with self._pool.acquire() as conn:
             async with conn.transaction():
                 await apply_migrations(conn, self._dialect)
@@ -185,14 +615,6 @@ class Database:
         except ValueError:
             return None
 
-    def _is_active_until(self, value: str) -> bool:
-        dt = self._parse_iso(value)
-        if not dt:
-            return False
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt > datetime.now(timezone.utc)
-
     def _extend_until(self, current_until: str, days: int) -> str:
         now = datetime.now(timezone.utc)
         if days <= 0:
@@ -242,23 +664,114 @@ class Database:
 
     @asynccontextmanager
     async def transaction(self):
-        if self._is_postgres():
-            assert self._pool is not None
-            async with self._pool.acquire() as connection:
-                async with connection.transaction():
-                    yield connection
-            return
+        scope = _TransactionScope()
+        token = _TRANSACTION_SCOPE.set(scope)
+        try:
+            if self._is_postgres():
+                assert self._pool is not None
+                async with self._pool.acquire() as connection:
+                    async with connection.transaction():
+                        yield connection
+                    self._run_commit_hooks(scope)
+                return
 
-        assert self._conn is not None
-        async with self._transaction_lock:
-            await self._conn.execute("BEGIN")
+            assert self._conn is not None
+            async with self._writer():
+                await self._conn.execute("BEGIN")
+                try:
+                    yield self._conn
+                except Exception:
+                    await self._conn.rollback()
+                    raise
+                else:
+                    await self._conn.commit()
+                    self._run_commit_hooks(scope)
+        finally:
+            _TRANSACTION_SCOPE.reset(token)
+            # Snapshots read while the transaction was open may predate its commit.
+            if scope.touched_users:
+                self._user_cache.invalidate(*scope.touched_users)
+
+    def _run_commit_hooks(self, scope: _TransactionScope) -> None:
+        hooks = scope.on_commit
+        scope.on_commit = []
+        for hook in hooks:
+            hook()
+
+    def _after_commit(self, hook: Callable[[], None]) -> None:
+        scope = _TRANSACTION_SCOPE.get()
+        if scope is None:
+            hook()
+        else:
+            scope.on_commit.append(hook)
+
+    def _invalidate_user_snapshot(self, *user_ids: int) -> None:
+        self._user_cache.invalidate(*user_ids)
+        scope = _TRANSACTION_SCOPE.get()
+        if scope is not None:
+            scope.touched_users.update(user_ids)
+
+    def get_user_cache_stats(self) -> dict[str, int]:
+        return self._user_cache.stats()
+
+    def _timed_query(self, impl: Callable[..., Any]) -> Callable[..., Any]:
+        metrics = self._metrics
+        slow_threshold_sec = self.slow_queries.threshold_sec
+
+        @wraps(impl)
+        async def timed(query: str, params: tuple[Any, ...] = (), **kwargs: Any) -> Any:
+            started_at = perf_counter()
             try:
-                yield self._conn
-            except Exception:
-                await self._conn.rollback()
-                raise
+                return await impl(query, params, **kwargs)
+            finally:
+                elapsed = perf_counter() - started_at
+                if metrics is not None:
+                    metrics.observe("query", query_name(query), elapsed)
+                if elapsed >= slow_threshold_sec:
+                    self._on_slow_query(query, params, elapsed)
+
+        return timed
+
+    def _on_slow_query(self, query: str, params: tuple[Any, ...], elapsed: float) -> None:
+        name = query_name(query)
+        entry = self.slow_queries.record(name, params, elapsed)
+        if entry is None:
+            logger.warning("Slow query %s took %.1f ms", name, elapsed * 1000)
+            return
+        logger.warning("Slow query %s took %.1f ms, params %s", name, entry.duration_ms, entry.param_shape)
+        if not is_explainable(query):
+            return
+        task = asyncio.create_task(self._capture_query_plan(entry, query, params))
+        self._plan_tasks.add(task)
+        task.add_done_callback(self._plan_tasks.discard)
+
+    async def _capture_query_plan(self, entry: SlowQuery, query: str, params: tuple[Any, ...]) -> None:
+        try:
+            if self._is_postgres():
+                assert self._pool is not None
+                async with self._pool.acquire() as db_conn:
+                    # ANALYZE really runs the statement, so writes are rolled back.
+                    transaction = db_conn.transaction()
+                    await transaction.start()
+                    try:
+                        rows = await db_conn.fetch(
+                            f"EXPLAIN (ANALYZE, BUFFERS) {self._resolve_query(query)}",
+                            *params,
+                        )
+                    finally:
+                        await transaction.rollback()
+                entry.plan = "\n".join(row[0] for row in rows)
             else:
-                await self._conn.commit()
+                async with self._sqlite_reader() as db_conn:
+                    assert db_conn is not None
+                    async with db_conn.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+                        rows = await cursor.fetchall()
+                entry.plan = "\n".join(str(row[3]) for row in rows)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            entry.plan = f"EXPLAIN failed: {exc}"
+            logger.warning("Failed to capture plan for slow query %s: %s", entry.name, exc)
 
     async def _fetchone_impl(
         self,
@@ -275,10 +788,13 @@ class Database:
             async with self._pool.acquire() as db_conn:
                 return await db_conn.fetchrow(compiled, *params)
 
-        db_conn = connection or self._conn
-        assert db_conn is not None
-        async with db_conn.execute(query, params) as cursor:
-            return await cursor.fetchone()
+        if connection is not None:
+            async with connection.execute(query, params) as cursor:
+                return await cursor.fetchone()
+        async with self._sqlite_reader() as db_conn:
+            assert db_conn is not None
+            async with db_conn.execute(query, params) as cursor:
+                return await cursor.fetchone()
 
     async def _fetchall_impl(
         self,
@@ -295,10 +811,13 @@ class Database:
             async with self._pool.acquire() as db_conn:
                 return list(await db_conn.fetch(compiled, *params))
 
-        db_conn = connection or self._conn
-        assert db_conn is not None
-        async with db_conn.execute(query, params) as cursor:
-            return await cursor.fetchall()
+        if connection is not None:
+            async with connection.execute(query, params) as cursor:
+                return await cursor.fetchall()
+        async with self._sqlite_reader() as db_conn:
+            assert db_conn is not None
+            async with db_conn.execute(query, params) as cursor:
+                return await cursor.fetchall()
 
     async def _execute_impl(
         self,
@@ -316,13 +835,67 @@ class Database:
             async with self._pool.acquire() as db_conn:
                 return await db_conn.execute(compiled, *params)
 
-        db_conn = connection or self._conn
-        assert db_conn is not None
-        result = await db_conn.execute(query, params)
-        if commit and connection is None:
-            await db_conn.commit()
+        if connection is not None:
+            return await connection.execute(query, params)
+        assert self._conn is not None
+        if commit and self._group_commit_sec > 0:
+            return await self._execute_grouped(query, params)
+        # Standalone writes share the writer with transaction(); never interleave with one.
+        async with self._writer():
+            result = await self._conn.execute(query, params)
+            if commit:
+                await self._conn.commit()
+        return result
+
+    @asynccontextmanager
+    async def _writer(self):
+        async with self._transaction_lock:
+            if self._group_done is not None:
+                await self._commit_group()
+            yield
+
+    async def _execute_grouped(self, query: str, params: tuple[Any, ...]) -> Any:
+        assert self._conn is not None
+        async with self._transaction_lock:
+            if self._group_done is None:
+                await self._conn.execute("BEGIN")
+                self._group_done = asyncio.get_running_loop().create_future()
+                self._group_timer = asyncio.create_task(self._commit_group_later())
+            done = self._group_done
+            # A failing statement only rolls back itself; the rest of the group still commits.
+            result = await self._conn.execute(query, params)
+            self._group_size += 1
+            if self._group_size >= self._group_commit_max:
+                await self._commit_group()
+        await asyncio.shield(done)
         return result
 
+    async def _commit_group_later(self) -> None:
+        await asyncio.sleep(self._group_commit_sec)
+        async with self._transaction_lock:
+            if self._group_timer is asyncio.current_task():
+                self._group_timer = None
+                await self._commit_group()
+
+    async def _commit_group(self) -> None:
+        assert self._conn is not None
+        done = self._group_done
+        timer = self._group_timer
+        self._group_done = None
+        self._group_timer = None
+        self._group_size = 0
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+        if done is None:
+            return
+        try:
+            await self._conn.commit()
+        except Exception as exc:
+            await self._conn.rollback()
+            done.set_exception(exc)
+        else:
+            done.set_result(None)
+
     async def fetchone(
         self,
         query: str,
@@ -364,17 +937,40 @@ class Database:
         return row
 
     async def get_user_snapshot(self, user_id: int, *, connection: Any = None) -> Any:
-        row = await self.fetchone(
-            queries.SELECT_USER_WITH_QUEUE,
-            (user_id,),
-            connection=connection,
-        )
+        if connection is not None or not self._local_caches:
+            row = await self.fetchone(
+                queries.SELECT_USER_WITH_QUEUE,
+                (user_id,),
+                connection=connection,
+            )
+            if row:
+                self._prime_user_cache(row)
+            return row
+
+        cached = self._user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        version = self._user_cache.version(user_id)
+        row = await self.fetchone(queries.SELECT_USER_WITH_QUEUE, (user_id,))
         if row:
             self._prime_user_cache(row)
+            self._user_cache.store(user_id, row, version)
         return row
 
-    async def get_search_status_snapshot(self, user_id: int) -> Any:
-        return await self.fetchone(queries.SELECT_SEARCH_STATUS, (user_id,))
+    async def get_search_status_snapshot(self, user_id: int) -> dict[str, Any] | None:
+        user = await self.get_user_snapshot(user_id)
+        if not user:
+            return None
+        position = await self.get_queue_position(user_id)
+        return {
+            "interests": user["interests"],
+            "only_interest": user["only_interest"],
+            "premium_until": user["premium_until"],
+            "premium_until_ts": user["premium_until_ts"],
+            "position": position,
+            "queue_size": await self.get_match_queue_size(),
+            "eta_seconds": self._match_rate.eta_seconds(position, monotonic()),
+        }
 
     async def update_user_profile(
         self,
@@ -393,6 +989,7 @@ class Database:
                 user_id,
             ),
         )
+        self._invalidate_user_snapshot(user_id)
         self._remember_user(user_id)
 
     async def touch_user_context(
@@ -415,22 +1012,28 @@ class Database:
                 and cached_last_name == normalized_last_name
                 and now_monotonic - cached_at < USER_CONTEXT_TOUCH_INTERVAL_SEC
             ):
-                self._remember_user(user_id)
+                if user_id not in self._pending_touches:
+                    self._remember_user(user_id)
                 return
 
         now_iso = self._now()
-        await self.execute(
-            queries.UPSERT_USER_CONTEXT,
-            (
-                user_id,
-                now_iso,
-                normalized_username,
-                normalized_first_name,
-                normalized_last_name,
-                now_iso,
-            ),
+        row = (
+            user_id,
+            now_iso,
+            normalized_username,
+            normalized_first_name,
+            normalized_last_name,
+            now_iso,
         )
-        self._remember_user(user_id)
+        if self._touch_flush_task is None:
+            await self.execute(queries.UPSERT_USER_CONTEXT, row)
+            self._invalidate_user_snapshot(user_id)
+            self._remember_user(user_id)
+        else:
+            # Coalesced into the next batch; brand-new users are still created by ensure_user.
+            self._pending_touches[user_id] = row
+            if len(self._pending_touches) >= USER_CONTEXT_FLUSH_BATCH_SIZE:
+                self._touch_flush_wakeup.set()
         self._user_touch_cache[user_id] = (
             normalized_username,
             normalized_first_name,
@@ -438,23 +1041,101 @@ class Database:
             now_monotonic,
         )
 
+    def _start_touch_flusher(self) -> None:
+        if self._touch_flush_interval_sec > 0 and self._touch_flush_task is None:
+            self._touch_flush_task = asyncio.create_task(self._run_touch_flusher())
+
+    async def _run_touch_flusher(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._touch_flush_wakeup.wait(),
+                    timeout=self._touch_flush_interval_sec,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._touch_flush_wakeup.clear()
+            try:
+                await self.flush_user_touches()
+            except Exception:
+                logger.exception("Failed to flush user context updates")
+
+    async def flush_user_touches(self) -> int:
+        if not self._pending_touches:
+            return 0
+        pending = self._pending_touches
+        self._pending_touches = {}
+        rows = list(pending.values())
+        try:
+            if self._is_postgres():
+                columns = list(zip(*rows))
+                async with self.transaction() as connection:
+                    await connection.execute(
+                        self._resolve_query(POSTGRES_UPSERT_USER_CONTEXT_BATCH),
+                        *(list(column) for column in columns),
+                    )
+            else:
+                assert self._conn is not None
+                async with self._writer():
+                    await self._conn.executemany(queries.UPSERT_USER_CONTEXT, rows)
+                    await self._conn.commit()
+        except Exception:
+            for user_id, row in pending.items():
+                self._pending_touches.setdefault(user_id, row)
+            raise
+        self._invalidate_user_snapshot(*pending)
+        return len(rows)
+
     async def set_state(self, user_id: int, state: str) -> None:
         await self.execute(queries.UPDATE_STATE, (state, user_id))
+        self._invalidate_user_snapshot(user_id)
+        if state != "searching":
+            self._discard_match_entries(user_id)
 
     async def set_banned(self, user_id: int, is_banned: bool) -> None:
         await self.execute(queries.UPDATE_BANNED, (1 if is_banned else 0, user_id))
         if is_banned:
-            await self.execute(queries.UPDATE_BANNED_UNTIL, ("", user_id))
+            await self.execute(queries.UPDATE_BANNED_UNTIL, ("", 0, user_id))
+        self._invalidate_user_snapshot(user_id)
+        if is_banned:
+            self._update_match_entry(user_id, is_banned=True, banned_until_ts=0)
+        else:
+            self._update_match_entry(user_id, is_banned=False)
 
     async def set_banned_until(self, user_id: int, banned_until: str) -> None:
-        await self.execute(queries.UPDATE_BANNED_UNTIL, (banned_until, user_id))
+        banned_until_ts = to_epoch(banned_until)
+        await self.execute(queries.UPDATE_BANNED_UNTIL, (banned_until, banned_until_ts, user_id))
+        self._invalidate_user_snapshot(user_id)
+        self._update_match_entry(user_id, banned_until_ts=banned_until_ts)
+
+    async def set_user_reachable(self, user_id: int, reachable: bool) -> bool:
+        # A user who blocked the bot (or deleted the account) also leaves the search queue.
+        # Read uncached: another instance may have changed the state this decision depends on.
+        user = await self.get_user(user_id)
+        if not user or bool(user["reachable"]) == reachable:
+            return False
+        async with self.transaction() as connection:
+            await self.execute(
+                queries.UPDATE_REACHABLE,
+                (1 if reachable else 0, user_id),
+                commit=False,
+                connection=connection,
+            )
+            if not reachable and (user["state"] or "") == "searching":
+                await self.execute(queries.UPDATE_STATE, ("idle", user_id), commit=False, connection=connection)
+                await self.execute(queries.DELETE_QUEUE, (user_id,), commit=False, connection=connection)
+        self._invalidate_user_snapshot(user_id)
+        if not reachable:
+            self._discard_match_entries(user_id)
+        return True
 
     async def get_banned_until(self, user_id: int) -> str:
         row = await self.fetchone(queries.SELECT_BANNED_UNTIL, (user_id,))
         return row["banned_until"] if row else ""
 
     async def set_muted_until(self, user_id: int, muted_until: str) -> None:
-        await self.execute(queries.UPDATE_MUTED_UNTIL, (muted_until, user_id))
+        await self.execute(queries.UPDATE_MUTED_UNTIL, (muted_until, to_epoch(muted_until), user_id))
+        self._invalidate_user_snapshot(user_id)
 
     async def get_muted_until(self, user_id: int) -> str:
         row = await self.fetchone(queries.SELECT_MUTED_UNTIL, (user_id,))
@@ -462,15 +1143,22 @@ class Database:
 
     async def increment_chats(self, user_id: int) -> None:
         await self.execute(queries.INCREMENT_CHATS, (user_id,))
+        self._invalidate_user_snapshot(user_id)
 
     async def increment_rating(self, user_id: int, value: int) -> None:
         await self.execute(queries.INCREMENT_RATING, (value, user_id))
+        self._invalidate_user_snapshot(user_id)
 
     async def add_to_queue(self, user_id: int) -> None:
-        await self.execute(queries.INSERT_QUEUE, (user_id, self._now()))
+        joined_at = self._now()
+        await self.execute(queries.INSERT_QUEUE, (joined_at, to_epoch(joined_at), user_id))
+        self._invalidate_user_snapshot(user_id)
+        self._sync_match_entry(user_id, await self.get_user_snapshot(user_id))
 
     async def remove_from_queue(self, user_id: int) -> None:
         await self.execute(queries.DELETE_QUEUE, (user_id,))
+        self._invalidate_user_snapshot(user_id)
+        self._discard_match_entries(user_id)
 
     async def queue_user_for_search(self, user_id: int) -> None:
         joined_at = self._now()
@@ -483,10 +1171,156 @@ class Database:
             )
             await self.execute(
                 queries.INSERT_QUEUE,
-                (user_id, joined_at),
+                (joined_at, to_epoch(joined_at), user_id),
                 commit=False,
                 connection=connection,
             )
+            self._invalidate_user_snapshot(user_id)
+            user = await self.get_user_snapshot(user_id, connection=connection)
+        self._sync_match_entry(user_id, user)
+
+    async def reload_match_queue(self) -> None:
+        if not self._local_caches:
+            return
+        version = self._match_queue_version
+        rows = await self.fetchall(queries.SELECT_MATCH_QUEUE_ENTRIES)
+        self._match_queue_synced_at = monotonic()
+        if version != self._match_queue_version:
+            # A local enqueue/dequeue raced the snapshot; keep the live view until the next resync.
+            return
+        self._match_queue.load(rows)
+
+    async def _refresh_match_queue_if_stale(self) -> None:
+        if monotonic() - self._match_queue_synced_at >= MATCH_QUEUE_RESYNC_INTERVAL_SEC:
+            await self.reload_match_queue()
+
+    async def _current_match_queue(self) -> MatchQueue:
+        if self._local_caches:
+            await self._refresh_match_queue_if_stale()
+            return self._match_queue
+        # Other instances change the queue too, so build a one-off snapshot of the table.
+        queue = MatchQueue()
+        queue.load(await self.fetchall(queries.SELECT_MATCH_QUEUE_ENTRIES))
+        return queue
+
+    def _record_queue_matches(self, *user_ids: int) -> None:
+        if self._local_caches:
+            matched = sum(1 for user_id in user_ids if user_id in self._match_queue)
+        else:
+            # Only queued users can be matched; companions (negative ids) never are.
+            matched = sum(1 for user_id in user_ids if user_id >= 0)
+        self._match_rate.record(monotonic(), matched)
+
+    def _sync_match_entry(self, user_id: int, user: Any) -> None:
+        if not self._local_caches:
+            return
+        self._match_queue_version += 1
+        if user and (user["state"] or "") == "searching" and (user["joined_at"] or ""):
+            self._match_queue.add_row(user)
+        else:
+            self._match_queue.discard(user_id)
+
+    def _discard_match_entries(self, *user_ids: int) -> None:
+        self._match_queue_version += 1
+        for user_id in user_ids:
+            self._match_queue.discard(user_id)
+
+    def _update_match_entry(self, user_id: int, **fields: Any) -> None:
+        if self._match_queue.update(user_id, **fields):
+            self._match_queue_version += 1
+
+    async def get_match_queue_size(self) -> int:
+        if self._local_caches:
+            return len(self._match_queue)
+        return await self.get_queue_size()
+
+    async def get_match_candidates(
+        self,
+        user_id: int,
+        interests_mask: int = 0,
+        *,
+        limit: int = MATCH_CANDIDATES_LIMIT,
+        overlap_only: bool = False,
+    ) -> list[dict[str, Any]]:
+        if not self._local_caches:
+            now_ts = now_epoch()
+            rows = await self.fetchall(
+                queries.SELECT_QUEUE_CANDIDATES_BY_MASK,
+                (
+                    user_id,
+                    user_id,
+                    user_id,
+                    now_ts,
+                    interests_mask,
+                    1 if overlap_only else 0,
+                    interests_mask,
+                    limit,
+                ),
+            )
+            return sorted((dict(row) for row in rows), key=lambda row: (row["joined_at_ts"], row["joined_at"]))
+        await self._refresh_match_queue_if_stale()
+        entries = self._match_queue.candidates(
+            user_id,
+            interests_mask,
+            now_ts=now_epoch(),
+            limit=limit,
+            overlap_only=overlap_only,
+        )
+        if not entries:
+            return []
+        if user_id not in self._partner_index:
+            await self.get_partner_history(user_id)
+        return [
+            entry.as_row(seen_before=self._partner_index.has_seen(user_id, entry.user_id))
+            for entry in entries
+        ]
+
+    async def _queued_partner_index(self, user_ids: list[int]) -> PartnerIndex:
+        # Webhook instances do not see pairs created elsewhere, so they read histories fresh per tick.
+        index = self._partner_index if self._local_caches else PartnerIndex(max(1, len(user_ids)))
+        missing = index.missing(user_ids)
+        if not missing:
+            return index
+        rows = await self.fetchall(queries.SELECT_QUEUED_PARTNER_HISTORY)
+        histories: dict[int, set[int]] = {}
+        for row in rows:
+            histories.setdefault(int(row["user_id"]), set()).add(int(row["partner_id"]))
+        for user_id in missing:
+            index.store(user_id, histories.get(user_id, ()))
+        return index
+
+    async def get_match_batch(
+        self,
+        *,
+        limit: int = MATCH_BATCH_CANDIDATES_LIMIT,
+    ) -> list[tuple[dict[str, Any], list[dict[str, Any]]]]:
+        queue = await self._current_match_queue()
+        now_ts = now_epoch()
+        entries = [entry for entry in queue if entry.is_eligible(now_ts)]
+        if len(entries) < 2:
+            return []
+
+        partner_index = await self._queued_partner_index([entry.user_id for entry in entries])
+        batch: list[tuple[dict[str, Any], list[dict[str, Any]]]] = []
+        for entry in entries:
+            candidates = queue.candidates(
+                entry.user_id,
+                entry.interests_mask,
+                now_ts=now_ts,
+                limit=limit,
+            )
+            batch.append(
+                (
+                    entry.as_row(seen_before=False),
+                    [
+                        candidate.as_row(
+                            seen_before=partner_index.has_seen(entry.user_id, candidate.user_id)
+                        )
+                        for candidate in candidates
+                    ],
+                )
+            )
+        return batch
 
     async def get_queue_size(self) -> int:
         row = await self.fetchone(queries.SELECT_QUEUE_SIZE)
@@ -497,26 +1331,34 @@ class Database:
         return row["joined_at"] if row else ""
 
     async def get_queue_position(self, user_id: int) -> int:
-        joined_at = await self.get_queue_joined_at(user_id)
-        if not joined_at:
-            return 0
-        row = await self.fetchone(queries.SELECT_QUEUE_POSITION, (user_id,))
-        return int(row["pos"]) if row else 0
+        if not self._local_caches:
+            row = await self.fetchone(queries.SELECT_QUEUE_POSITION, (user_id,))
+            return int(row["pos"]) if row else 0
+        await self._refresh_match_queue_if_stale()
+        position = self._match_queue.position(user_id)
+        if position == 0 and user_id not in self._match_queue:
+            # Another instance may have queued the user since the last resync.
+            snapshot = await self.get_user_snapshot(user_id)
+            if snapshot and (snapshot["joined_at"] or ""):
+                await self.reload_match_queue()
+                position = self._match_queue.position(user_id)
+        return position
 
     async def get_queue_candidate(self, exclude_user_id: int) -> Optional[int]:
-        row = await self.fetchone(queries.SELECT_QUEUE_CANDIDATE, (exclude_user_id, self._now()))
+        row = await self.fetchone(queries.SELECT_QUEUE_CANDIDATE, (exclude_user_id, now_epoch()))
         return int(row["user_id"]) if row else None
 
     async def get_queue_candidate_by_interest(
         self, exclude_user_id: int, interest: str
     ) -> Optional[int]:
         row = await self.fetchone(
-            queries.SELECT_QUEUE_CANDIDATE_INTEREST, (exclude_user_id, self._now(), interest)
+            queries.SELECT_QUEUE_CANDIDATE_INTEREST,
+            (exclude_user_id, now_epoch(), interests_mask(interest)),
         )
         return int(row["user_id"]) if row else None
 
     async def get_queue_candidates(self, exclude_user_id: int) -> list[aiosqlite.Row]:
-        return await self.fetchall(queries.SELECT_QUEUE_CANDIDATES, (exclude_user_id, self._now()))
+        return await self.fetchall(queries.SELECT_QUEUE_CANDIDATES, (exclude_user_id, now_epoch()))
 
     async def get_queue_candidates_limited(
         self,
@@ -530,7 +1372,7 @@ class Database:
                 exclude_user_id,
                 exclude_user_id,
                 exclude_user_id,
-                self._now(),
+                now_epoch(),
                 limit,
             ),
         )
@@ -539,9 +1381,13 @@ class Database:
         started_at = self._now()
         if self._is_postgres():
             query = self._resolve_query(POSTGRES_INSERT_PAIR)
-            return int(await connection.fetchval(query, user1_id, user2_id, started_at))
-        cursor = await connection.execute(queries.INSERT_PAIR, (user1_id, user2_id, started_at))
-        return int(cursor.lastrowid)
+            pair_id = int(await connection.fetchval(query, user1_id, user2_id, started_at))
+        else:
+            cursor = await connection.execute(queries.INSERT_PAIR, (user1_id, user2_id, started_at))
+            pair_id = int(cursor.lastrowid)
+        self._partner_index.record(user1_id, user2_id)
+        self._after_commit(lambda: self._add_pair_route(pair_id, user1_id, user2_id))
+        return pair_id
 
     async def create_pair(self, user1_id: int, user2_id: int) -> int:
         async with self.transaction() as connection:
@@ -568,128 +1414,167 @@ class Database:
                 commit=False,
                 connection=connection,
             )
-            return pair_id
+        self._invalidate_user_snapshot(user_id)
+        self._record_queue_matches(user_id)
+        self._discard_match_entries(user_id)
+        return pair_id
 
-    async def start_human_pair(self, user1_id: int, user2_id: int) -> int:
-        async with self.transaction() as connection:
-            await self.execute(
-                queries.DELETE_QUEUE,
-                (user1_id,),
-                commit=False,
+    async def finalize_match(self, user_id: int, partner_id: int, *, is_virtual: bool) -> MatchCommitResult | None:
+        async with self.locks.hold(user_id, partner_id):
+            if self._is_postgres():
+                assert self._pool is not None
+                async with self._pool.acquire() as connection:
+                    result = await self._commit_match_postgres(
+                        user_id,
+                        partner_id,
+                        is_virtual=is_virtual,
+                        connection=connection,
+                    )
+            else:
+                async with self.transaction() as connection:
+                    result = await self._commit_match(
+                        user_id,
+                        partner_id,
+                        is_virtual=is_virtual,
+                        connection=connection,
+                    )
+        if result is not None:
+            self._record_queue_matches(user_id, partner_id)
+            self._discard_match_entries(user_id, partner_id)
+        return result
+
+    async def finalize_matches(self, pairs: list[tuple[int, int]]) -> list[MatchCommitResult | None]:
+        # One short transaction per pair: each commit holds only its own two lock stripes, so a large
+        # batch never stalls unrelated users for the length of the whole plan.
+        return [
+            await self.finalize_match(user_id, partner_id, is_virtual=False)
+            for user_id, partner_id in pairs
+        ]
+
+    async def _commit_match(
+        self,
+        user_id: int,
+        partner_id: int,
+        *,
+        is_virtual: bool,
+        connection: Any,
+    ) -> MatchCommitResult | None:
+        if self._is_postgres():
+            return await self._commit_match_postgres(
+                user_id,
+                partner_id,
+                is_virtual=is_virtual,
                 connection=connection,
             )
+
+        user = await self.get_user_snapshot(user_id, connection=connection)
+        if not user or (user["state"] or "") != "searching" or not (user["joined_at"] or ""):
+            return None
+        if bool(user["is_banned"]) or is_active_epoch(user["banned_until_ts"]):
+            return None
+
+        if is_virtual:
             await self.execute(
                 queries.DELETE_QUEUE,
-                (user2_id,),
-                commit=False,
-                connection=connection,
-            )
-            await self.execute(
-                queries.UPDATE_STATE,
-                ("chatting", user1_id),
+                (user_id,),
                 commit=False,
                 connection=connection,
             )
             await self.execute(
                 queries.UPDATE_STATE,
-                ("chatting", user2_id),
-                commit=False,
-                connection=connection,
-            )
-            pair_id = await self._insert_pair_row(user1_id, user2_id, connection=connection)
-            await self.execute(
-                queries.INCREMENT_CHATS,
-                (user1_id,),
+                ("chatting", user_id),
                 commit=False,
                 connection=connection,
             )
+            pair_id = await self._insert_pair_row(user_id, partner_id, connection=connection)
             await self.execute(
                 queries.INCREMENT_CHATS,
-                (user2_id,),
+                (user_id,),
                 commit=False,
                 connection=connection,
             )
-            return pair_id
+            self._invalidate_user_snapshot(user_id)
+            return MatchCommitResult(pair_id=pair_id, partner_id=partner_id, is_virtual=True)
 
-    async def finalize_match(self, user_id: int, partner_id: int, *, is_virtual: bool) -> MatchCommitResult | None:
-        async with self.lock:
-            async with self.transaction() as connection:
-                user = await self.get_user_snapshot(user_id, connection=connection)
-                if not user or (user["state"] or "") != "searching" or not (user["joined_at"] or ""):
-                    return None
-                if bool(user["is_banned"]) or self._is_active_until(user["banned_until"] or ""):
-                    return None
+        partner = await self.get_user_snapshot(partner_id, connection=connection)
+        if (
+            not partner
+            or (partner["state"] or "") != "searching"
+            or not (partner["joined_at"] or "")
+            or bool(partner["is_banned"])
+            or is_active_epoch(partner["banned_until_ts"])
+        ):
+            return None
 
-                if is_virtual:
-                    await self.execute(
-                        queries.DELETE_QUEUE,
-                        (user_id,),
-                        commit=False,
-                        connection=connection,
-                    )
-                    await self.execute(
-                        queries.UPDATE_STATE,
-                        ("chatting", user_id),
-                        commit=False,
-                        connection=connection,
-                    )
-                    pair_id = await self._insert_pair_row(user_id, partner_id, connection=connection)
-                    await self.execute(
-                        queries.INCREMENT_CHATS,
-                        (user_id,),
-                        commit=False,
-                        connection=connection,
-                    )
-                    return MatchCommitResult(pair_id=pair_id, partner_id=partner_id, is_virtual=True)
-
-                partner = await self.get_user_snapshot(partner_id, connection=connection)
-                if (
-                    not partner
-                    or (partner["state"] or "") != "searching"
-                    or not (partner["joined_at"] or "")
-                    or bool(partner["is_banned"])
-                    or self._is_active_until(partner["banned_until"] or "")
-                ):
-                    return None
+        await self.execute(
+            queries.DELETE_QUEUE,
+            (user_id,),
+            commit=False,
+            connection=connection,
+        )
+        await self.execute(
+            queries.DELETE_QUEUE,
+            (partner_id,),
+            commit=False,
+            connection=connection,
+        )
+        await self.execute(
+            queries.UPDATE_STATE,
+            ("chatting", user_id),
+            commit=False,
+            connection=connection,
+        )
+        await self.execute(
+            queries.UPDATE_STATE,
+            ("chatting", partner_id),
+            commit=False,
+            connection=connection,
+        )
+        pair_id = await self._insert_pair_row(user_id, partner_id, connection=connection)
+        await self.execute(
+            queries.INCREMENT_CHATS,
+            (user_id,),
+            commit=False,
+            connection=connection,
+        )
+        await self.execute(
+            queries.INCREMENT_CHATS,
+            (partner_id,),
+            commit=False,
+            connection=connection,
+        )
+        self._invalidate_user_snapshot(user_id, partner_id)
+        return MatchCommitResult(pair_id=pair_id, partner_id=partner_id, is_virtual=False)
 
-                await self.execute(
-                    queries.DELETE_QUEUE,
-                    (user_id,),
-                    commit=False,
-                    connection=connection,
-                )
-                await self.execute(
-                    queries.DELETE_QUEUE,
-                    (partner_id,),
-                    commit=False,
-                    connection=connection,
-                )
-                await self.execute(
-                    queries.UPDATE_STATE,
-                    ("chatting", user_id),
-                    commit=False,
-                    connection=connection,
-                )
-                await self.execute(
-                    queries.UPDATE_STATE,
-                    ("chatting", partner_id),
-                    commit=False,
-                    connection=connection,
-                )
-                pair_id = await self._insert_pair_row(user_id, partner_id, connection=connection)
-                await self.execute(
-                    queries.INCREMENT_CHATS,
-                    (user_id,),
-                    commit=False,
-                    connection=connection,
-                )
-                await self.execute(
-                    queries.INCREMENT_CHATS,
-                    (partner_id,),
-                    commit=False,
-                    connection=connection,
-                )
-                return MatchCommitResult(pair_id=pair_id, partner_id=partner_id, is_virtual=False)
+    async def _commit_match_postgres(
+        self,
+        user_id: int,
+        partner_id: int,
+        *,
+        is_virtual: bool,
+        connection: Any,
+    ) -> MatchCommitResult | None:
+        now_iso = self._now()
+        pair_id = await connection.fetchval(
+            self._resolve_query(POSTGRES_COMMIT_MATCH),
+            user_id,
+            partner_id,
+            to_epoch(now_iso),
+            1 if is_virtual else 2,
+            user_id,
+            partner_id,
+            now_iso,
+        )
+        if pair_id is None:
+            return None
+        pair_id = int(pair_id)
+        self._partner_index.record(user_id, partner_id)
+        self._after_commit(lambda: self._add_pair_route(pair_id, user_id, partner_id))
+        if is_virtual:
+            self._invalidate_user_snapshot(user_id)
+        else:
+            self._invalidate_user_snapshot(user_id, partner_id)
+        return MatchCommitResult(pair_id=pair_id, partner_id=partner_id, is_virtual=is_virtual)
 
     async def get_active_pair(self, user_id: int, *, connection: Any = None) -> Any:
         return await self.fetchone(
@@ -700,10 +1585,62 @@ class Database:
 
     async def end_pair(self, pair_id: int) -> None:
         await self.execute(queries.END_PAIR_BY_ID, (self._now(), pair_id))
+        self._pair_routes.drop(pair_id)
+
+    def _add_pair_route(self, pair_id: int, user1_id: int, user2_id: int) -> None:
+        if self._local_caches:
+            self._pair_routes.add(pair_id, user1_id, user2_id)
+
+    async def reload_pair_routes(self) -> None:
+        if not self._local_caches:
+            return
+        version = self._pair_routes.version
+        rows = await self.fetchall(queries.SELECT_ACTIVE_PAIRS)
+        self._pair_routes_synced_at = monotonic()
+        if version != self._pair_routes.version:
+            return
+        self._pair_routes.load(rows)
+
+    async def get_active_route(self, user_id: int) -> tuple[int, int] | None:
+        if self._local_caches:
+            if monotonic() - self._pair_routes_synced_at >= PAIR_ROUTES_RESYNC_INTERVAL_SEC:
+                await self.reload_pair_routes()
+            route = self._pair_routes.get(user_id)
+            if route is not None:
+                return route
+
+        version = self._pair_routes.version
+        pair = await self.get_active_pair(user_id)
+        if not pair:
+            return None
+        pair_id = int(pair["id"])
+        user1_id = int(pair["user1_id"])
+        user2_id = int(pair["user2_id"])
+        if version == self._pair_routes.version:
+            self._add_pair_route(pair_id, user1_id, user2_id)
+        return pair_id, user2_id if user1_id == user_id else user1_id
 
     async def add_report(self, reporter_id: int, reported_id: int, reason: str) -> None:
         await self.execute(queries.INSERT_REPORT, (reporter_id, reported_id, reason, self._now()))
 
+    async def _active_partner_id(self, user_id: int) -> int | None:
+        pair = await self.get_active_pair(user_id)
+        if not pair:
+            return None
+        return int(pair["user2_id"] if int(pair["user1_id"]) == user_id else pair["user1_id"])
+
+    @asynccontextmanager
+    async def _hold_pair_locks(self, user_id: int) -> AsyncIterator[None]:
+        # The partner is only known after reading the active pair: lock what was seen and
+        # retry if the pair changed before both locks were held.
+        while True:
+            partner_id = await self._active_partner_id(user_id)
+            keys = (user_id,) if partner_id is None else (user_id, partner_id)
+            async with self.locks.hold(*keys):
+                if await self._active_partner_id(user_id) == partner_id:
+                    yield
+                    return
+
     async def end_chat_session(
         self,
         user_id: int,
@@ -713,7 +1650,15 @@ class Database:
         collect_feedback: bool = True,
         ended_by_user: bool = True,
     ) -> ChatCloseResult | None:
-        async with self.lock:
+        async with self._hold_pair_locks(user_id):
+            if self._is_postgres():
+                return await self._end_chat_session_postgres(
+                    user_id,
+                    notify_user=notify_user,
+                    notify_partner=notify_partner,
+                    collect_feedback=collect_feedback,
+                    ended_by_user=ended_by_user,
+                )
             async with self.transaction() as connection:
                 pair = await self.get_active_pair(user_id, connection=connection)
                 if not pair:
@@ -726,9 +1671,10 @@ class Database:
                 partner_feedback_pending = collect_feedback and notify_partner and not partner_is_virtual
 
                 if partner_is_virtual:
+                    ended_at = self._now()
                     await self.execute(
                         queries.FINISH_VIRTUAL_AB_SESSION,
-                        (self._now(), 1 if ended_by_user else 0, pair_id),
+                        (ended_at, to_epoch(ended_at), 1 if ended_by_user else 0, pair_id),
                         commit=False,
                         connection=connection,
                     )
@@ -738,6 +1684,7 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._after_commit(lambda: self._pair_routes.drop(pair_id))
                 await self.execute(
                     queries.UPDATE_STATE,
                     ("idle", user_id),
@@ -780,6 +1727,7 @@ class Database:
                         commit=False,
                         connection=connection,
                     )
+                self._invalidate_user_snapshot(user_id, partner_id)
 
                 return ChatCloseResult(
                     pair_id=pair_id,
@@ -789,8 +1737,56 @@ class Database:
                     partner_feedback_pending=partner_feedback_pending,
                 )
 
+    async def _end_chat_session_postgres(
+        self,
+        user_id: int,
+        *,
+        notify_user: bool,
+        notify_partner: bool,
+        collect_feedback: bool,
+        ended_by_user: bool,
+    ) -> ChatCloseResult | None:
+        assert self._pool is not None
+        now_iso = self._now()
+        wants_user_feedback = collect_feedback and notify_user
+        wants_partner_feedback = collect_feedback and notify_partner
+        async with self._pool.acquire() as connection:
+            row = await connection.fetchrow(
+                self._resolve_query(POSTGRES_END_CHAT_SESSION),
+                user_id,
+                user_id,
+                user_id,
+                now_iso,
+                now_iso,
+                to_epoch(now_iso),
+                1 if ended_by_user else 0,
+                user_id,
+                user_id,
+                wants_user_feedback,
+                user_id,
+                wants_partner_feedback,
+                now_iso,
+            )
+        if row is None:
+            return None
+
+        pair_id = int(row["id"])
+        partner_id = int(row["partner_id"])
+        partner_is_virtual = partner_id < 0
+        self._pair_routes.drop(pair_id)
+        self._invalidate_user_snapshot(user_id, partner_id)
+        return ChatCloseResult(
+            pair_id=pair_id,
+            partner_id=partner_id,
+            partner_is_virtual=partner_is_virtual,
+            user_feedback_pending=wants_user_feedback and not partner_is_virtual,
+            partner_feedback_pending=wants_partner_feedback and not partner_is_virtual,
+        )
+
     async def skip_chat_session(self, user_id: int, *, skip_until: str) -> ChatCloseResult | None:
-        async with self.lock:
+        async with self._hold_pair_locks(user_id):
+            if self._is_postgres():
+                return await self._skip_chat_session_postgres(user_id, skip_until=skip_until)
             async with self.transaction() as connection:
                 pair = await self.get_active_pair(user_id, connection=connection)
                 if not pair:
@@ -803,14 +1799,14 @@ class Database:
 
                 await self.execute(
                     queries.UPDATE_SKIP_UNTIL,
-                    (skip_until, user_id),
+                    (skip_until, to_epoch(skip_until), user_id),
                     commit=False,
                     connection=connection,
                 )
                 if partner_is_virtual:
                     await self.execute(
                         queries.FINISH_VIRTUAL_AB_SESSION,
-                        (now_iso, 1, pair_id),
+                        (now_iso, to_epoch(now_iso), 1, pair_id),
                         commit=False,
                         connection=connection,
                     )
@@ -820,6 +1816,7 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._after_commit(lambda: self._pair_routes.drop(pair_id))
                 await self.execute(
                     queries.DELETE_PENDING_RATING,
                     (user_id,),
@@ -841,7 +1838,7 @@ class Database:
                 )
                 await self.execute(
                     queries.INSERT_QUEUE,
-                    (user_id, now_iso),
+                    (now_iso, to_epoch(now_iso), user_id),
                     commit=False,
                     connection=connection,
                 )
@@ -858,17 +1855,24 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._invalidate_user_snapshot(user_id, partner_id)
+                user = await self.get_user_snapshot(user_id, connection=connection)
 
-                return ChatCloseResult(
-                    pair_id=pair_id,
-                    partner_id=partner_id,
-                    partner_is_virtual=partner_is_virtual,
-                    user_feedback_pending=False,
-                    partner_feedback_pending=False,
-                )
+        self._sync_match_entry(user_id, user)
+        if not partner_is_virtual:
+            self._discard_match_entries(partner_id)
+        return ChatCloseResult(
+            pair_id=pair_id,
+            partner_id=partner_id,
+            partner_is_virtual=partner_is_virtual,
+            user_feedback_pending=False,
+            partner_feedback_pending=False,
+        )
 
     async def report_chat_session(self, reporter_id: int, reason: str) -> ChatCloseResult | None:
-        async with self.lock:
+        async with self._hold_pair_locks(reporter_id):
+            if self._is_postgres():
+                return await self._report_chat_session_postgres(reporter_id, reason)
             async with self.transaction() as connection:
                 pair = await self.get_active_pair(reporter_id, connection=connection)
                 if not pair:
@@ -900,6 +1904,7 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._after_commit(lambda: self._pair_routes.drop(pair_id))
                 await self.execute(
                     queries.UPDATE_STATE,
                     ("idle", reporter_id),
@@ -924,6 +1929,7 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._invalidate_user_snapshot(reporter_id, reported_id)
 
                 return ChatCloseResult(
                     pair_id=pair_id,
@@ -933,6 +1939,86 @@ class Database:
                     partner_feedback_pending=False,
                 )
 
+    async def _skip_chat_session_postgres(self, user_id: int, *, skip_until: str) -> ChatCloseResult | None:
+        assert self._pool is not None
+        now_iso = self._now()
+        now_ts = to_epoch(now_iso)
+        async with self._pool.acquire() as connection:
+            row = await connection.fetchrow(
+                self._resolve_query(POSTGRES_SKIP_CHAT_SESSION),
+                user_id,
+                user_id,
+                user_id,
+                now_iso,
+                now_iso,
+                now_ts,
+                user_id,
+                user_id,
+                skip_until,
+                user_id,
+                to_epoch(skip_until),
+                user_id,
+                user_id,
+                now_iso,
+                now_ts,
+                user_id,
+                user_id,
+                now_iso,
+            )
+        if row is None:
+            return None
+
+        pair_id = int(row["id"])
+        partner_id = int(row["partner_id"])
+        partner_is_virtual = partner_id < 0
+        self._pair_routes.drop(pair_id)
+        self._invalidate_user_snapshot(user_id, partner_id)
+        if self._local_caches:
+            self._sync_match_entry(user_id, await self.get_user_snapshot(user_id))
+        if not partner_is_virtual:
+            self._discard_match_entries(partner_id)
+        return ChatCloseResult(
+            pair_id=pair_id,
+            partner_id=partner_id,
+            partner_is_virtual=partner_is_virtual,
+            user_feedback_pending=False,
+            partner_feedback_pending=False,
+        )
+
+    async def _report_chat_session_postgres(self, reporter_id: int, reason: str) -> ChatCloseResult | None:
+        assert self._pool is not None
+        now_iso = self._now()
+        async with self._pool.acquire() as connection:
+            row = await connection.fetchrow(
+                self._resolve_query(POSTGRES_REPORT_CHAT_SESSION),
+                reporter_id,
+                reporter_id,
+                reporter_id,
+                reporter_id,
+                reason,
+                now_iso,
+                reporter_id,
+                reason,
+                now_iso,
+                now_iso,
+                reporter_id,
+                reporter_id,
+            )
+        if row is None:
+            return None
+
+        pair_id = int(row["id"])
+        reported_id = int(row["partner_id"])
+        self._pair_routes.drop(pair_id)
+        self._invalidate_user_snapshot(reporter_id, reported_id)
+        return ChatCloseResult(
+            pair_id=pair_id,
+            partner_id=reported_id,
+            partner_is_virtual=False,
+            user_feedback_pending=False,
+            partner_feedback_pending=False,
+        )
+
     async def cancel_search(self, user_id: int) -> bool:
         async with self.transaction() as connection:
             user = await self.get_user_snapshot(user_id, connection=connection)
@@ -950,7 +2036,9 @@ class Database:
                 commit=False,
                 connection=connection,
             )
-            return True
+        self._invalidate_user_snapshot(user_id)
+        self._discard_match_entries(user_id)
+        return True
 
     async def get_next_report(self) -> Optional[aiosqlite.Row]:
         return await self.fetchone(queries.SELECT_NEXT_REPORT)
@@ -1111,9 +2199,10 @@ class Database:
         companion_id: int,
         variant_key: str,
     ) -> None:
+        now_iso = self._now()
         await self.execute(
             queries.INSERT_VIRTUAL_AB_SESSION,
-            (pair_id, user_id, companion_id, variant_key.strip().lower(), self._now()),
+            (pair_id, user_id, companion_id, variant_key.strip().lower(), now_iso, to_epoch(now_iso)),
         )
 
     async def get_virtual_ab_session(self, pair_id: int):
@@ -1129,9 +2218,10 @@ class Database:
         await self.execute(queries.INCREMENT_VIRTUAL_AB_COMPANION_MESSAGE, (pair_id,))
 
     async def finish_virtual_ab_session(self, pair_id: int, *, ended_by_user: bool = False) -> None:
+        now_iso = self._now()
         await self.execute(
             queries.FINISH_VIRTUAL_AB_SESSION,
-            (self._now(), 1 if ended_by_user else 0, pair_id),
+            (now_iso, to_epoch(now_iso), 1 if ended_by_user else 0, pair_id),
         )
 
     async def get_virtual_ab_stats(self) -> dict[str, Any]:
@@ -1190,17 +2280,11 @@ class Database:
             if ended_at:
                 if user_messages < 3:
                     bucket["early_exits"] += 1
-                try:
-                    started_at_dt = datetime.fromisoformat(row["started_at"])
-                    ended_at_dt = datetime.fromisoformat(ended_at)
-                    duration_minutes = max(
-                        (ended_at_dt - started_at_dt).total_seconds() / 60.0,
-                        0.0,
-                    )
+                started_at_ts = int(row["started_at_ts"] or 0)
+                ended_at_ts = int(row["ended_at_ts"] or 0)
+                if started_at_ts and ended_at_ts:
                     bucket["duration_samples"] += 1
-                    bucket["duration_minutes_total"] += duration_minutes
-                except ValueError:
-                    pass
+                    bucket["duration_minutes_total"] += max(ended_at_ts - started_at_ts, 0) / 60.0
             else:
                 bucket["active"] += 1
                 active_sessions += 1
@@ -1246,7 +2330,7 @@ class Database:
         code: str,
     ) -> PromoRedemptionResult:
         normalized = code.upper()
-        async with self.lock:
+        async with self.locks.hold(user_id, ("promo", normalized)):
             async with self.transaction() as connection:
                 promo = await self.fetchone(
                     queries.SELECT_PROMO_CODE,
@@ -1295,7 +2379,7 @@ class Database:
                 )
                 await self.execute(
                     queries.UPDATE_PREMIUM_UNTIL,
-                    (new_until, user_id),
+                    (new_until, to_epoch(new_until), user_id),
                     commit=False,
                     connection=connection,
                 )
@@ -1306,11 +2390,15 @@ class Database:
                     connection=connection,
                 )
 
+                self._invalidate_user_snapshot(user_id)
+                premium_until_ts = to_epoch(new_until)
+                # The queue mirror must not show premium a rollback would take away.
+                self._after_commit(lambda: self._update_match_entry(user_id, premium_until_ts=premium_until_ts))
                 return PromoRedemptionResult("ok", days=days, premium_until=new_until)
 
     async def redeem_static_promo_code(self, user_id: int, code: str, days: int) -> PromoRedemptionResult:
         normalized = code.upper()
-        async with self.lock:
+        async with self.locks.hold(user_id):
             async with self.transaction() as connection:
                 used = await self.fetchone(
                     queries.SELECT_PROMO_USE,
@@ -1337,7 +2425,7 @@ class Database:
                 )
                 await self.execute(
                     queries.UPDATE_PREMIUM_UNTIL,
-                    (new_until, user_id),
+                    (new_until, to_epoch(new_until), user_id),
                     commit=False,
                     connection=connection,
                 )
@@ -1348,10 +2436,13 @@ class Database:
                     connection=connection,
                 )
 
+                self._invalidate_user_snapshot(user_id)
+                premium_until_ts = to_epoch(new_until)
+                self._after_commit(lambda: self._update_match_entry(user_id, premium_until_ts=premium_until_ts))
                 return PromoRedemptionResult("ok", days=days, premium_until=new_until)
 
     async def activate_trial(self, user_id: int, days: int) -> PromoRedemptionResult:
-        async with self.lock:
+        async with self.locks.hold(user_id):
             async with self.transaction() as connection:
                 user = await self.get_user_snapshot(user_id, connection=connection)
                 if not user:
@@ -1363,7 +2454,7 @@ class Database:
                 now_iso = self._now()
                 await self.execute(
                     queries.UPDATE_PREMIUM_UNTIL,
-                    (new_until, user_id),
+                    (new_until, to_epoch(new_until), user_id),
                     commit=False,
                     connection=connection,
                 )
@@ -1379,10 +2470,13 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._invalidate_user_snapshot(user_id)
+                premium_until_ts = to_epoch(new_until)
+                self._after_commit(lambda: self._update_match_entry(user_id, premium_until_ts=premium_until_ts))
                 return PromoRedemptionResult("ok", days=days, premium_until=new_until)
 
     async def grant_paid_premium(self, user_id: int, days: int, payload: str) -> str:
-        async with self.lock:
+        async with self.locks.hold(user_id):
             async with self.transaction() as connection:
                 current_row = await self.fetchone(
                     queries.SELECT_PREMIUM_UNTIL,
@@ -1394,7 +2488,7 @@ class Database:
                 now_iso = self._now()
                 await self.execute(
                     queries.UPDATE_PREMIUM_UNTIL,
-                    (new_until, user_id),
+                    (new_until, to_epoch(new_until), user_id),
                     commit=False,
                     connection=connection,
                 )
@@ -1404,6 +2498,14 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                await self._bump_stats_counter(
+                    "revenue_xtr",
+                    payment_amount_from_payload(payload),
+                    connection=connection,
+                )
+                self._invalidate_user_snapshot(user_id)
+                premium_until_ts = to_epoch(new_until)
+                self._after_commit(lambda: self._update_match_entry(user_id, premium_until_ts=premium_until_ts))
                 return new_until
 
     async def set_pending_rating(self, user_id: int, pair_id: int, target_id: int) -> None:
@@ -1427,7 +2529,7 @@ class Database:
         if value not in (-1, 1):
             return False, None
 
-        async with self.lock:
+        async with self.locks.hold(rater_id):
             async with self.transaction() as connection:
                 pending = await self.fetchone(
                     queries.SELECT_PENDING_RATING,
@@ -1468,6 +2570,7 @@ class Database:
                     commit=False,
                     connection=connection,
                 )
+                self._invalidate_user_snapshot(target_id)
                 await self.execute(
                     queries.DELETE_PENDING_RATING,
                     (rater_id,),
@@ -1569,85 +2672,324 @@ class Database:
         rows = await self.fetchall(queries.SELECT_VIRTUAL_DIALOG_MEMORY, (pair_id, limit))
         return list(reversed(rows))
 
-    async def add_broadcast_log(
-        self,
-        audience: str,
-        message: str,
-        sent_count: int,
-        failed_count: int,
-        created_by: int | None,
-    ) -> None:
-        await self.execute(
-            queries.INSERT_BROADCAST,
-            (audience, message, sent_count, failed_count, created_by, self._now()),
-        )
+    async def create_broadcast(self, audience: str, message: str, created_by: int | None) -> int:
+        params = (audience, message, created_by, self._now())
+        async with self.transaction() as connection:
+            if self._is_postgres():
+                return int(await connection.fetchval(self._resolve_query(POSTGRES_INSERT_BROADCAST), *params))
+            cursor = await connection.execute(queries.INSERT_BROADCAST, params)
+            return int(cursor.lastrowid)
+
+    async def get_broadcast(self, broadcast_id: int) -> Any:
+        return await self.fetchone(queries.SELECT_BROADCAST, (broadcast_id,))
 
     async def get_recent_broadcasts(self, limit: int = 8) -> list[aiosqlite.Row]:
         return await self.fetchall(queries.SELECT_RECENT_BROADCASTS, (limit,))
 
-    async def get_broadcast_user_ids(self, audience: str) -> list[int]:
-        if audience == "promo":
-            rows = await self.fetchall(
-                queries.SELECT_BROADCAST_NON_PREMIUM_USER_IDS,
-                (self._now(), self._now()),
+    async def get_running_broadcast_ids(self) -> list[int]:
+        rows = await self.fetchall(queries.SELECT_RUNNING_BROADCAST_IDS)
+        return [int(row["id"]) for row in rows]
+
+    async def claim_broadcast(self, broadcast_id: int, owner: str, lease_sec: int) -> bool:
+        # Takes or renews the job lease; fails if the job ended or another live instance holds it.
+        now = now_epoch()
+        async with self.transaction() as connection:
+            await self.execute(
+                queries.CLAIM_BROADCAST,
+                (owner, now + lease_sec, broadcast_id, owner, now),
+                commit=False,
+                connection=connection,
             )
+            row = await self.fetchone(queries.SELECT_BROADCAST, (broadcast_id,), connection=connection)
+        return bool(row) and row["status"] == "running" and row["owner"] == owner
+
+    async def release_broadcast(self, broadcast_id: int, owner: str) -> None:
+        await self.execute(queries.RELEASE_BROADCAST, (broadcast_id, owner))
+
+    async def enqueue_broadcast_recipients(self, broadcast_id: int, audience: str, cursor: int, limit: int) -> int:
+        # The next keyset page of the audience becomes pending deliveries; the cursor moves in the same
+        # transaction, so a restart neither skips nor repeats recipients.
+        now = now_epoch()
+        if audience == "promo":
+            query, filters = queries.ENQUEUE_BROADCAST_NON_PREMIUM_USERS, (now, now)
         elif audience == "inactive":
-            rows = await self.fetchall(
-                queries.SELECT_BROADCAST_INACTIVE_USER_IDS,
-                (self._now(), self._days_ago(3)),
-            )
+            query, filters = queries.ENQUEUE_BROADCAST_INACTIVE_USERS, (now, self._days_ago(3))
         else:
-            rows = await self.fetchall(
-                queries.SELECT_BROADCAST_ALL_USER_IDS,
-                (self._now(),),
+            query, filters = queries.ENQUEUE_BROADCAST_ALL_USERS, (now,)
+        async with self.transaction() as connection:
+            await self.execute(
+                query,
+                (broadcast_id, self._now(), cursor, *filters, limit),
+                commit=False,
+                connection=connection,
             )
+            row = await self.fetchone(
+                queries.SELECT_BROADCAST_ENQUEUED_SINCE,
+                (broadcast_id, cursor),
+                connection=connection,
+            )
+            added = int(row["count"]) if row else 0
+            next_cursor = int(row["cursor_user_id"]) if added else cursor
+            await self.execute(
+                queries.ADVANCE_BROADCAST_CURSOR,
+                (next_cursor, added, int(added < limit), broadcast_id),
+                commit=False,
+                connection=connection,
+            )
+        return added
+
+    async def get_pending_broadcast_recipients(self, broadcast_id: int, limit: int) -> list[int]:
+        rows = await self.fetchall(queries.SELECT_PENDING_BROADCAST_DELIVERIES, (broadcast_id, limit))
         return [int(row["user_id"]) for row in rows]
 
+    async def record_broadcast_results(self, broadcast_id: int, results: list[tuple[int, bool]]) -> None:
+        # Delivery states and the job totals move together, so progress survives a crash exactly.
+        if not results:
+            return
+        now = self._now()
+        sent_count = sum(1 for _, delivered in results if delivered)
+        async with self.transaction() as connection:
+            for user_id, delivered in results:
+                await self.execute(
+                    queries.UPDATE_BROADCAST_DELIVERY,
+                    ("sent" if delivered else "failed", now, broadcast_id, user_id),
+                    commit=False,
+                    connection=connection,
+                )
+            await self.execute(
+                queries.ADD_BROADCAST_RESULTS,
+                (sent_count, len(results) - sent_count, broadcast_id),
+                commit=False,
+                connection=connection,
+            )
+
+    async def finish_broadcast(self, broadcast_id: int, status: str) -> bool:
+        async with self.transaction() as connection:
+            row = await self.fetchone(queries.SELECT_BROADCAST, (broadcast_id,), connection=connection)
+            if not row or row["status"] != "running":
+                return False
+            await self.execute(
+                queries.FINISH_BROADCAST,
+                (status, self._now(), broadcast_id),
+                commit=False,
+                connection=connection,
+            )
+        return True
+
     async def stats(self) -> dict[str, int]:
-        users = await self.fetchone(queries.STATS_USERS)
-        active_chats = await self.fetchone(queries.STATS_ACTIVE_CHATS)
-        queue = await self.fetchone(queries.STATS_QUEUE)
-        reports = await self.fetchone(queries.STATS_REPORTS)
-        banned_perm = await self.fetchone(queries.STATS_BANNED)
-        banned_temp = await self.fetchone(queries.STATS_TEMP_BANNED, (self._now(),))
-        new_users_24h = await self.fetchone(queries.COUNT_USERS_CREATED_SINCE, (self._days_ago(1),))
-        new_users_7d = await self.fetchone(queries.COUNT_USERS_CREATED_SINCE, (self._days_ago(7),))
-        active_users_24h = await self.fetchone(queries.COUNT_USERS_SEEN_SINCE, (self._days_ago(1),))
-        engaged_users = await self.fetchone(queries.COUNT_USERS_WITH_CHATS)
-        premium_active = await self.fetchone(queries.COUNT_PREMIUM_ACTIVE, (self._now(),))
-        premium_buyers = await self.fetchone(queries.COUNT_PREMIUM_BUYERS)
-        premium_purchases = await self.fetchone(queries.COUNT_PAYMENT_INCIDENTS)
-        promo_users = await self.fetchone(queries.COUNT_PROMO_USERS)
-        promo_codes = await self.fetchone(queries.COUNT_PROMO_CODES)
-        virtual_users = await self.fetchone(queries.COUNT_VIRTUAL_CHAT_USERS)
-        active_virtual_chats = await self.fetchone(queries.COUNT_ACTIVE_VIRTUAL_CHATS)
-        payment_rows = await self.fetchall(queries.SELECT_PAYMENT_INCIDENTS)
-        banned = (int(banned_perm["count"]) if banned_perm else 0) + (
-            int(banned_temp["count"]) if banned_temp else 0
+        counters = await self.get_stats_counters()
+        window = await self.fetchone(
+            queries.STATS_WINDOWED,
+            (self._days_ago(1), self._days_ago(7), self._days_ago(1), now_epoch(), now_epoch()),
         )
-        revenue_xtr = sum(self._payment_amount_from_payload(row["payload"] or "") for row in payment_rows)
         return {
-            "users": int(users["count"]) if users else 0,
-            "active_chats": int(active_chats["count"]) if active_chats else 0,
-            "queue": int(queue["count"]) if queue else 0,
-            "reports": int(reports["count"]) if reports else 0,
-            "banned": banned,
-            "new_users_24h": int(new_users_24h["count"]) if new_users_24h else 0,
-            "new_users_7d": int(new_users_7d["count"]) if new_users_7d else 0,
-            "active_users_24h": int(active_users_24h["count"]) if active_users_24h else 0,
-            "engaged_users": int(engaged_users["count"]) if engaged_users else 0,
-            "premium_active": int(premium_active["count"]) if premium_active else 0,
-            "premium_buyers": int(premium_buyers["count"]) if premium_buyers else 0,
-            "premium_purchases": int(premium_purchases["count"]) if premium_purchases else 0,
-            "promo_users": int(promo_users["count"]) if promo_users else 0,
-            "promo_codes": int(promo_codes["count"]) if promo_codes else 0,
-            "virtual_users": int(virtual_users["count"]) if virtual_users else 0,
-            "active_virtual_chats": int(active_virtual_chats["count"]) if active_virtual_chats else 0,
-            "revenue_xtr": revenue_xtr,
+            "users": counters["users"],
+            "active_chats": counters["active_chats"],
+            "queue": int(window["queue_size"]) if window else 0,
+            "reports": counters["reports"],
+            "banned": counters["banned"] + (int(window["temp_banned"]) if window else 0),
+            "new_users_24h": int(window["new_users_24h"]) if window else 0,
+            "new_users_7d": int(window["new_users_7d"]) if window else 0,
+            "active_users_24h": int(window["active_users_24h"]) if window else 0,
+            "engaged_users": counters["engaged_users"],
+            "premium_active": int(window["premium_active"]) if window else 0,
+            "premium_buyers": counters["premium_buyers"],
+            "premium_purchases": counters["premium_purchases"],
+            "promo_users": counters["promo_users"],
+            "promo_codes": counters["promo_codes"],
+            "virtual_users": counters["virtual_users"],
+            "active_virtual_chats": counters["active_virtual_chats"],
+            "revenue_xtr": counters["revenue_xtr"],
         }
 
+    async def get_stats_counters(self) -> dict[str, int]:
+        rows = await self.fetchall(queries.SELECT_STATS_COUNTERS)
+        counters = dict.fromkeys(STATS_COUNTER_NAMES, 0)
+        counters.update({row["name"]: int(row["value"] or 0) for row in rows})
+        return counters
+
+    async def rebuild_stats_counters(self) -> dict[str, int]:
+        # Reconciliation: recount everything from the source tables and replace the counters.
+        async with self.transaction() as connection:
+            if self._is_postgres():
+                # Trigger bumps wait for this lock, so no change lands between count and replace.
+                await self.execute(POSTGRES_LOCK_STATS_COUNTERS, commit=False, connection=connection)
+            values = await self._count_stats_from_tables(connection)
+            await self.execute(queries.DELETE_STATS_COUNTERS, commit=False, connection=connection)
+            for name in STATS_COUNTER_NAMES:
+                for shard in range(counter_shards(self._dialect)):
+                    await self.execute(
+                        queries.INSERT_STATS_COUNTER,
+                        (name, shard, values[name] if shard == 0 else 0),
+                        commit=False,
+                        connection=connection,
+                    )
+        return values
+
+    async def _count_stats_from_tables(self, connection: Any) -> dict[str, int]:
+        count_queries = {
+            "users": queries.STATS_USERS,
+            "banned": queries.STATS_BANNED,
+            "engaged_users": queries.COUNT_USERS_WITH_CHATS,
+            "active_chats": queries.STATS_ACTIVE_CHATS,
+            "active_virtual_chats": queries.COUNT_ACTIVE_VIRTUAL_CHATS,
+            "virtual_users": queries.COUNT_VIRTUAL_CHAT_USERS,
+            "reports": queries.STATS_REPORTS,
+            "premium_purchases": queries.COUNT_PAYMENT_INCIDENTS,
+            "premium_buyers": queries.COUNT_PREMIUM_BUYERS,
+            "promo_users": queries.COUNT_PROMO_USERS,
+            "promo_codes": queries.COUNT_PROMO_CODES,
+        }
+        values: dict[str, int] = {}
+        for name, query in count_queries.items():
+            row = await self.fetchone(query, connection=connection)
+            values[name] = int(row["count"]) if row else 0
+        payment_rows = await self.fetchall(queries.SELECT_PAYMENT_INCIDENTS, connection=connection)
+        values["revenue_xtr"] = sum(payment_amount_from_payload(row["payload"] or "") for row in payment_rows)
+        return values
+
+    async def _ensure_stats_counters(self) -> None:
+        row = await self.fetchone(queries.COUNT_STATS_COUNTER_ROWS)
+        if not row or int(row["count"]) == 0:
+            await self.rebuild_stats_counters()
+
+    async def _bump_stats_counter(self, name: str, delta: int, *, connection: Any) -> None:
+        if not delta:
+            return
+        shard = random.randrange(counter_shards(self._dialect))
+        await self.execute(
+            queries.BUMP_STATS_COUNTER,
+            (delta, name, shard),
+            commit=False,
+            connection=connection,
+        )
+
+    def _start_stats_reconciler(self) -> None:
+        if self._stats_reconcile_sec > 0 and self._stats_reconcile_task is None:
+            self._stats_reconcile_task = asyncio.create_task(self._run_stats_reconciler())
+
+    async def _run_stats_reconciler(self) -> None:
+        while True:
+            await asyncio.sleep(self._stats_reconcile_sec)
+            try:
+                before = await self.get_stats_counters()
+                after = await self.rebuild_stats_counters()
+            except Exception:
+                logger.exception("Failed to reconcile stats counters")
+                continue
+            drift = {name: after[name] - before[name] for name in after if after[name] != before[name]}
+            if drift:
+                logger.warning("Stats counters drifted and were rebuilt: %s", drift)
+
+    async def roll_up_stats(self, now_ts: int | None = None) -> int:
+        # Rolls up closed hours past the watermark. The current day is recounted from midnight each
+        # time so its day row stays exact; upserts make reruns (or two instances) harmless.
+        until_ts = bucket_start(now_epoch() if now_ts is None else now_ts, "hour")
+        watermark = await self.get_setting(ROLLUP_WATERMARK_KEY)
+        if watermark.isdigit():
+            start_ts = int(watermark)
+        else:
+            row = await self.fetchone(queries.SELECT_FIRST_USER_CREATED_AT)
+            first_ts = to_epoch(row["created_at"]) if row else 0
+            start_ts = first_ts or until_ts
+        written = 0
+        day_ts = bucket_start(min(start_ts, until_ts), "day")
+        while day_ts < until_ts:
+            written += await self._roll_up_day(day_ts, min(day_ts + 86400, until_ts))
+            day_ts += 86400
+        return written
+
+    async def _roll_up_day(self, start_ts: int, end_ts: int) -> int:
+        bounds = (self._iso_from_epoch(start_ts), self._iso_from_epoch(end_ts))
+        rollups = aggregate_rollups(
+            start_ts,
+            end_ts,
+            users_created=await self.fetchall(queries.SELECT_ROLLUP_USERS_CREATED, bounds),
+            pairs_started=await self.fetchall(queries.SELECT_ROLLUP_PAIRS_STARTED, bounds),
+            pairs_ended=await self.fetchall(queries.SELECT_ROLLUP_PAIRS_ENDED, bounds),
+            payments=await self.fetchall(queries.SELECT_ROLLUP_PAYMENTS, bounds),
+        )
+        async with self.transaction() as connection:
+            for (bucket, period_start_ts), values in rollups.items():
+                await self.execute(
+                    queries.UPSERT_STATS_ROLLUP,
+                    (
+                        bucket,
+                        period_start_ts,
+                        self._iso_from_epoch(period_start_ts),
+                        values["new_users"],
+                        values["active_users"],
+                        values["chats_started"],
+                        values["human_chats"],
+                        values["virtual_chats"],
+                        values["chats_ended"],
+                        values["chat_seconds"],
+                        values["purchases"],
+                        values["revenue_xtr"],
+                    ),
+                    commit=False,
+                    connection=connection,
+                )
+            await self.execute(
+                queries.UPSERT_APP_SETTING,
+                (ROLLUP_WATERMARK_KEY, str(end_ts)),
+                commit=False,
+                connection=connection,
+            )
+        return len(rollups)
+
+    async def iter_stats_rollups(
+        self,
+        bucket: str,
+        since_ts: int,
+        until_ts: int,
+        page_size: int = 500,
+    ) -> AsyncIterator[Any]:
+        cursor = since_ts
+        while True:
+            rows = await self.fetchall(
+                queries.SELECT_STATS_ROLLUPS_PAGE,
+                (bucket, cursor, until_ts, page_size),
+            )
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                return
+            cursor = int(rows[-1]["period_start_ts"]) + 1
+
+    def export_columns(self, table: str) -> tuple[str, ...]:
+        return EXPORT_TABLES[table][2]
+
+    async def iter_export_rows(self, table: str, page_size: int = EXPORT_PAGE_SIZE) -> AsyncIterator[tuple]:
+        # One short query per page instead of a server-side cursor: no pooled connection or open
+        # transaction is pinned while the caller is busy uploading parts to Telegram.
+        query, key, columns = EXPORT_TABLES[table]
+        cursor = EXPORT_KEYSET_START
+        while True:
+            rows = await self.fetchall(query, (cursor, page_size))
+            for row in rows:
+                yield tuple(row[column] for column in columns)
+            if len(rows) < page_size:
+                return
+            cursor = rows[-1][key]
+
+    def _iso_from_epoch(self, ts: int) -> str:
+        return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+    def _start_stats_rollups(self) -> None:
+        if self._stats_rollup_sec > 0 and self._stats_rollup_task is None:
+            self._stats_rollup_task = asyncio.create_task(self._run_stats_rollups())
+
+    async def _run_stats_rollups(self) -> None:
+        while True:
+            try:
+                await self.roll_up_stats()
+            except Exception:
+                logger.exception("Failed to roll up stats")
+            await asyncio.sleep(self._stats_rollup_sec)
+
     async def get_active_user_ids(self) -> list[int]:
-        rows = await self.fetchall(queries.SELECT_ACTIVE_USERS, (self._now(),))
+        rows = await self.fetchall(queries.SELECT_ACTIVE_USERS, (now_epoch(),))
         return [int(row["user_id"]) for row in rows]
 
     async def get_all_user_ids(self) -> list[int]:
@@ -1693,12 +3035,17 @@ class Database:
         return int(row["count"]) if row else 0
 
     async def get_partner_history(self, user_id: int) -> set[int]:
+        cached = self._partner_index.get(user_id) if self._local_caches else None
+        if cached is not None:
+            return set(cached)
         rows = await self.fetchall(queries.SELECT_PARTNER_HISTORY, (user_id, user_id, user_id))
         result: set[int] = set()
         for row in rows:
             partner_id = row["partner_id"]
             if partner_id is not None:
                 result.add(int(partner_id))
+        if self._local_caches:
+            self._partner_index.store(user_id, result)
         return result
 
     async def get_interests(self, user_id: int) -> str:
@@ -1706,7 +3053,22 @@ class Database:
         return row["interests"] if row else ""
 
     async def set_interests(self, user_id: int, interests: str) -> None:
-        await self.execute(queries.UPDATE_INTERESTS, (interests, user_id))
+        mask = interests_mask(interests)
+        async with self.transaction() as connection:
+            await self.execute(
+                queries.UPDATE_INTERESTS,
+                (interests, mask, user_id),
+                commit=False,
+                connection=connection,
+            )
+            await self.execute(
+                queries.UPDATE_QUEUE_INTERESTS_MASK,
+                (mask, user_id),
+                commit=False,
+                connection=connection,
+            )
+            self._invalidate_user_snapshot(user_id)
+        self._update_match_entry(user_id, interests=interests, interests_mask=mask)
 
     async def get_only_interest(self, user_id: int) -> bool:
         row = await self.fetchone(queries.SELECT_ONLY_INTEREST, (user_id,))
@@ -1714,13 +3076,18 @@ class Database:
 
     async def set_only_interest(self, user_id: int, value: bool) -> None:
         await self.execute(queries.UPDATE_ONLY_INTEREST, (1 if value else 0, user_id))
+        self._invalidate_user_snapshot(user_id)
+        self._update_match_entry(user_id, only_interest=value)
 
     async def get_premium_until(self, user_id: int) -> str:
         row = await self.fetchone(queries.SELECT_PREMIUM_UNTIL, (user_id,))
         return row["premium_until"] if row else ""
 
     async def set_premium_until(self, user_id: int, premium_until: str) -> None:
-        await self.execute(queries.UPDATE_PREMIUM_UNTIL, (premium_until, user_id))
+        premium_until_ts = to_epoch(premium_until)
+        await self.execute(queries.UPDATE_PREMIUM_UNTIL, (premium_until, premium_until_ts, user_id))
+        self._invalidate_user_snapshot(user_id)
+        self._update_match_entry(user_id, premium_until_ts=premium_until_ts)
 
     async def get_trial_used(self, user_id: int) -> bool:
         row = await self.fetchone(queries.SELECT_TRIAL_USED, (user_id,))
@@ -1728,13 +3095,15 @@ class Database:
 
     async def set_trial_used(self, user_id: int, value: bool) -> None:
         await self.execute(queries.UPDATE_TRIAL_USED, (1 if value else 0, user_id))
+        self._invalidate_user_snapshot(user_id)
 
     async def get_skip_until(self, user_id: int) -> str:
         row = await self.fetchone(queries.SELECT_SKIP_UNTIL, (user_id,))
         return row["skip_until"] if row else ""
 
     async def set_skip_until(self, user_id: int, skip_until: str) -> None:
-        await self.execute(queries.UPDATE_SKIP_UNTIL, (skip_until, user_id))
+        await self.execute(queries.UPDATE_SKIP_UNTIL, (skip_until, to_epoch(skip_until), user_id))
+        self._invalidate_user_snapshot(user_id)
 
     async def get_auto_search(self, user_id: int) -> bool:
         row = await self.fetchone(queries.SELECT_AUTO_SEARCH, (user_id,))
@@ -1742,6 +3111,7 @@ class Database:
 
     async def set_auto_search(self, user_id: int, value: bool) -> None:
         await self.execute(queries.UPDATE_AUTO_SEARCH, (1 if value else 0, user_id))
+        self._invalidate_user_snapshot(user_id)
 
     async def get_content_filter(self, user_id: int) -> bool:
         row = await self.fetchone(queries.SELECT_CONTENT_FILTER, (user_id,))
@@ -1749,6 +3119,7 @@ class Database:
 
     async def set_content_filter(self, user_id: int, value: bool) -> None:
         await self.execute(queries.UPDATE_CONTENT_FILTER, (1 if value else 0, user_id))
+        self._invalidate_user_snapshot(user_id)
 
     async def get_lang(self, user_id: int) -> str:
         cached = self._lang_cache.get(user_id)
@@ -1764,37 +3135,9 @@ class Database:
     async def set_lang(self, user_id: int, lang: str) -> None:
         normalized = self._normalize_lang(lang)
         await self.execute(queries.UPDATE_LANG, (normalized, user_id))
+        self._invalidate_user_snapshot(user_id)
         self._lang_cache[user_id] = normalized
 
     async def get_all_premium_until(self) -> list[str]:
         rows = await self.fetchall(queries.SELECT_ALL_PREMIUM_UNTIL)
         return [row["premium_until"] for row in rows]
-
-    def _payment_amount_from_payload(self, payload: str) -> int:
-        normalized = (payload or "").strip()
-        if not normalized:
-            return 0
-
-        if "|" in normalized:
-            parts = normalized.split("|")
-            if len(parts) >= 2:
-                try:
-                    return int(parts[1])
-                except ValueError:
-                    return 0
-
-        if ":" in normalized and normalized.startswith("premium_"):
-            maybe_amount = normalized.split(":")[-1]
-            try:
-                return int(maybe_amount)
-            except ValueError:
-                pass
-
-        if normalized.startswith("premium_"):
-            try:
-                days = int(normalized.split("_", 1)[1])
-            except (IndexError, ValueError):
-                return 0
-            return {7: 29, 30: 99, 90: 249}.get(days, 0)
-
-        return 0
@@ -0,0 +1,109 @@
+from functools import lru_cache
+from typing import Iterable, List
+
+# Interest codes and their bitmask live with the data layer: masks are persisted in users/queue
+# and matched in SQL, so the schema must not depend on the bot package.
+
+DELIMITER = "|"
+
+INTEREST_CODES = [
+    "movies",
+    "music",
+    "sports",
+    "games",
+    "it",
+    "travel",
+    "books",
+]
+
+INTEREST_BITS: dict[str, int] = {code: 1 << index for index, code in enumerate(INTEREST_CODES)}
+
+INTEREST_ALIASES: dict[str, str] = {
+    # movies
+    "movies": "movies",
+    "movie": "movies",
+    "кино": "movies",
+    "кіно": "movies",
+    "filme": "movies",
+    "film": "movies",
+    # music
+    "music": "music",
+    "музыка": "music",
+    "музика": "music",
+    "musik": "music",
+    # sports
+    "sports": "sports",
+    "sport": "sports",
+    "спорт": "sports",
+    # games
+    "games": "games",
+    "game": "games",
+    "игры": "games",
+    "ігри": "games",
+    "spiele": "games",
+    "spiel": "games",
+    # it
+    "it": "it",
+    # travel
+    "travel": "travel",
+    "travels": "travel",
+    "путешествия": "travel",
+    "подорожі": "travel",
+    "reisen": "travel",
+    "reise": "travel",
+    # books
+    "books": "books",
+    "book": "books",
+    "книги": "books",
+    "bücher": "books",
+    "bucher": "books",
+    "buch": "books",
+}
+
+
+def normalize_interest(value: str) -> str | None:
+    if not value:
+        return None
+    key = value.strip().lower()
+    if not key:
+        return None
+    if key in INTEREST_ALIASES:
+        return INTEREST_ALIASES[key]
+    if key in INTEREST_CODES:
+        return key
+    return None
+
+
+def parse_interests(raw: str) -> List[str]:
+    if not raw:
+        return []
+    result: list[str] = []
+    seen: set[str] = set()
+    for item in raw.split(DELIMITER):
+        normalized = normalize_interest(item)
+        if not normalized or normalized in seen:
+            continue
+        seen.add(normalized)
+        result.append(normalized)
+    return result
+
+
+@lru_cache(maxsize=1024)
+def interests_mask(raw: str) -> int:
+    # Bit positions follow INTEREST_CODES: append new codes, never reorder them.
+    mask = 0
+    for code in parse_interests(raw):
+        mask |= INTEREST_BITS[code]
+    return mask
+
+
+def serialize_interests(items: Iterable[str]) -> str:
+    result: list[str] = []
+    seen: set[str] = set()
+    for item in items:
+        normalized = normalize_interest(item)
+        if not normalized or normalized in seen:
+            continue
+        seen.add(normalized)
+        result.append(normalized)
+    return DELIMITER.join(result)
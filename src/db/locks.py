@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+LOCK_STRIPES = 256
+
+
+class KeyedLockManager:
+    # Striped async mutexes. Keys hash onto a fixed pool of locks and a multi-key hold always
+    # acquires its stripes in ascending order, so overlapping holders can never deadlock.
+    def __init__(self, stripes: int = LOCK_STRIPES) -> None:
+        self._locks = [asyncio.Lock() for _ in range(max(1, stripes))]
+
+    def stripes_for(self, *keys: Hashable) -> list[int]:
+        return sorted({hash(key) % len(self._locks) for key in keys})
+
+    def locked(self, key: Hashable) -> bool:
+        return self._locks[hash(key) % len(self._locks)].locked()
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable) -> AsyncIterator[None]:
+        acquired: list[asyncio.Lock] = []
+        try:
+            for index in self.stripes_for(*keys):
+                lock = self._locks[index]
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
+
+from .queue_stats import RankIndex
+
+
+@dataclass(slots=True)
+class QueueEntry:
+    user_id: int
+    joined_at: str
+    joined_at_ts: int
+    interests: str
+    interests_mask: int
+    only_interest: bool
+    premium_until_ts: int
+    is_banned: bool
+    banned_until_ts: int
+    seq: int
+
+    def is_eligible(self, now_ts: int) -> bool:
+        return not self.is_banned and self.banned_until_ts <= now_ts
+
+    def as_row(self, *, seen_before: bool) -> dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "joined_at": self.joined_at,
+            "joined_at_ts": self.joined_at_ts,
+            "interests": self.interests,
+            "interests_mask": self.interests_mask,
+            "only_interest": 1 if self.only_interest else 0,
+            "premium_until_ts": self.premium_until_ts,
+            "seen_before": 1 if seen_before else 0,
+        }
+
+
+def mask_bits(mask: int) -> Iterator[int]:
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+def _row_value(row: Any, key: str, default: Any) -> Any:
+    try:
+        value = row[key]
+    except (KeyError, IndexError):
+        return default
+    return default if value is None else value
+
+
+class MatchQueue:
+    # In-process mirror of the `queue` table (joined with the user fields the matcher needs).
+    # Entries are kept in join order; every interest bit has its own ordered bucket so a
+    # candidate lookup only walks the buckets the searcher shares plus (optionally) the queue head.
+    # Sequence numbers follow join order and feed a Fenwick index for O(log n) queue positions.
+    def __init__(self) -> None:
+        self._entries: dict[int, QueueEntry] = {}
+        self._buckets: dict[int, dict[int, None]] = {}
+        self._ranks = RankIndex()
+        self._next_seq = 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._entries
+
+    def __iter__(self) -> Iterator[QueueEntry]:
+        return iter(list(self._entries.values()))
+
+    def get(self, user_id: int) -> QueueEntry | None:
+        return self._entries.get(user_id)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+        self._ranks.clear()
+        self._next_seq = 1
+
+    def position(self, user_id: int) -> int:
+        entry = self._entries.get(user_id)
+        return self._ranks.rank(entry.seq) if entry is not None else 0
+
+    def load(self, rows: Iterable[Any]) -> None:
+        self.clear()
+        ordered = sorted(
+            rows,
+            key=lambda row: (_row_value(row, "joined_at_ts", 0), _row_value(row, "joined_at", "")),
+        )
+        for row in ordered:
+            self.add_row(row)
+
+    def add_row(self, row: Any) -> QueueEntry:
+        return self.add(
+            int(row["user_id"]),
+            joined_at=_row_value(row, "joined_at", ""),
+            joined_at_ts=int(_row_value(row, "joined_at_ts", 0)),
+            interests=_row_value(row, "interests", ""),
+            interests_mask=int(_row_value(row, "interests_mask", 0)),
+            only_interest=bool(_row_value(row, "only_interest", 0)),
+            premium_until_ts=int(_row_value(row, "premium_until_ts", 0)),
+            is_banned=bool(_row_value(row, "is_banned", 0)),
+            banned_until_ts=int(_row_value(row, "banned_until_ts", 0)),
+        )
+
+    def add(
+        self,
+        user_id: int,
+        *,
+        joined_at: str,
+        joined_at_ts: int = 0,
+        interests: str = "",
+        interests_mask: int = 0,
+        only_interest: bool = False,
+        premium_until_ts: int = 0,
+        is_banned: bool = False,
+        banned_until_ts: int = 0,
+    ) -> QueueEntry:
+        previous = self._entries.get(user_id)
+        if previous is not None and previous.joined_at == joined_at:
+            # Same queue stint (a snapshot refresh): keep the user's place in line.
+            self.update(
+                user_id,
+                joined_at_ts=joined_at_ts,
+                interests=interests,
+                interests_mask=interests_mask,
+                only_interest=only_interest,
+                premium_until_ts=premium_until_ts,
+                is_banned=is_banned,
+                banned_until_ts=banned_until_ts,
+            )
+            return previous
+        self.discard(user_id)
+        entry = QueueEntry(
+            user_id=user_id,
+            joined_at=joined_at,
+            joined_at_ts=joined_at_ts,
+            interests=interests,
+            interests_mask=interests_mask,
+            only_interest=only_interest,
+            premium_until_ts=premium_until_ts,
+            is_banned=is_banned,
+            banned_until_ts=banned_until_ts,
+            seq=self._take_seq(),
+        )
+        self._entries[user_id] = entry
+        self._ranks.add(entry.seq)
+        for bit in mask_bits(interests_mask):
+            self._buckets.setdefault(bit, {})[user_id] = None
+        return entry
+
+    def discard(self, user_id: int) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._ranks.remove(entry.seq)
+        for bit in mask_bits(entry.interests_mask):
+            bucket = self._buckets.get(bit)
+            if bucket is None:
+                continue
+            bucket.pop(user_id, None)
+            if not bucket:
+                del self._buckets[bit]
+        return True
+
+    def update(self, user_id: int, **fields: Any) -> bool:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False
+
+        if "interests_mask" in fields and int(fields["interests_mask"] or 0) == entry.interests_mask:
+            fields.pop("interests_mask")
+        if "interests_mask" in fields:
+            new_mask = int(fields.pop("interests_mask") or 0)
+            for bit in mask_bits(entry.interests_mask & ~new_mask):
+                bucket = self._buckets.get(bit)
+                if bucket is not None:
+                    bucket.pop(user_id, None)
+                    if not bucket:
+                        del self._buckets[bit]
+            entry.interests_mask = new_mask
+            for bit in mask_bits(new_mask):
+                self._rebuild_bucket(bit)
+
+        for name, value in fields.items():
+            if name in {"only_interest", "is_banned"}:
+                value = bool(value)
+            setattr(entry, name, value)
+        return True
+
+    def _take_seq(self) -> int:
+        if self._next_seq > self._ranks.capacity and len(self._entries) * 4 < self._ranks.capacity:
+            # Churn exhausted the index while the queue stayed small: renumber instead of growing.
+            for seq, entry in enumerate(self._entries.values(), start=1):
+                entry.seq = seq
+            self._next_seq = len(self._entries) + 1
+            self._ranks.rebuild(range(1, self._next_seq))
+        seq = self._next_seq
+        self._next_seq += 1
+        return seq
+
+    def _rebuild_bucket(self, bit: int) -> None:
+        # Keep buckets in join order even when a queued user edits interests.
+        self._buckets[bit] = {
+            user_id: None for user_id, entry in self._entries.items() if entry.interests_mask & bit
+        }
+
+    def candidates(
+        self,
+        user_id: int,
+        interests_mask: int,
+        *,
+        now_ts: int,
+        limit: int,
+        overlap_only: bool = False,
+    ) -> list[QueueEntry]:
+        picked: dict[int, QueueEntry] = {}
+
+        def take(user_ids: Iterable[int]) -> None:
+            taken = 0
+            for candidate_id in user_ids:
+                if taken >= limit:
+                    return
+                if candidate_id == user_id or candidate_id in picked:
+                    continue
+                entry = self._entries[candidate_id]
+                if not entry.is_eligible(now_ts):
+                    continue
+                picked[candidate_id] = entry
+                taken += 1
+
+        for bit in mask_bits(interests_mask):
+            bucket = self._buckets.get(bit)
+            if bucket:
+                take(bucket)
+        if not overlap_only:
+            take(self._entries)
+
+        return sorted(picked.values(), key=lambda entry: entry.seq)
@@ -6,6 +6,15 @@ from datetime import datetime, timezone
 from typing import Any
 
 from . import queries
+from .interests import interests_mask
+from .stats_counters import (
+    SQLITE_STATS_TRIGGERS,
+    STATS_COUNTERS_TABLE_SQL,
+    STATS_WINDOW_INDEX_SQL,
+    postgres_trigger_statements,
+)
+from .stats_rollups import STATS_ROLLUP_INDEX_SQL, STATS_ROLLUPS_TABLE_SQL
+from .timestamps import to_epoch
 
 MigrationApplyFn = Callable[[Any], Awaitable[None]]
 
@@ -41,6 +50,35 @@ REPORT_COLUMN_DEFINITIONS: tuple[tuple[str, str], ...] = (
     ("resolved_by", "BIGINT"),
 )
 
+# (table, key column, ISO-8601 text columns that get a `<column>_ts` epoch-seconds shadow)
+EPOCH_SHADOW_COLUMNS: tuple[tuple[str, str, tuple[str, ...]], ...] = (
+    ("users", "user_id", ("banned_until", "muted_until", "premium_until", "skip_until")),
+    ("queue", "user_id", ("joined_at",)),
+    ("virtual_ab_sessions", "pair_id", ("started_at", "ended_at")),
+)
+
+INTERESTS_MASK_COLUMN: tuple[tuple[str, str], ...] = (
+    ("interests_mask", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+INTERESTS_MASK_QUEUE_BACKFILL_SQL = """
+UPDATE queue
+SET interests_mask = COALESCE(
+    (SELECT u.interests_mask FROM users u WHERE u.user_id = queue.user_id),
+    0
+)
+"""
+
+INTERESTS_MASK_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_queue_interests_mask_joined_at
+ON queue(interests_mask, joined_at_ts, user_id)
+"""
+
+EPOCH_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_queue_joined_at_ts ON queue(joined_at_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_users_premium_until_ts ON users(premium_until_ts)",
+)
+
 
 @dataclass(frozen=True, slots=True)
 class Migration:
@@ -137,6 +175,153 @@ async def _apply_report_columns_postgres(connection: Any) -> None:
     await connection.execute(REPORT_STATUS_INDEX_SQL)
 
 
+def _epoch_column_definitions(columns: tuple[str, ...]) -> tuple[tuple[str, str], ...]:
+    return tuple((f"{column}_ts", "BIGINT NOT NULL DEFAULT 0") for column in columns)
+
+
+def _epoch_backfill_select(table: str, key: str, columns: tuple[str, ...]) -> str:
+    filled = " OR ".join(f"{column} != ''" for column in columns)
+    return f"SELECT {key}, {', '.join(columns)} FROM {table} WHERE {filled}"
+
+
+def _epoch_backfill_values(rows: Any, key: str, columns: tuple[str, ...]) -> list[tuple[Any, ...]]:
+    return [(*(to_epoch(row[column]) for column in columns), row[key]) for row in rows]
+
+
+async def _apply_epoch_columns_sqlite(connection: Any) -> None:
+    for table, key, columns in EPOCH_SHADOW_COLUMNS:
+        await _add_missing_sqlite_columns(connection, table, _epoch_column_definitions(columns))
+        async with connection.execute(_epoch_backfill_select(table, key, columns)) as cursor:
+            rows = await cursor.fetchall()
+        values = _epoch_backfill_values(rows, key, columns)
+        if values:
+            assignments = ", ".join(f"{column}_ts = ?" for column in columns)
+            await connection.executemany(
+                f"UPDATE {table} SET {assignments} WHERE {key} = ?",
+                values,
+            )
+    for statement in EPOCH_INDEX_SQL:
+        await connection.execute(statement)
+
+
+async def _apply_epoch_columns_postgres(connection: Any) -> None:
+    for table, key, columns in EPOCH_SHADOW_COLUMNS:
+        await _add_missing_postgres_columns(connection, table, _epoch_column_definitions(columns))
+        rows = await connection.fetch(_epoch_backfill_select(table, key, columns))
+        values = _epoch_backfill_values(rows, key, columns)
+        if values:
+            assignments = ", ".join(
+                f"{column}_ts = ${index}" for index, column in enumerate(columns, start=1)
+            )
+            await connection.executemany(
+                f"UPDATE {table} SET {assignments} WHERE {key} = ${len(columns) + 1}",
+                values,
+            )
+    for statement in EPOCH_INDEX_SQL:
+        await connection.execute(statement)
+
+
+def _interests_mask_values(rows: Any) -> list[tuple[int, Any]]:
+    return [(interests_mask(row["interests"] or ""), row["user_id"]) for row in rows]
+
+
+async def _apply_interests_mask_sqlite(connection: Any) -> None:
+    await _add_missing_sqlite_columns(connection, "users", INTERESTS_MASK_COLUMN)
+    await _add_missing_sqlite_columns(connection, "queue", INTERESTS_MASK_COLUMN)
+    async with connection.execute("SELECT user_id, interests FROM users WHERE interests != ''") as cursor:
+        rows = await cursor.fetchall()
+    values = _interests_mask_values(rows)
+    if values:
+        await connection.executemany("UPDATE users SET interests_mask = ? WHERE user_id = ?", values)
+    await connection.execute(INTERESTS_MASK_QUEUE_BACKFILL_SQL)
+    await connection.execute(INTERESTS_MASK_INDEX_SQL)
+
+
+async def _apply_interests_mask_postgres(connection: Any) -> None:
+    await _add_missing_postgres_columns(connection, "users", INTERESTS_MASK_COLUMN)
+    await _add_missing_postgres_columns(connection, "queue", INTERESTS_MASK_COLUMN)
+    rows = await connection.fetch("SELECT user_id, interests FROM users WHERE interests != ''")
+    values = _interests_mask_values(rows)
+    if values:
+        await connection.executemany("UPDATE users SET interests_mask = $1 WHERE user_id = $2", values)
+    await connection.execute(INTERESTS_MASK_QUEUE_BACKFILL_SQL)
+    await connection.execute(INTERESTS_MASK_INDEX_SQL)
+
+
+async def _apply_stats_counters_sqlite(connection: Any) -> None:
+    # Counters start empty; Database.connect() rebuilds them from the tables on first use.
+    await connection.execute(STATS_COUNTERS_TABLE_SQL)
+    for statement in (*STATS_WINDOW_INDEX_SQL, *SQLITE_STATS_TRIGGERS):
+        await connection.execute(statement)
+
+
+async def _apply_stats_counters_postgres(connection: Any) -> None:
+    await connection.execute(STATS_COUNTERS_TABLE_SQL)
+    for statement in (*STATS_WINDOW_INDEX_SQL, *postgres_trigger_statements()):
+        await connection.execute(statement)
+
+
+async def _apply_stats_rollups(connection: Any) -> None:
+    # Both drivers take plain DDL; the rollup job backfills history on its first run.
+    await connection.execute(STATS_ROLLUPS_TABLE_SQL)
+    for statement in STATS_ROLLUP_INDEX_SQL:
+        await connection.execute(statement)
+
+
+BROADCAST_JOB_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("status", "TEXT NOT NULL DEFAULT 'done'"),
+    ("total_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("cursor_user_id", "BIGINT NOT NULL DEFAULT 0"),
+    ("enumerated", "INTEGER NOT NULL DEFAULT 0"),
+    ("owner", "TEXT NOT NULL DEFAULT ''"),
+    ("lease_until_ts", "BIGINT NOT NULL DEFAULT 0"),
+    ("finished_at", "TEXT NOT NULL DEFAULT ''"),
+)
+
+BROADCAST_DELIVERIES_SQL = (
+    """
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated_at TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (broadcast_id, user_id)
+)
+""",
+    "CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_status ON broadcast_deliveries(broadcast_id, status, user_id)",
+)
+
+
+async def _apply_broadcast_jobs_sqlite(connection: Any) -> None:
+    # Rows logged before jobs existed keep the 'done' default.
+    await _add_missing_sqlite_columns(connection, "broadcasts", BROADCAST_JOB_COLUMNS)
+    for statement in BROADCAST_DELIVERIES_SQL:
+        await connection.execute(statement)
+
+
+async def _apply_broadcast_jobs_postgres(connection: Any) -> None:
+    await _add_missing_postgres_columns(connection, "broadcasts", BROADCAST_JOB_COLUMNS)
+    for statement in BROADCAST_DELIVERIES_SQL:
+        await connection.execute(statement)
+
+
+REACHABLE_COLUMN: tuple[tuple[str, str], ...] = (
+    ("reachable", "INTEGER NOT NULL DEFAULT 1"),
+)
+
+REACHABLE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_users_reachable_user_id ON users(reachable, user_id)"
+
+
+async def _apply_reachable_sqlite(connection: Any) -> None:
+    await _add_missing_sqlite_columns(connection, "users", REACHABLE_COLUMN)
+    await connection.execute(REACHABLE_INDEX_SQL)
+
+
+async def _apply_reachable_postgres(connection: Any) -> None:
+    await _add_missing_postgres_columns(connection, "users", REACHABLE_COLUMN)
+    await connection.execute(REACHABLE_INDEX_SQL)
+
+
 MIGRATIONS: tuple[Migration, ...] = (
     Migration(
         version="0001",
@@ -156,6 +341,42 @@ MIGRATIONS: tuple[Migration, ...] = (
         apply_sqlite=_apply_report_columns_sqlite,
         apply_postgres=_apply_report_columns_postgres,
     ),
+    Migration(
+        version="0004",
+        description="epoch_shadow_columns",
+        apply_sqlite=_apply_epoch_columns_sqlite,
+        apply_postgres=_apply_epoch_columns_postgres,
+    ),
+    Migration(
+        version="0005",
+        description="interests_mask",
+        apply_sqlite=_apply_interests_mask_sqlite,
+        apply_postgres=_apply_interests_mask_postgres,
+    ),
+    Migration(
+        version="0006",
+        description="stats_counters",
+        apply_sqlite=_apply_stats_counters_sqlite,
+        apply_postgres=_apply_stats_counters_postgres,
+    ),
+    Migration(
+        version="0007",
+        description="stats_rollups",
+        apply_sqlite=_apply_stats_rollups,
+        apply_postgres=_apply_stats_rollups,
+    ),
+    Migration(
+        version="0008",
+        description="broadcast_jobs",
+        apply_sqlite=_apply_broadcast_jobs_sqlite,
+        apply_postgres=_apply_broadcast_jobs_postgres,
+    ),
+    Migration(
+        version="0009",
+        description="users_reachable",
+        apply_sqlite=_apply_reachable_sqlite,
+        apply_postgres=_apply_reachable_postgres,
+    ),
 )
 
 
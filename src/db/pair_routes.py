@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+
+class PairRoutes:
+    # user_id -> (pair_id, partner_id) for every active pair, so relaying a message does not
+    # have to look the pair up. Virtual companions (negative ids) only appear as partners.
+    def __init__(self) -> None:
+        self._routes: dict[int, tuple[int, int]] = {}
+        self._pairs: dict[int, tuple[int, int]] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def get(self, user_id: int) -> tuple[int, int] | None:
+        return self._routes.get(user_id)
+
+    def clear(self) -> None:
+        self._routes.clear()
+        self._pairs.clear()
+
+    def load(self, rows: Iterable[Any]) -> None:
+        self.clear()
+        for row in rows:
+            self.add(int(row["id"]), int(row["user1_id"]), int(row["user2_id"]))
+
+    def add(self, pair_id: int, user1_id: int, user2_id: int) -> None:
+        self._pairs[pair_id] = (user1_id, user2_id)
+        if user1_id >= 0:
+            self._routes[user1_id] = (pair_id, user2_id)
+        if user2_id >= 0:
+            self._routes[user2_id] = (pair_id, user1_id)
+
+    def drop(self, pair_id: int) -> None:
+        self.version += 1
+        users = self._pairs.pop(pair_id, None)
+        if users is None:
+            return
+        for user_id in users:
+            route = self._routes.get(user_id)
+            if route is not None and route[0] == pair_id:
+                del self._routes[user_id]
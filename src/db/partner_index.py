@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Iterable
+
+PARTNER_INDEX_CAPACITY = 50_000
+
+
+class PartnerIndex:
+    # Bounded LRU of per-user "seen partner" sets. A user's set is read from `pairs` once and is
+    # then kept current by `record` (called for every inserted pair), so repeat checks are O(1).
+    def __init__(self, capacity: int = PARTNER_INDEX_CAPACITY) -> None:
+        self._capacity = max(1, capacity)
+        self._seen: OrderedDict[int, set[int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._seen
+
+    def clear(self) -> None:
+        self._seen.clear()
+
+    def get(self, user_id: int) -> set[int] | None:
+        partners = self._seen.get(user_id)
+        if partners is not None:
+            self._seen.move_to_end(user_id)
+        return partners
+
+    def store(self, user_id: int, partner_ids: Iterable[int]) -> set[int]:
+        partners = set(partner_ids)
+        self._seen[user_id] = partners
+        self._seen.move_to_end(user_id)
+        while len(self._seen) > self._capacity:
+            self._seen.popitem(last=False)
+        return partners
+
+    def record(self, user1_id: int, user2_id: int) -> None:
+        partners = self._seen.get(user1_id)
+        if partners is not None:
+            partners.add(user2_id)
+        partners = self._seen.get(user2_id)
+        if partners is not None:
+            partners.add(user1_id)
+
+    def missing(self, user_ids: Iterable[int]) -> list[int]:
+        return [user_id for user_id in user_ids if user_id not in self._seen]
+
+    def has_seen(self, user_id: int, partner_id: int) -> bool:
+        partners = self._seen.get(user_id)
+        if partners is not None:
+            return partner_id in partners
+        partners = self._seen.get(partner_id)
+        return partners is not None and user_id in partners
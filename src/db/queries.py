@@ -19,7 +19,13 @@ CREATE TABLE IF NOT EXISTS users (
     skip_until TEXT NOT NULL DEFAULT '',
     auto_search INTEGER NOT NULL DEFAULT 0,
     content_filter INTEGER NOT NULL DEFAULT 1,
-    lang TEXT NOT NULL DEFAULT 'ru'
+    lang TEXT NOT NULL DEFAULT 'ru',
+    banned_until_ts BIGINT NOT NULL DEFAULT 0,
+    muted_until_ts BIGINT NOT NULL DEFAULT 0,
+    premium_until_ts BIGINT NOT NULL DEFAULT 0,
+    skip_until_ts BIGINT NOT NULL DEFAULT 0,
+    interests_mask INTEGER NOT NULL DEFAULT 0,
+    reachable INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE TABLE IF NOT EXISTS pairs (
@@ -33,7 +39,9 @@ CREATE TABLE IF NOT EXISTS pairs (
 
 CREATE TABLE IF NOT EXISTS queue (
     user_id INTEGER PRIMARY KEY,
-    joined_at TEXT NOT NULL
+    joined_at TEXT NOT NULL,
+    joined_at_ts BIGINT NOT NULL DEFAULT 0,
+    interests_mask INTEGER NOT NULL DEFAULT 0
 );
 
 CREATE TABLE IF NOT EXISTS reports (
@@ -121,7 +129,9 @@ CREATE TABLE IF NOT EXISTS virtual_ab_sessions (
     user_messages INTEGER NOT NULL DEFAULT 0,
     companion_messages INTEGER NOT NULL DEFAULT 0,
     media_messages INTEGER NOT NULL DEFAULT 0,
-    ended_by_user INTEGER NOT NULL DEFAULT 0
+    ended_by_user INTEGER NOT NULL DEFAULT 0,
+    started_at_ts BIGINT NOT NULL DEFAULT 0,
+    ended_at_ts BIGINT NOT NULL DEFAULT 0
 );
 
 CREATE TABLE IF NOT EXISTS app_settings (
@@ -129,6 +139,29 @@ CREATE TABLE IF NOT EXISTS app_settings (
     value TEXT NOT NULL
 );
 
+CREATE TABLE IF NOT EXISTS stats_counters (
+    name TEXT NOT NULL,
+    shard INTEGER NOT NULL DEFAULT 0,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE TABLE IF NOT EXISTS stats_rollups (
+    bucket TEXT NOT NULL,
+    period_start_ts BIGINT NOT NULL,
+    period_start TEXT NOT NULL,
+    new_users INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    chats_started INTEGER NOT NULL DEFAULT 0,
+    human_chats INTEGER NOT NULL DEFAULT 0,
+    virtual_chats INTEGER NOT NULL DEFAULT 0,
+    chats_ended INTEGER NOT NULL DEFAULT 0,
+    chat_seconds BIGINT NOT NULL DEFAULT 0,
+    purchases INTEGER NOT NULL DEFAULT 0,
+    revenue_xtr BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, period_start_ts)
+);
+
 CREATE TABLE IF NOT EXISTS broadcasts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     audience TEXT NOT NULL,
@@ -136,7 +169,22 @@ CREATE TABLE IF NOT EXISTS broadcasts (
     sent_count INTEGER NOT NULL DEFAULT 0,
     failed_count INTEGER NOT NULL DEFAULT 0,
     created_by INTEGER,
-    created_at TEXT NOT NULL
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'done',
+    total_count INTEGER NOT NULL DEFAULT 0,
+    cursor_user_id BIGINT NOT NULL DEFAULT 0,
+    enumerated INTEGER NOT NULL DEFAULT 0,
+    owner TEXT NOT NULL DEFAULT '',
+    lease_until_ts BIGINT NOT NULL DEFAULT 0,
+    finished_at TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    updated_at TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (broadcast_id, user_id)
 );
 
 CREATE INDEX IF NOT EXISTS idx_queue_joined_at ON queue(joined_at);
@@ -150,11 +198,12 @@ CREATE INDEX IF NOT EXISTS idx_incidents_actor_created_at ON incidents(actor_id,
 CREATE INDEX IF NOT EXISTS idx_incidents_target_created_at ON incidents(target_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_media_archive_created_at ON media_archive(created_at);
 CREATE INDEX IF NOT EXISTS idx_virtual_dialog_memory_pair_id_id ON virtual_dialog_memory(pair_id, id);
+CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_status ON broadcast_deliveries(broadcast_id, status, user_id);
 """
 
 SELECT_USER = "SELECT * FROM users WHERE user_id = ?"
 SELECT_USER_WITH_QUEUE = """
-SELECT u.*, q.joined_at
+SELECT u.*, q.joined_at, q.joined_at_ts
 FROM users u
 LEFT JOIN queue q ON q.user_id = u.user_id
 WHERE u.user_id = ?
@@ -193,57 +242,45 @@ SET username = ?, first_name = ?, last_name = ?, last_seen_at = ?
 WHERE user_id = ?
 """
 UPDATE_BANNED = "UPDATE users SET is_banned = ? WHERE user_id = ?"
-UPDATE_BANNED_UNTIL = "UPDATE users SET banned_until = ? WHERE user_id = ?"
-UPDATE_MUTED_UNTIL = "UPDATE users SET muted_until = ? WHERE user_id = ?"
+UPDATE_BANNED_UNTIL = "UPDATE users SET banned_until = ?, banned_until_ts = ? WHERE user_id = ?"
+UPDATE_MUTED_UNTIL = "UPDATE users SET muted_until = ?, muted_until_ts = ? WHERE user_id = ?"
 INCREMENT_CHATS = "UPDATE users SET chats_count = chats_count + 1 WHERE user_id = ?"
 INCREMENT_RATING = "UPDATE users SET rating = rating + ? WHERE user_id = ?"
-UPDATE_INTERESTS = "UPDATE users SET interests = ? WHERE user_id = ?"
+UPDATE_INTERESTS = "UPDATE users SET interests = ?, interests_mask = ? WHERE user_id = ?"
+UPDATE_QUEUE_INTERESTS_MASK = "UPDATE queue SET interests_mask = ? WHERE user_id = ?"
 UPDATE_ONLY_INTEREST = "UPDATE users SET only_interest = ? WHERE user_id = ?"
-UPDATE_PREMIUM_UNTIL = "UPDATE users SET premium_until = ? WHERE user_id = ?"
+UPDATE_PREMIUM_UNTIL = "UPDATE users SET premium_until = ?, premium_until_ts = ? WHERE user_id = ?"
 UPDATE_TRIAL_USED = "UPDATE users SET trial_used = ? WHERE user_id = ?"
-UPDATE_SKIP_UNTIL = "UPDATE users SET skip_until = ? WHERE user_id = ?"
+UPDATE_SKIP_UNTIL = "UPDATE users SET skip_until = ?, skip_until_ts = ? WHERE user_id = ?"
 UPDATE_AUTO_SEARCH = "UPDATE users SET auto_search = ? WHERE user_id = ?"
 UPDATE_CONTENT_FILTER = "UPDATE users SET content_filter = ? WHERE user_id = ?"
 UPDATE_LANG = "UPDATE users SET lang = ? WHERE user_id = ?"
+UPDATE_REACHABLE = "UPDATE users SET reachable = ? WHERE user_id = ?"
 
-INSERT_QUEUE = "INSERT OR REPLACE INTO queue (user_id, joined_at) VALUES (?, ?)"
+INSERT_QUEUE = """
+INSERT OR REPLACE INTO queue (user_id, joined_at, joined_at_ts, interests_mask)
+SELECT user_id, ?, ?, interests_mask
+FROM users
+WHERE user_id = ?
+"""
 DELETE_QUEUE = "DELETE FROM queue WHERE user_id = ?"
 SELECT_QUEUE_SIZE = "SELECT COUNT(*) AS count FROM queue"
 SELECT_QUEUE_JOINED_AT = "SELECT joined_at FROM queue WHERE user_id = ?"
 SELECT_QUEUE_POSITION = """
-SELECT COUNT(*) + 1 AS pos
-FROM queue
-WHERE joined_at < (SELECT joined_at FROM queue WHERE user_id = ?)
-"""
-
-SELECT_SEARCH_STATUS = """
-SELECT
-    u.interests,
-    u.only_interest,
-    u.premium_until,
-    CASE
-        WHEN q.joined_at IS NULL THEN 0
-        ELSE (
-            SELECT COUNT(*) + 1
-            FROM queue q2
-            WHERE q2.joined_at < q.joined_at
-        )
-    END AS position,
-    (SELECT COUNT(*) FROM queue) AS queue_size
-FROM users u
-LEFT JOIN queue q ON q.user_id = u.user_id
-WHERE u.user_id = ?
-LIMIT 1
+SELECT COUNT(*) AS pos
+FROM queue q
+JOIN queue me ON me.user_id = ?
+WHERE q.joined_at <= me.joined_at
 """
-
 SELECT_QUEUE_CANDIDATE = """
 SELECT q.user_id
 FROM queue q
 JOIN users u ON u.user_id = q.user_id
 WHERE q.user_id != ?
   AND u.state = 'searching'
+  AND u.reachable = 1
   AND u.is_banned = 0
-  AND (u.banned_until = '' OR u.banned_until <= ?)
+  AND u.banned_until_ts <= ?
 ORDER BY q.joined_at ASC
 LIMIT 1
 """
@@ -254,21 +291,23 @@ FROM queue q
 JOIN users u ON u.user_id = q.user_id
 WHERE q.user_id != ?
   AND u.state = 'searching'
+  AND u.reachable = 1
   AND u.is_banned = 0
-  AND (u.banned_until = '' OR u.banned_until <= ?)
-  AND u.interests = ?
+  AND u.banned_until_ts <= ?
+  AND (q.interests_mask & ?) != 0
 ORDER BY q.joined_at ASC
 LIMIT 1
 """
 
 SELECT_QUEUE_CANDIDATES = """
-SELECT q.user_id, q.joined_at, u.interests, u.only_interest, u.premium_until
+SELECT q.user_id, q.joined_at, q.joined_at_ts, u.interests, u.only_interest, u.premium_until_ts
 FROM queue q
 JOIN users u ON u.user_id = q.user_id
 WHERE q.user_id != ?
   AND u.state = 'searching'
+  AND u.reachable = 1
   AND u.is_banned = 0
-  AND (u.banned_until = '' OR u.banned_until <= ?)
+  AND u.banned_until_ts <= ?
 ORDER BY q.joined_at ASC
 """
 
@@ -276,9 +315,10 @@ SELECT_QUEUE_CANDIDATES_LIMITED = """
 SELECT
     q.user_id,
     q.joined_at,
+    q.joined_at_ts,
     u.interests,
     u.only_interest,
-    u.premium_until,
+    u.premium_until_ts,
     EXISTS(
         SELECT 1
         FROM pairs p
@@ -289,11 +329,60 @@ FROM queue q
 JOIN users u ON u.user_id = q.user_id
 WHERE q.user_id != ?
   AND u.state = 'searching'
+  AND u.reachable = 1
   AND u.is_banned = 0
-  AND (u.banned_until = '' OR u.banned_until <= ?)
+  AND u.banned_until_ts <= ?
 ORDER BY q.joined_at ASC
 LIMIT ?
 """
+
+# The matcher's candidate lookup for instances that do not own the in-memory queue: users sharing
+# an interest bit come first, the rest of the queue after them, oldest searchers first in each group.
+SELECT_QUEUE_CANDIDATES_BY_MASK = """
+SELECT
+    q.user_id,
+    q.joined_at,
+    q.joined_at_ts,
+    u.interests,
+    q.interests_mask,
+    u.only_interest,
+    u.premium_until_ts,
+    EXISTS(
+        SELECT 1
+        FROM pairs p
+        WHERE (p.user1_id = ? AND p.user2_id = q.user_id)
+           OR (p.user2_id = ? AND p.user1_id = q.user_id)
+    ) AS seen_before
+FROM queue q
+JOIN users u ON u.user_id = q.user_id
+WHERE q.user_id != ?
+  AND u.state = 'searching'
+  AND u.reachable = 1
+  AND u.is_banned = 0
+  AND u.banned_until_ts <= ?
+  AND ((q.interests_mask & ?) != 0 OR ? = 0)
+ORDER BY CASE WHEN (q.interests_mask & ?) != 0 THEN 0 ELSE 1 END, q.joined_at ASC
+LIMIT ?
+"""
+
+SELECT_MATCH_QUEUE_ENTRIES = """
+SELECT
+    q.user_id,
+    q.joined_at,
+    q.joined_at_ts,
+    u.interests,
+    u.interests_mask,
+    u.only_interest,
+    u.premium_until_ts,
+    u.is_banned,
+    u.banned_until_ts
+FROM queue q
+JOIN users u ON u.user_id = q.user_id
+WHERE u.state = 'searching'
+  AND u.reachable = 1
+ORDER BY q.joined_at ASC
+"""
+
 INSERT_PAIR = """
 INSERT INTO pairs (user1_id, user2_id, started_at, ended_at, is_active)
 VALUES (?, ?, ?, NULL, 1)
@@ -305,6 +394,8 @@ WHERE is_active = 1 AND (user1_id = ? OR user2_id = ?)
 LIMIT 1
 """
 
+SELECT_ACTIVE_PAIRS = "SELECT id, user1_id, user2_id FROM pairs WHERE is_active = 1"
+
 END_PAIR_BY_ID = """
 UPDATE pairs SET ended_at = ?, is_active = 0 WHERE id = ?
 """
@@ -416,9 +507,11 @@ INSERT OR REPLACE INTO virtual_ab_sessions (
     user_messages,
     companion_messages,
     media_messages,
-    ended_by_user
+    ended_by_user,
+    started_at_ts,
+    ended_at_ts
 )
-VALUES (?, ?, ?, ?, ?, '', 0, 0, 0, 0)
+VALUES (?, ?, ?, ?, ?, '', 0, 0, 0, 0, ?, 0)
 """
 
 SELECT_VIRTUAL_AB_SESSION = """
@@ -445,12 +538,14 @@ WHERE pair_id = ?
 FINISH_VIRTUAL_AB_SESSION = """
 UPDATE virtual_ab_sessions
 SET ended_at = ?,
+    ended_at_ts = ?,
     ended_by_user = CASE WHEN ? = 1 THEN 1 ELSE ended_by_user END
 WHERE pair_id = ?
 """
 
 SELECT_ALL_VIRTUAL_AB_SESSIONS = """
 SELECT pair_id, user_id, companion_id, variant_key, started_at, ended_at,
+       started_at_ts, ended_at_ts,
        user_messages, companion_messages, media_messages, ended_by_user
 FROM virtual_ab_sessions
 ORDER BY started_at DESC
@@ -517,39 +612,46 @@ SELECT_PROMO_USE = """
 SELECT id FROM promo_uses WHERE user_id = ? AND code = ?
 """
 
-STATS_USERS = "SELECT COUNT(*) AS count FROM users"
-STATS_ACTIVE_CHATS = "SELECT COUNT(*) AS count FROM pairs WHERE is_active = 1"
-STATS_QUEUE = "SELECT COUNT(*) AS count FROM queue"
-STATS_REPORTS = "SELECT COUNT(*) AS count FROM reports"
-STATS_BANNED = "SELECT COUNT(*) AS count FROM users WHERE is_banned = 1"
-STATS_TEMP_BANNED = """
-SELECT COUNT(*) AS count
-FROM users
-WHERE is_banned = 0 AND banned_until != '' AND banned_until > ?
+SELECT_STATS_COUNTERS = """
+SELECT name, SUM(value) AS value
+FROM stats_counters
+GROUP BY name
 """
 
-COUNT_USERS_CREATED_SINCE = """
-SELECT COUNT(*) AS count
-FROM users
-WHERE created_at >= ?
+COUNT_STATS_COUNTER_ROWS = "SELECT COUNT(*) AS count FROM stats_counters"
+
+DELETE_STATS_COUNTERS = "DELETE FROM stats_counters"
+
+INSERT_STATS_COUNTER = """
+INSERT INTO stats_counters (name, shard, value)
+VALUES (?, ?, ?)
 """
 
-COUNT_USERS_SEEN_SINCE = """
-SELECT COUNT(*) AS count
-FROM users
-WHERE last_seen_at >= ?
+BUMP_STATS_COUNTER = """
+UPDATE stats_counters
+SET value = value + ?
+WHERE name = ? AND shard = ?
 """
 
-COUNT_USERS_WITH_CHATS = """
-SELECT COUNT(*) AS count
-FROM users
-WHERE chats_count > 0
+STATS_WINDOWED = """
+SELECT
+    (SELECT COUNT(*) FROM users WHERE created_at >= ?) AS new_users_24h,
+    (SELECT COUNT(*) FROM users WHERE created_at >= ?) AS new_users_7d,
+    (SELECT COUNT(*) FROM users WHERE last_seen_at >= ?) AS active_users_24h,
+    (SELECT COUNT(*) FROM users WHERE premium_until_ts > ?) AS premium_active,
+    (SELECT COUNT(*) FROM users WHERE is_banned = 0 AND banned_until_ts > ?) AS temp_banned,
+    (SELECT COUNT(*) FROM queue) AS queue_size
 """
 
-COUNT_PREMIUM_ACTIVE = """
+STATS_USERS = "SELECT COUNT(*) AS count FROM users"
+STATS_ACTIVE_CHATS = "SELECT COUNT(*) AS count FROM pairs WHERE is_active = 1"
+STATS_REPORTS = "SELECT COUNT(*) AS count FROM reports"
+STATS_BANNED = "SELECT COUNT(*) AS count FROM users WHERE is_banned = 1"
+
+COUNT_USERS_WITH_CHATS = """
 SELECT COUNT(*) AS count
 FROM users
-WHERE premium_until != '' AND premium_until > ?
+WHERE chats_count > 0
 """
 
 COUNT_PREMIUM_BUYERS = """
@@ -602,24 +704,143 @@ WHERE type = 'payment'
 ORDER BY created_at DESC
 """
 
+SELECT_FIRST_USER_CREATED_AT = """
+SELECT MIN(created_at) AS created_at
+FROM users
+"""
+
+SELECT_ROLLUP_USERS_CREATED = """
+SELECT created_at
+FROM users
+WHERE created_at >= ? AND created_at < ?
+"""
+
+SELECT_ROLLUP_PAIRS_STARTED = """
+SELECT user1_id, user2_id, started_at
+FROM pairs
+WHERE started_at >= ? AND started_at < ?
+"""
+
+SELECT_ROLLUP_PAIRS_ENDED = """
+SELECT started_at, ended_at
+FROM pairs
+WHERE ended_at >= ? AND ended_at < ?
+"""
+
+SELECT_ROLLUP_PAYMENTS = """
+SELECT payload, created_at
+FROM incidents
+WHERE type = 'payment' AND created_at >= ? AND created_at < ?
+"""
+
+UPSERT_STATS_ROLLUP = """
+INSERT INTO stats_rollups (
+    bucket,
+    period_start_ts,
+    period_start,
+    new_users,
+    active_users,
+    chats_started,
+    human_chats,
+    virtual_chats,
+    chats_ended,
+    chat_seconds,
+    purchases,
+    revenue_xtr
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(bucket, period_start_ts) DO UPDATE SET
+    new_users = excluded.new_users,
+    active_users = excluded.active_users,
+    chats_started = excluded.chats_started,
+    human_chats = excluded.human_chats,
+    virtual_chats = excluded.virtual_chats,
+    chats_ended = excluded.chats_ended,
+    chat_seconds = excluded.chat_seconds,
+    purchases = excluded.purchases,
+    revenue_xtr = excluded.revenue_xtr
+"""
+
+SELECT_STATS_ROLLUPS_PAGE = """
+SELECT *
+FROM stats_rollups
+WHERE bucket = ? AND period_start_ts >= ? AND period_start_ts < ?
+ORDER BY period_start_ts
+LIMIT ?
+"""
+
 INSERT_BROADCAST = """
-INSERT INTO broadcasts (audience, message, sent_count, failed_count, created_by, created_at)
-VALUES (?, ?, ?, ?, ?, ?)
+INSERT INTO broadcasts (audience, message, created_by, created_at, status)
+VALUES (?, ?, ?, ?, 'running')
 """
 
 SELECT_RECENT_BROADCASTS = """
-SELECT id, audience, message, sent_count, failed_count, created_by, created_at
+SELECT id, audience, message, sent_count, failed_count, total_count, status, enumerated, created_by, created_at
 FROM broadcasts
 ORDER BY created_at DESC
 LIMIT ?
 """
 
+SELECT_BROADCAST = "SELECT * FROM broadcasts WHERE id = ?"
+
+SELECT_RUNNING_BROADCAST_IDS = """
+SELECT id
+FROM broadcasts
+WHERE status = 'running'
+ORDER BY id
+"""
+
+CLAIM_BROADCAST = """
+UPDATE broadcasts
+SET owner = ?, lease_until_ts = ?
+WHERE id = ? AND status = 'running' AND (owner = ? OR lease_until_ts < ?)
+"""
+
+RELEASE_BROADCAST = """
+UPDATE broadcasts
+SET owner = '', lease_until_ts = 0
+WHERE id = ? AND owner = ?
+"""
+
+ADVANCE_BROADCAST_CURSOR = """
+UPDATE broadcasts
+SET cursor_user_id = ?, total_count = total_count + ?, enumerated = ?
+WHERE id = ?
+"""
+
+ADD_BROADCAST_RESULTS = """
+UPDATE broadcasts
+SET sent_count = sent_count + ?, failed_count = failed_count + ?
+WHERE id = ?
+"""
+
+FINISH_BROADCAST = """
+UPDATE broadcasts
+SET status = ?, finished_at = ?, owner = '', lease_until_ts = 0
+WHERE id = ? AND status = 'running'
+"""
+
+SELECT_PENDING_BROADCAST_DELIVERIES = """
+SELECT user_id
+FROM broadcast_deliveries
+WHERE broadcast_id = ? AND status = 'pending'
+ORDER BY user_id
+LIMIT ?
+"""
+
+UPDATE_BROADCAST_DELIVERY = """
+UPDATE broadcast_deliveries
+SET status = ?, updated_at = ?
+WHERE broadcast_id = ? AND user_id = ? AND status = 'pending'
+"""
+
 SELECT_ACTIVE_USERS = """
 SELECT user_id
 FROM users
 WHERE state IN ('searching', 'chatting')
+  AND reachable = 1
   AND is_banned = 0
-  AND (banned_until = '' OR banned_until <= ?)
+  AND banned_until_ts <= ?
 ORDER BY user_id ASC
 """
 
@@ -629,30 +850,51 @@ FROM users
 ORDER BY created_at DESC
 """
 
-SELECT_BROADCAST_ALL_USER_IDS = """
-SELECT user_id
+ENQUEUE_BROADCAST_ALL_USERS = """
+INSERT INTO broadcast_deliveries (broadcast_id, user_id, status, updated_at)
+SELECT ?, user_id, 'pending', ?
 FROM users
-WHERE is_banned = 0
-  AND (banned_until = '' OR banned_until <= ?)
+WHERE user_id > ?
+  AND reachable = 1
+  AND is_banned = 0
+  AND banned_until_ts <= ?
 ORDER BY user_id ASC
+LIMIT ?
+ON CONFLICT(broadcast_id, user_id) DO NOTHING
 """
 
-SELECT_BROADCAST_NON_PREMIUM_USER_IDS = """
-SELECT user_id
+ENQUEUE_BROADCAST_NON_PREMIUM_USERS = """
+INSERT INTO broadcast_deliveries (broadcast_id, user_id, status, updated_at)
+SELECT ?, user_id, 'pending', ?
 FROM users
-WHERE is_banned = 0
-  AND (banned_until = '' OR banned_until <= ?)
-  AND (premium_until = '' OR premium_until <= ?)
+WHERE user_id > ?
+  AND reachable = 1
+  AND is_banned = 0
+  AND banned_until_ts <= ?
+  AND premium_until_ts <= ?
 ORDER BY user_id ASC
+LIMIT ?
+ON CONFLICT(broadcast_id, user_id) DO NOTHING
 """
 
-SELECT_BROADCAST_INACTIVE_USER_IDS = """
-SELECT user_id
+ENQUEUE_BROADCAST_INACTIVE_USERS = """
+INSERT INTO broadcast_deliveries (broadcast_id, user_id, status, updated_at)
+SELECT ?, user_id, 'pending', ?
 FROM users
-WHERE is_banned = 0
-  AND (banned_until = '' OR banned_until <= ?)
+WHERE user_id > ?
+  AND reachable = 1
+  AND is_banned = 0
+  AND banned_until_ts <= ?
   AND (last_seen_at = '' OR last_seen_at < ?)
 ORDER BY user_id ASC
+LIMIT ?
+ON CONFLICT(broadcast_id, user_id) DO NOTHING
+"""
+
+SELECT_BROADCAST_ENQUEUED_SINCE = """
+SELECT COUNT(*) AS count, MAX(user_id) AS cursor_user_id
+FROM broadcast_deliveries
+WHERE broadcast_id = ? AND user_id > ?
 """
 
 SEARCH_USERS = """
@@ -699,6 +941,16 @@ FROM pairs
 WHERE user1_id = ? OR user2_id = ?
 """
 
+SELECT_QUEUED_PARTNER_HISTORY = """
+SELECT p.user1_id AS user_id, p.user2_id AS partner_id
+FROM pairs p
+JOIN queue q ON q.user_id = p.user1_id
+UNION
+SELECT p.user2_id AS user_id, p.user1_id AS partner_id
+FROM pairs p
+JOIN queue q ON q.user_id = p.user2_id
+"""
+
 SELECT_INTERESTS = "SELECT interests FROM users WHERE user_id = ?"
 SELECT_ONLY_INTEREST = "SELECT only_interest FROM users WHERE user_id = ?"
 SELECT_PREMIUM_UNTIL = "SELECT premium_until FROM users WHERE user_id = ?"
@@ -710,3 +962,50 @@ SELECT_AUTO_SEARCH = "SELECT auto_search FROM users WHERE user_id = ?"
 SELECT_CONTENT_FILTER = "SELECT content_filter FROM users WHERE user_id = ?"
 SELECT_LANG = "SELECT lang FROM users WHERE user_id = ?"
 SELECT_ALL_PREMIUM_UNTIL = "SELECT premium_until FROM users"
+
+EXPORT_USERS_PAGE = """
+SELECT
+    user_id,
+    created_at,
+    state,
+    username,
+    first_name,
+    last_name,
+    last_seen_at,
+    is_banned,
+    banned_until,
+    muted_until,
+    rating,
+    chats_count,
+    interests,
+    premium_until,
+    lang
+FROM users
+WHERE user_id > ?
+ORDER BY user_id
+LIMIT ?
+"""
+
+EXPORT_INCIDENTS_PAGE = """
+SELECT id, actor_id, target_id, type, payload, created_at
+FROM incidents
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+EXPORT_REPORTS_PAGE = """
+SELECT id, reporter_id, reported_id, reason, status, created_at, resolved_at, resolved_by
+FROM reports
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
+
+EXPORT_PAIRS_PAGE = """
+SELECT id, user1_id, user2_id, started_at, ended_at, is_active
+FROM pairs
+WHERE id > ?
+ORDER BY id
+LIMIT ?
+"""
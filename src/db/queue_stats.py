@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable
+
+MATCH_RATE_WINDOW_SEC = 900.0
+# Rates measured over a few seconds swing wildly; never divide by less than this span.
+MATCH_RATE_MIN_SPAN_SEC = 60.0
+MAX_ETA_SECONDS = 3600
+
+
+class RankIndex:
+    # Fenwick tree over queue sequence numbers: insert, remove and rank in O(log n).
+    def __init__(self, capacity: int = 1024) -> None:
+        self._present = bytearray(capacity + 1)
+        self._tree = [0] * (capacity + 1)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._tree) - 1
+
+    def clear(self) -> None:
+        self._present = bytearray(self.capacity + 1)
+        self._tree = [0] * (self.capacity + 1)
+        self._size = 0
+
+    def rebuild(self, seqs: Iterable[int], capacity: int | None = None) -> None:
+        seqs = list(seqs)
+        size = max(capacity or self.capacity, max(seqs, default=0))
+        self._present = bytearray(size + 1)
+        for seq in seqs:
+            self._present[seq] = 1
+        # Linear-time construction: push each node's sum to its parent once.
+        tree = list(self._present)
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        self._tree = tree
+        self._size = len(seqs)
+
+    def add(self, seq: int) -> None:
+        if seq > self.capacity:
+            self.rebuild(self.seqs(), capacity=max(seq, self.capacity * 2))
+        if self._present[seq]:
+            return
+        self._present[seq] = 1
+        self._size += 1
+        self._update(seq, 1)
+
+    def remove(self, seq: int) -> None:
+        if seq > self.capacity or not self._present[seq]:
+            return
+        self._present[seq] = 0
+        self._size -= 1
+        self._update(seq, -1)
+
+    def rank(self, seq: int) -> int:
+        # Number of present sequence numbers <= seq.
+        index = min(seq, self.capacity)
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def seqs(self) -> list[int]:
+        return [seq for seq in range(1, self.capacity + 1) if self._present[seq]]
+
+    def _update(self, index: int, delta: int) -> None:
+        size = self.capacity
+        while index <= size:
+            self._tree[index] += delta
+            index += index & -index
+
+
+class MatchRateEstimator:
+    # Rolling count of users leaving the queue through a match; ETA = position / drain rate.
+    def __init__(self, window_sec: float = MATCH_RATE_WINDOW_SEC) -> None:
+        self.window_sec = window_sec
+        self._events: deque[tuple[float, int]] = deque()
+        self._matched = 0
+
+    def record(self, now: float, matched_users: int) -> None:
+        if matched_users <= 0:
+            return
+        self._events.append((now, matched_users))
+        self._matched += matched_users
+        self._expire(now)
+
+    def users_per_second(self, now: float) -> float:
+        self._expire(now)
+        if not self._events:
+            return 0.0
+        span = max(now - self._events[0][0], MATCH_RATE_MIN_SPAN_SEC)
+        return self._matched / span
+
+    def eta_seconds(self, position: int, now: float) -> int | None:
+        if position <= 0:
+            return None
+        rate = self.users_per_second(now)
+        if rate <= 0:
+            return None
+        return max(1, min(MAX_ETA_SECONDS, round(position / rate)))
+
+    def _expire(self, now: float) -> None:
+        cutoff = now - self.window_sec
+        while self._events and self._events[0][0] < cutoff:
+            _, matched_users = self._events.popleft()
+            self._matched -= matched_users
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+SLOW_QUERY_LOG_SIZE = 50
+PARAM_SHAPE_MAX_ITEMS = 8
+EXPLAINABLE_VERBS = {"SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+
+@dataclass(slots=True)
+class SlowQuery:
+    name: str
+    duration_ms: float
+    param_shape: str
+    occurred_at: str
+    plan: str = ""
+
+
+def param_shape(params: tuple[Any, ...]) -> str:
+    # Types only: values may be user text or ids and do not belong in logs.
+    names = ["null" if value is None else type(value).__name__ for value in params[:PARAM_SHAPE_MAX_ITEMS]]
+    if len(params) > PARAM_SHAPE_MAX_ITEMS:
+        names.append(f"+{len(params) - PARAM_SHAPE_MAX_ITEMS} more")
+    return "(" + ", ".join(names) + ")"
+
+
+def is_explainable(query: str) -> bool:
+    verb = query.lstrip().split(None, 1)[:1]
+    return bool(verb) and verb[0].upper() in EXPLAINABLE_VERBS
+
+
+class SlowQueryLog:
+    # Per-name counters plus a ring buffer holding the first occurrence (and its plan) of each name.
+    def __init__(self, threshold_ms: float, capacity: int = SLOW_QUERY_LOG_SIZE) -> None:
+        self.threshold_ms = max(0.0, threshold_ms)
+        self.threshold_sec = self.threshold_ms / 1000 if self.threshold_ms > 0 else float("inf")
+        self._entries: deque[SlowQuery] = deque(maxlen=max(1, capacity))
+        self._totals: dict[str, tuple[int, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def record(self, name: str, params: tuple[Any, ...], seconds: float) -> SlowQuery | None:
+        duration_ms = round(seconds * 1000, 3)
+        previous = self._totals.get(name)
+        if previous is not None:
+            count, max_ms = previous
+            self._totals[name] = (count + 1, max(max_ms, duration_ms))
+            return None
+        self._totals[name] = (1, duration_ms)
+        entry = SlowQuery(
+            name=name,
+            duration_ms=duration_ms,
+            param_shape=param_shape(params),
+            occurred_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        self._entries.append(entry)
+        return entry
+
+    def entries(self) -> list[SlowQuery]:
+        return list(reversed(self._entries))
+
+    def totals(self) -> list[tuple[str, int, float]]:
+        rows = [(name, count, max_ms) for name, (count, max_ms) in self._totals.items()]
+        return sorted(rows, key=lambda row: (row[1], row[2]), reverse=True)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._totals.clear()
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+# Counters kept in `stats_counters` by row triggers (revenue by grant_paid_premium, since it needs
+# payload parsing). Time-window figures (new/active users, live premium, temp bans) stay queries.
+STATS_COUNTER_NAMES = (
+    "users",
+    "banned",
+    "engaged_users",
+    "active_chats",
+    "active_virtual_chats",
+    "virtual_users",
+    "reports",
+    "premium_purchases",
+    "premium_buyers",
+    "revenue_xtr",
+    "promo_users",
+    "promo_codes",
+)
+# Postgres writers bump a random shard so concurrent transactions do not queue on one row lock.
+POSTGRES_COUNTER_SHARDS = 8
+SQLITE_COUNTER_SHARDS = 1
+
+PREMIUM_PLAN_PRICES_XTR = {7: 29, 30: 99, 90: 249}
+
+STATS_COUNTERS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS stats_counters (
+    name TEXT NOT NULL,
+    shard INTEGER NOT NULL DEFAULT 0,
+    value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+)
+"""
+
+STATS_WINDOW_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_users_last_seen_at ON users(last_seen_at)",
+    "CREATE INDEX IF NOT EXISTS idx_users_banned_until_ts ON users(banned_until_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_promo_uses_user_id ON promo_uses(user_id)",
+)
+
+
+def _sqlite_bump(name: str, delta: str) -> str:
+    return f"UPDATE stats_counters SET value = value + ({delta}) WHERE name = '{name}' AND shard = 0;"
+
+
+_SQLITE_VIRTUAL_NEW = "(NEW.user1_id < 0 OR NEW.user2_id < 0)"
+_SQLITE_VIRTUAL_OLD = "(OLD.user1_id < 0 OR OLD.user2_id < 0)"
+_SQLITE_HUMAN_NEW = "CASE WHEN NEW.user1_id < 0 THEN NEW.user2_id ELSE NEW.user1_id END"
+
+SQLITE_STATS_TRIGGERS = (
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_users_insert AFTER INSERT ON users
+BEGIN
+    {_sqlite_bump("users", "1")}
+    {_sqlite_bump("banned", "NEW.is_banned = 1")}
+    {_sqlite_bump("engaged_users", "NEW.chats_count > 0")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_users_update AFTER UPDATE OF is_banned, chats_count ON users
+WHEN (OLD.is_banned = 1) != (NEW.is_banned = 1) OR (OLD.chats_count > 0) != (NEW.chats_count > 0)
+BEGIN
+    {_sqlite_bump("banned", "(NEW.is_banned = 1) - (OLD.is_banned = 1)")}
+    {_sqlite_bump("engaged_users", "(NEW.chats_count > 0) - (OLD.chats_count > 0)")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_users_delete AFTER DELETE ON users
+BEGIN
+    {_sqlite_bump("users", "-1")}
+    {_sqlite_bump("banned", "-(OLD.is_banned = 1)")}
+    {_sqlite_bump("engaged_users", "-(OLD.chats_count > 0)")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_pairs_insert AFTER INSERT ON pairs
+BEGIN
+    {_sqlite_bump("active_chats", "NEW.is_active = 1")}
+    {_sqlite_bump("active_virtual_chats", f"NEW.is_active = 1 AND {_SQLITE_VIRTUAL_NEW}")}
+    {_sqlite_bump("virtual_users", f'''{_SQLITE_VIRTUAL_NEW} AND NOT EXISTS (
+        SELECT 1 FROM pairs p
+        WHERE p.id != NEW.id
+          AND ((p.user1_id = {_SQLITE_HUMAN_NEW} AND p.user2_id < 0)
+            OR (p.user2_id = {_SQLITE_HUMAN_NEW} AND p.user1_id < 0))
+    )''')}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_pairs_update AFTER UPDATE OF is_active ON pairs
+WHEN (OLD.is_active = 1) != (NEW.is_active = 1)
+BEGIN
+    {_sqlite_bump("active_chats", "(NEW.is_active = 1) - (OLD.is_active = 1)")}
+    {_sqlite_bump("active_virtual_chats", f"((NEW.is_active = 1) - (OLD.is_active = 1)) * {_SQLITE_VIRTUAL_NEW}")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_pairs_delete AFTER DELETE ON pairs
+BEGIN
+    {_sqlite_bump("active_chats", "-(OLD.is_active = 1)")}
+    {_sqlite_bump("active_virtual_chats", f"-(OLD.is_active = 1 AND {_SQLITE_VIRTUAL_OLD})")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_reports_insert AFTER INSERT ON reports
+BEGIN
+    {_sqlite_bump("reports", "1")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_reports_delete AFTER DELETE ON reports
+BEGIN
+    {_sqlite_bump("reports", "-1")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_payments_insert AFTER INSERT ON incidents
+WHEN NEW.type = 'payment'
+BEGIN
+    {_sqlite_bump("premium_purchases", "1")}
+    {_sqlite_bump("premium_buyers", '''NEW.actor_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM incidents i
+        WHERE i.actor_id = NEW.actor_id AND i.type = 'payment' AND i.id != NEW.id
+    )''')}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_promo_uses_insert AFTER INSERT ON promo_uses
+BEGIN
+    {_sqlite_bump("promo_users", '''NOT EXISTS (
+        SELECT 1 FROM promo_uses p WHERE p.user_id = NEW.user_id AND p.id != NEW.id
+    )''')}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_promo_codes_insert AFTER INSERT ON promo_codes
+BEGIN
+    {_sqlite_bump("promo_codes", "1")}
+END
+""",
+    f"""
+CREATE TRIGGER IF NOT EXISTS trg_stats_promo_codes_delete AFTER DELETE ON promo_codes
+BEGIN
+    {_sqlite_bump("promo_codes", "-1")}
+END
+""",
+)
+
+POSTGRES_STATS_FUNCTIONS = (
+    f"""
+CREATE OR REPLACE FUNCTION stats_bump(counter TEXT, delta BIGINT) RETURNS void AS $$
+DECLARE
+    target_shard INTEGER := floor(random() * {POSTGRES_COUNTER_SHARDS})::int;
+BEGIN
+    IF delta <> 0 THEN
+        UPDATE stats_counters SET value = value + delta WHERE name = counter AND shard = target_shard;
+    END IF;
+END
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION stats_users_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM stats_bump('users', 1);
+        PERFORM stats_bump('banned', (NEW.is_banned = 1)::int);
+        PERFORM stats_bump('engaged_users', (NEW.chats_count > 0)::int);
+        RETURN NEW;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM stats_bump('users', -1);
+        PERFORM stats_bump('banned', -(OLD.is_banned = 1)::int);
+        PERFORM stats_bump('engaged_users', -(OLD.chats_count > 0)::int);
+        RETURN OLD;
+    END IF;
+    PERFORM stats_bump('banned', (NEW.is_banned = 1)::int - (OLD.is_banned = 1)::int);
+    PERFORM stats_bump('engaged_users', (NEW.chats_count > 0)::int - (OLD.chats_count > 0)::int);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION stats_pairs_changed() RETURNS trigger AS $$
+DECLARE
+    human_id BIGINT;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM stats_bump('active_chats', (NEW.is_active = 1)::int);
+        IF NEW.user1_id < 0 OR NEW.user2_id < 0 THEN
+            PERFORM stats_bump('active_virtual_chats', (NEW.is_active = 1)::int);
+            human_id := CASE WHEN NEW.user1_id < 0 THEN NEW.user2_id ELSE NEW.user1_id END;
+            IF NOT EXISTS (
+                SELECT 1 FROM pairs p
+                WHERE p.id <> NEW.id
+                  AND ((p.user1_id = human_id AND p.user2_id < 0)
+                    OR (p.user2_id = human_id AND p.user1_id < 0))
+            ) THEN
+                PERFORM stats_bump('virtual_users', 1);
+            END IF;
+        END IF;
+        RETURN NEW;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM stats_bump('active_chats', -(OLD.is_active = 1)::int);
+        IF OLD.user1_id < 0 OR OLD.user2_id < 0 THEN
+            PERFORM stats_bump('active_virtual_chats', -(OLD.is_active = 1)::int);
+        END IF;
+        RETURN OLD;
+    END IF;
+    PERFORM stats_bump('active_chats', (NEW.is_active = 1)::int - (OLD.is_active = 1)::int);
+    IF NEW.user1_id < 0 OR NEW.user2_id < 0 THEN
+        PERFORM stats_bump('active_virtual_chats', (NEW.is_active = 1)::int - (OLD.is_active = 1)::int);
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION stats_rows_changed() RETURNS trigger AS $$
+BEGIN
+    -- TG_ARGV[0] is the counter for plain row counts (reports, promo_codes).
+    IF TG_OP = 'INSERT' THEN
+        PERFORM stats_bump(TG_ARGV[0], 1);
+        RETURN NEW;
+    END IF;
+    PERFORM stats_bump(TG_ARGV[0], -1);
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION stats_payment_added() RETURNS trigger AS $$
+BEGIN
+    PERFORM stats_bump('premium_purchases', 1);
+    IF NEW.actor_id IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM incidents i
+        WHERE i.actor_id = NEW.actor_id AND i.type = 'payment' AND i.id <> NEW.id
+    ) THEN
+        PERFORM stats_bump('premium_buyers', 1);
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION stats_promo_use_added() RETURNS trigger AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM promo_uses p WHERE p.user_id = NEW.user_id AND p.id <> NEW.id) THEN
+        PERFORM stats_bump('promo_users', 1);
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""",
+)
+
+# (trigger, table, timing/events, function call)
+POSTGRES_STATS_TRIGGERS = (
+    ("trg_stats_users", "users", "AFTER INSERT OR DELETE OR UPDATE OF is_banned, chats_count", "stats_users_changed()"),
+    ("trg_stats_pairs", "pairs", "AFTER INSERT OR DELETE OR UPDATE OF is_active", "stats_pairs_changed()"),
+    ("trg_stats_reports", "reports", "AFTER INSERT OR DELETE", "stats_rows_changed('reports')"),
+    ("trg_stats_promo_codes", "promo_codes", "AFTER INSERT OR DELETE", "stats_rows_changed('promo_codes')"),
+    ("trg_stats_promo_uses", "promo_uses", "AFTER INSERT", "stats_promo_use_added()"),
+)
+POSTGRES_PAYMENT_TRIGGER_SQL = """
+CREATE TRIGGER trg_stats_payments AFTER INSERT ON incidents
+FOR EACH ROW WHEN (NEW.type = 'payment') EXECUTE FUNCTION stats_payment_added()
+"""
+
+
+def postgres_trigger_statements() -> list[str]:
+    statements = list(POSTGRES_STATS_FUNCTIONS)
+    for trigger, table, events, call in POSTGRES_STATS_TRIGGERS:
+        statements.append(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        statements.append(f"CREATE TRIGGER {trigger} {events} ON {table} FOR EACH ROW EXECUTE FUNCTION {call}")
+    statements.append("DROP TRIGGER IF EXISTS trg_stats_payments ON incidents")
+    statements.append(POSTGRES_PAYMENT_TRIGGER_SQL)
+    return statements
+
+
+def counter_shards(dialect: str) -> int:
+    return POSTGRES_COUNTER_SHARDS if dialect == "postgres" else SQLITE_COUNTER_SHARDS
+
+
+def payment_amount_from_payload(payload: str) -> int:
+    normalized = (payload or "").strip()
+    if not normalized:
+        return 0
+
+    if "|" in normalized:
+        parts = normalized.split("|")
+        if len(parts) >= 2:
+            try:
+                return int(parts[1])
+            except ValueError:
+                return 0
+
+    if ":" in normalized and normalized.startswith("premium_"):
+        maybe_amount = normalized.split(":")[-1]
+        try:
+            return int(maybe_amount)
+        except ValueError:
+            pass
+
+    if normalized.startswith("premium_"):
+        try:
+            days = int(normalized.split("_", 1)[1])
+        except (IndexError, ValueError):
+            return 0
+        return PREMIUM_PLAN_PRICES_XTR.get(days, 0)
+
+    return 0
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from .stats_counters import payment_amount_from_payload
+from .timestamps import to_epoch
+
+# Hourly and daily (UTC) rollups filled by Database.roll_up_stats(); exports read only this table.
+ROLLUP_BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+ROLLUP_VALUE_COLUMNS = (
+    "new_users",
+    "active_users",
+    "chats_started",
+    "human_chats",
+    "virtual_chats",
+    "chats_ended",
+    "chat_seconds",
+    "purchases",
+    "revenue_xtr",
+)
+ROLLUP_CSV_COLUMNS = (
+    "period_start",
+    "new_users",
+    "active_users",
+    "chats_started",
+    "chats_ended",
+    "avg_chat_duration_sec",
+    "matches_per_minute",
+    "virtual_share",
+    "purchases",
+    "revenue_xtr",
+)
+ROLLUP_WATERMARK_KEY = "stats_rollup_through_ts"
+
+STATS_ROLLUPS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS stats_rollups (
+    bucket TEXT NOT NULL,
+    period_start_ts BIGINT NOT NULL,
+    period_start TEXT NOT NULL,
+    new_users INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    chats_started INTEGER NOT NULL DEFAULT 0,
+    human_chats INTEGER NOT NULL DEFAULT 0,
+    virtual_chats INTEGER NOT NULL DEFAULT 0,
+    chats_ended INTEGER NOT NULL DEFAULT 0,
+    chat_seconds BIGINT NOT NULL DEFAULT 0,
+    purchases INTEGER NOT NULL DEFAULT 0,
+    revenue_xtr BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, period_start_ts)
+)
+"""
+
+STATS_ROLLUP_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_pairs_started_at ON pairs(started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_pairs_ended_at ON pairs(ended_at)",
+)
+
+
+def bucket_start(ts: int, bucket: str) -> int:
+    return ts - ts % ROLLUP_BUCKET_SECONDS[bucket]
+
+
+def aggregate_rollups(
+    start_ts: int,
+    end_ts: int,
+    *,
+    users_created: Iterable[Any],
+    pairs_started: Iterable[Any],
+    pairs_ended: Iterable[Any],
+    payments: Iterable[Any],
+) -> dict[tuple[str, int], dict[str, int]]:
+    # [start_ts, end_ts) must be whole hours inside a single UTC day; every hour and the day get a row.
+    rollups: dict[tuple[str, int], dict[str, int]] = {
+        ("hour", ts): dict.fromkeys(ROLLUP_VALUE_COLUMNS, 0) for ts in range(start_ts, end_ts, 3600)
+    }
+    day_key = ("day", bucket_start(start_ts, "day"))
+    rollups[day_key] = dict.fromkeys(ROLLUP_VALUE_COLUMNS, 0)
+    # Active users = distinct humans who started a chat; last_seen_at is overwritten and has no history.
+    active: dict[tuple[str, int], set[int]] = {key: set() for key in rollups}
+
+    def targets(value: str) -> tuple[dict[str, int], ...] | None:
+        ts = to_epoch(value)
+        if not start_ts <= ts < end_ts:
+            return None
+        return rollups[("hour", bucket_start(ts, "hour"))], rollups[day_key]
+
+    for row in users_created:
+        for values in targets(row["created_at"]) or ():
+            values["new_users"] += 1
+    for row in pairs_started:
+        hit = targets(row["started_at"])
+        if hit is None:
+            continue
+        user_ids = [int(row["user1_id"]), int(row["user2_id"])]
+        kind = "virtual_chats" if min(user_ids) < 0 else "human_chats"
+        for values in hit:
+            values["chats_started"] += 1
+            values[kind] += 1
+        hour_key = ("hour", bucket_start(to_epoch(row["started_at"]), "hour"))
+        for key in (hour_key, day_key):
+            active[key].update(user_id for user_id in user_ids if user_id > 0)
+    for row in pairs_ended:
+        hit = targets(row["ended_at"])
+        if hit is None:
+            continue
+        duration = max(0, to_epoch(row["ended_at"]) - to_epoch(row["started_at"]))
+        for values in hit:
+            values["chats_ended"] += 1
+            values["chat_seconds"] += duration
+    for row in payments:
+        hit = targets(row["created_at"])
+        if hit is None:
+            continue
+        amount = payment_amount_from_payload(row["payload"] or "")
+        for values in hit:
+            values["purchases"] += 1
+            values["revenue_xtr"] += amount
+    for key, user_ids in active.items():
+        rollups[key]["active_users"] = len(user_ids)
+    return rollups
+
+
+def rollup_csv_row(row: Any, bucket: str) -> list[Any]:
+    chats_started = int(row["chats_started"])
+    chats_ended = int(row["chats_ended"])
+    minutes = ROLLUP_BUCKET_SECONDS[bucket] / 60
+    return [
+        row["period_start"],
+        int(row["new_users"]),
+        int(row["active_users"]),
+        chats_started,
+        chats_ended,
+        round(int(row["chat_seconds"]) / chats_ended, 1) if chats_ended else 0,
+        round(chats_started / minutes, 3),
+        round(int(row["virtual_chats"]) / chats_started, 3) if chats_started else 0,
+        int(row["purchases"]),
+        int(row["revenue_xtr"]),
+    ]
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from time import time
+
+
+def to_epoch(value: str | None) -> int:
+    # ISO-8601 text -> whole epoch seconds; empty or unparsable values map to 0 ("never").
+    if not value:
+        return 0
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def now_epoch() -> int:
+    return int(time())
+
+
+def is_active_epoch(value: int | None) -> bool:
+    return bool(value) and int(value) > time()
+
+
+def seconds_since_epoch(value: int | None) -> int:
+    if not value:
+        return 0
+    return max(0, int(time()) - int(value))
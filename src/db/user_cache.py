@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any
+
+USER_SNAPSHOT_CACHE_SIZE = 10_000
+USER_SNAPSHOT_CACHE_TTL_SEC = 30.0
+
+
+class UserSnapshotCache:
+    # Bounded LRU/TTL cache of `SELECT_USER_WITH_QUEUE` rows. Every invalidation stamps the user with
+    # a fresh value of a global generation counter; a row fetched while a write was in flight is
+    # discarded instead of cached. Trimmed stamps raise a floor that untracked users report, so a
+    # user's version never goes back to a value an in-flight read may still hold.
+    def __init__(
+        self,
+        capacity: int = USER_SNAPSHOT_CACHE_SIZE,
+        ttl_sec: float = USER_SNAPSHOT_CACHE_TTL_SEC,
+    ) -> None:
+        self._capacity = max(1, capacity)
+        self._ttl_sec = ttl_sec
+        self._rows: OrderedDict[int, tuple[Any, float]] = OrderedDict()
+        self._versions: OrderedDict[int, int] = OrderedDict()
+        self._generation = 0
+        self._trimmed_generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._versions.clear()
+        self._trimmed_generation = self._generation
+
+    def get(self, user_id: int) -> Any:
+        cached = self._rows.get(user_id)
+        if cached is not None:
+            row, expires_at = cached
+            if expires_at > monotonic():
+                self._rows.move_to_end(user_id)
+                self.hits += 1
+                return row
+            del self._rows[user_id]
+        self.misses += 1
+        return None
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, self._trimmed_generation)
+
+    def store(self, user_id: int, row: Any, version: int) -> None:
+        if row is None or self.version(user_id) != version:
+            return
+        self._rows[user_id] = (row, monotonic() + self._ttl_sec)
+        self._rows.move_to_end(user_id)
+        while len(self._rows) > self._capacity:
+            self._rows.popitem(last=False)
+
+    def invalidate(self, *user_ids: int) -> None:
+        for user_id in user_ids:
+            self._rows.pop(user_id, None)
+            self._generation += 1
+            self._versions[user_id] = self._generation
+            self._versions.move_to_end(user_id)
+        while len(self._versions) > self._capacity * 2:
+            _, generation = self._versions.popitem(last=False)
+            self._trimmed_generation = max(self._trimmed_generation, generation)
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._rows)}
@@ -2,6 +2,7 @@ import asyncio
 import logging
 import sys
 import warnings
+from contextlib import suppress
 from pathlib import Path
 
 warnings.filterwarnings(
@@ -19,13 +20,17 @@ if __name__ == "__main__" and __package__ in (None, ""):
     __package__ = "src"
 
 from .bootstrap import ProxyConfigurationError, create_app_context, shutdown_app_context
+from .bot.routers.match import run_batch_matcher
 
 
 async def main() -> None:
     app = None
+    matcher_task: asyncio.Task | None = None
     try:
-        app = await create_app_context()
+        app = await create_app_context(polling=True)
         await app.bot.delete_webhook(drop_pending_updates=False)
+        if app.config.match_tick_interval_sec > 0:
+            matcher_task = asyncio.create_task(run_batch_matcher(app.bot, app.db, app.config))
         await app.dp.start_polling(app.bot)
     except ProxyConfigurationError as exc:
         logging.error("%s", exc)
@@ -45,6 +50,10 @@ async def main() -> None:
             )
         raise SystemExit(1) from exc
     finally:
+        if matcher_task is not None:
+            matcher_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await matcher_task
         if app is not None:
             await shutdown_app_context(app)
 
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from time import time
+from typing import Callable, Iterable
+
+# Upper bounds in seconds (Prometheus style); the last, implicit bucket is +Inf.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# Caps label cardinality if some caller produces unbounded names (e.g. ad-hoc SQL).
+MAX_SERIES_PER_FAMILY = 512
+OVERFLOW_SERIES = "other"
+METRIC_PREFIX = "ghostchat"
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def quantile(self, buckets: tuple[float, ...], q: float) -> float:
+        # Bucket upper bound holding the q-th observation; exact enough for "where does time go".
+        if not self.count:
+            return 0.0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(buckets[index], self.max) if index < len(buckets) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = False, buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self.started_at = time()
+        self._families: dict[str, dict[str, Histogram]] = {}
+        # Point-in-time values (queue depths, totals) read from their owners at render time.
+        self._gauge_sources: list[Callable[[], dict[str, float]]] = []
+
+    def observe(self, family: str, name: str, seconds: float) -> None:
+        series = self._families.get(family)
+        if series is None:
+            series = self._families[family] = {}
+        histogram = series.get(name)
+        if histogram is None:
+            if len(series) >= MAX_SERIES_PER_FAMILY:
+                name = OVERFLOW_SERIES
+                histogram = series.get(name)
+            if histogram is None:
+                histogram = series[name] = Histogram(len(self.buckets) + 1)
+        histogram.counts[bisect_left(self.buckets, seconds)] += 1
+        histogram.count += 1
+        histogram.total += seconds
+        if seconds > histogram.max:
+            histogram.max = seconds
+
+    def add_gauges(self, source: Callable[[], dict[str, float]]) -> None:
+        self._gauge_sources.append(source)
+
+    def gauges(self) -> dict[str, float]:
+        values: dict[str, float] = {}
+        for source in self._gauge_sources:
+            values.update(source())
+        return values
+
+    def families(self) -> list[str]:
+        return sorted(self._families)
+
+    def series(self, family: str) -> dict[str, Histogram]:
+        return dict(self._families.get(family, {}))
+
+    def top(self, family: str, limit: int = 10) -> list[tuple[str, Histogram]]:
+        series = self._families.get(family, {})
+        return sorted(series.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+
+    def summary(self, family: str, name: str) -> dict[str, float]:
+        histogram = self._families.get(family, {}).get(name)
+        if histogram is None or not histogram.count:
+            return {"count": 0, "avg_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": histogram.count,
+            "avg_ms": round(histogram.total / histogram.count * 1000, 3),
+            "p50_ms": round(histogram.quantile(self.buckets, 0.50) * 1000, 3),
+            "p95_ms": round(histogram.quantile(self.buckets, 0.95) * 1000, 3),
+            "p99_ms": round(histogram.quantile(self.buckets, 0.99) * 1000, 3),
+            "max_ms": round(histogram.max * 1000, 3),
+        }
+
+    def reset(self) -> None:
+        self._families.clear()
+        self.started_at = time()
+
+    def render_prometheus(self) -> str:
+        lines: list[str] = []
+        bounds = [_format_bound(bound) for bound in self.buckets] + ["+Inf"]
+        for family in self.families():
+            metric = f"{METRIC_PREFIX}_{family}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for name, histogram in sorted(self._families[family].items()):
+                label = _escape_label(name)
+                cumulative = 0
+                for bound, bucket_count in zip(bounds, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{name="{label}"}} {histogram.total:.6f}')
+                lines.append(f'{metric}_count{{name="{label}"}} {histogram.count}')
+        for name, value in sorted(self.gauges().items()):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            lines.append(f"{METRIC_PREFIX}_{name} {value:g}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -5,6 +5,7 @@ from typing import Any
 
 from aiogram.methods import TelegramMethod
 from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
 
 from .bootstrap import AppContext, get_app_context
 
@@ -53,6 +54,12 @@ async def _telegram_webhook(
     except (json.JSONDecodeError, UnicodeDecodeError):
         raise HTTPException(status_code=400, detail="Invalid JSON") from None
 
+    if ctx.updates is not None:
+        # Fast ack: handlers run on the worker pool, so response time does not depend on them.
+        if not await ctx.updates.put(payload):
+            raise HTTPException(status_code=503, detail="Update queue is full")
+        return {"ok": True}
+
     try:
         result = await ctx.dp.feed_webhook_update(ctx.bot, payload)
         if isinstance(result, TelegramMethod):
@@ -64,6 +71,46 @@ async def _telegram_webhook(
     return {"ok": True}
 
 
+async def _metrics(authorization: str | None) -> PlainTextResponse:
+    ctx = await _load_context()
+    # Without a token the endpoint stays hidden: latencies and queue depths are not public data.
+    if not ctx.metrics.enabled or not ctx.config.metrics_token:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if not secrets.compare_digest(
+        authorization or "",
+        f"Bearer {ctx.config.metrics_token}",
+    ):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(ctx.metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _check_cron_secret(ctx: AppContext, authorization: str | None) -> None:
+    # Scheduled endpoints do work on the bot's behalf, so they stay closed until a secret is set.
+    if not ctx.config.cron_secret:
+        raise HTTPException(status_code=503, detail="CRON_SECRET is not configured")
+    if not secrets.compare_digest(
+        authorization or "",
+        f"Bearer {ctx.config.cron_secret}",
+    ):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+async def _broadcasts_tick(authorization: str | None) -> dict[str, Any]:
+    ctx = await _load_context()
+    _check_cron_secret(ctx, authorization)
+    # Broadcasts cannot run in the background here, so each scheduled call sends a bounded slice.
+    running = await ctx.broadcasts.run_slice(ctx.config.broadcast_slice_sec)
+    return {"ok": True, "running": running}
+
+
+async def _stats_rollup_tick(authorization: str | None) -> dict[str, Any]:
+    ctx = await _load_context()
+    _check_cron_secret(ctx, authorization)
+    # Rollups resume from their watermark, so a late or repeated call just catches up.
+    written = await ctx.db.roll_up_stats()
+    return {"ok": True, "written": written}
+
+
 @app.get("/")
 async def healthcheck_root() -> dict[str, Any]:
     return await _healthcheck()
@@ -84,6 +131,36 @@ async def healthcheck_head_api() -> Response:
     return await _healthcheck_head()
 
 
+@app.get("/metrics")
+async def metrics_root(authorization: str | None = Header(default=None)) -> PlainTextResponse:
+    return await _metrics(authorization)
+
+
+@app.get("/api/metrics")
+async def metrics_api(authorization: str | None = Header(default=None)) -> PlainTextResponse:
+    return await _metrics(authorization)
+
+
+@app.get("/broadcasts")
+async def broadcasts_tick_root(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    return await _broadcasts_tick(authorization)
+
+
+@app.get("/api/broadcasts")
+async def broadcasts_tick_api(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    return await _broadcasts_tick(authorization)
+
+
+@app.get("/stats/rollup")
+async def stats_rollup_tick_root(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    return await _stats_rollup_tick(authorization)
+
+
+@app.get("/api/stats/rollup")
+async def stats_rollup_tick_api(authorization: str | None = Header(default=None)) -> dict[str, Any]:
+    return await _stats_rollup_tick(authorization)
+
+
 @app.post("/")
 async def telegram_webhook_root(
     request: Request,
@@ -0,0 +1,46 @@
+import unittest
+
+from src.bootstrap import _build_database, _is_long_running
+from src.config import Config
+from src.metrics import MetricsRegistry
+
+
+def _config(**overrides) -> Config:
+    return Config(
+        token="123456:test-token",
+        admin_ids=[],
+        db_path=":memory:",
+        redis_url=None,
+        promo_codes={},
+        trial_days=3,
+        telegram_proxy=None,
+        telegram_timeout_sec=60.0,
+        telegram_webhook_secret=None,
+        **overrides,
+    )
+
+
+class BootstrapModeTests(unittest.IsolatedAsyncioTestCase):
+    async def test_serverless_webhook_leaves_nothing_to_background_tasks(self) -> None:
+        config = _config()
+        self.assertFalse(_is_long_running(config, polling=False))
+
+        db = _build_database(config, MetricsRegistry(), polling=False)
+        await db.connect()
+        try:
+            self.assertIsNone(db._touch_flush_task)
+            self.assertIsNone(db._stats_rollup_task)
+        finally:
+            await db.close()
+
+    async def test_long_running_processes_keep_background_work(self) -> None:
+        for config, polling in ((_config(), True), (_config(webhook_workers=2), False)):
+            self.assertTrue(_is_long_running(config, polling))
+
+            db = _build_database(config, MetricsRegistry(), polling)
+            await db.connect()
+            try:
+                self.assertIsNotNone(db._touch_flush_task)
+                self.assertIsNotNone(db._stats_rollup_task)
+            finally:
+                await db.close()
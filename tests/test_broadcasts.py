@@ -0,0 +1,110 @@
+import asyncio
+import unittest
+
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+from src.bot.utils.broadcasts import BroadcastEngine
+from src.db.database import Database
+
+ADMIN_ID = 999
+
+
+class FakeBot:
+    def __init__(
+        self,
+        forbidden: set[int] = frozenset(),
+        stall_after: int | None = None,
+        delay: float = 0.0,
+    ) -> None:
+        self.forbidden = forbidden
+        self.stall_after = stall_after
+        self.delay = delay
+        self.sent: list[int] = []
+        self.stalled = asyncio.Event()
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None) -> None:
+        if chat_id in self.forbidden:
+            raise TelegramForbiddenError(method=SendMessage(chat_id=chat_id, text=text), message="blocked")
+        if self.stall_after is not None and len(self.sent) >= self.stall_after:
+            self.stalled.set()
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(chat_id)
+
+
+class BroadcastEngineTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.db = Database(":memory:")
+        await self.db.connect()
+        for user_id in range(1, 13):
+            await self.db.create_user_if_missing(user_id)
+        await self.db.create_user_if_missing(ADMIN_ID)
+
+    async def asyncTearDown(self) -> None:
+        await self.db.close()
+
+    async def _wait_finished(self, engine: BroadcastEngine, broadcast_id: int) -> dict:
+        for _ in range(500):
+            if not engine.is_running(broadcast_id):
+                return await self.db.get_broadcast(broadcast_id)
+            await asyncio.sleep(0.01)
+        self.fail("broadcast did not finish")
+
+    async def test_interrupted_broadcast_resumes_without_resending(self) -> None:
+        broadcast_id = await self.db.create_broadcast("news", "hello", ADMIN_ID)
+
+        first_bot = FakeBot(stall_after=5)
+        first = BroadcastEngine(first_bot, self.db, workers=1, page_size=4, flush_size=1)
+        first.start(broadcast_id)
+        await asyncio.wait_for(first_bot.stalled.wait(), 5)
+        await first.close()
+
+        job = await self.db.get_broadcast(broadcast_id)
+        self.assertEqual((job["status"], job["sent_count"], job["owner"]), ("running", 5, ""))
+
+        second_bot = FakeBot(forbidden={7})
+        second = BroadcastEngine(second_bot, self.db, workers=3, page_size=4, flush_size=2)
+        self.assertEqual(await second.resume(), [broadcast_id])
+        job = await self._wait_finished(second, broadcast_id)
+        await second.close()
+
+        # The creator is also a recipient; the last message is their completion summary.
+        self.assertEqual(second_bot.sent[-1], ADMIN_ID)
+        recipients = sorted(first_bot.sent + second_bot.sent[:-1])
+        self.assertEqual(recipients, [user_id for user_id in [*range(1, 13), ADMIN_ID] if user_id != 7])
+        self.assertEqual(second_bot.sent.count(ADMIN_ID), 2)
+        self.assertEqual(
+            (job["status"], job["sent_count"], job["failed_count"], job["total_count"], job["enumerated"]),
+            ("done", 12, 1, 13, 1),
+        )
+        self.assertEqual(await self.db.get_pending_broadcast_recipients(broadcast_id, 100), [])
+
+    async def test_cancel_stops_the_job_and_a_foreign_lease_blocks_claims(self) -> None:
+        broadcast_id = await self.db.create_broadcast("news", "hello", None)
+        self.assertTrue(await self.db.claim_broadcast(broadcast_id, "other", 60))
+
+        engine = BroadcastEngine(FakeBot(), self.db)
+        self.assertFalse(await self.db.claim_broadcast(broadcast_id, engine.owner, 60))
+        self.assertTrue(await engine.cancel(broadcast_id))
+        self.assertFalse(await engine.cancel(broadcast_id))
+        self.assertEqual(await self.db.get_running_broadcast_ids(), [])
+        await engine.close()
+
+    async def test_slices_advance_a_job_without_background_tasks(self) -> None:
+        broadcast_id = await self.db.create_broadcast("news", "hello", None)
+        bot = FakeBot(delay=0.1)
+        engine = BroadcastEngine(bot, self.db, workers=1, page_size=4, background=False)
+        engine.start(broadcast_id)
+        self.assertFalse(engine.is_running(broadcast_id))
+
+        self.assertEqual(await engine.run_slice(0.3), 1)
+        job = await self.db.get_broadcast(broadcast_id)
+        self.assertLess(len(bot.sent), 13)
+        self.assertEqual((job["status"], job["sent_count"], job["owner"]), ("running", len(bot.sent), ""))
+
+        bot.delay = 0.0
+        self.assertEqual(await engine.run_slice(5.0), 0)
+        self.assertEqual(sorted(bot.sent), [*range(1, 13), ADMIN_ID])
+        self.assertEqual((await self.db.get_broadcast(broadcast_id))["status"], "done")
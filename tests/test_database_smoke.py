@@ -1,3 +1,4 @@
+import asyncio
 import sqlite3
 import tempfile
 import unittest
@@ -5,9 +6,16 @@ from datetime import datetime, timezone
 from pathlib import Path
 from types import SimpleNamespace
 
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+
+from src.bot.middlewares.reachability import ReachabilityMiddleware
 from src.bot.routers.chat import relay_message
+from src.bot.utils.chat import get_partner
+from src.bot.utils.premium import is_premium_from_snapshot
 from src.config import Config
 from src.db.database import Database
+from src.db.user_cache import UserSnapshotCache
 
 
 class FakeBot:
@@ -123,6 +131,102 @@ class DatabaseSmokeTests(unittest.IsolatedAsyncioTestCase):
         promo_incidents = [row for row in incidents if row["type"] == "promo"]
         self.assertEqual(len(promo_incidents), 1)
 
+    async def test_stats_counters_follow_mutators_and_match_a_rebuild(self) -> None:
+        await self._create_human_pair(1, 2)
+        await self._create_human_pair(3, 4)
+        await self.db.end_chat_session(3, collect_feedback=False)
+        await self.db.create_user_if_missing(5)
+        await self.db.start_virtual_pair(5, -101)
+        await self.db.set_banned(4, True)
+        await self.db.add_report(1, 2, "spam")
+        await self.db.grant_paid_premium(1, 30, "premium_30")
+        await self.db.grant_paid_premium(1, 7, "premium_7|29")
+        await self.db.create_promo_code("WELCOME", 7, 10, None)
+        await self.db.redeem_static_promo_code(2, "HELLO", 7)
+        await self.db.redeem_static_promo_code(2, "AGAIN", 7)
+
+        counters = await self.db.get_stats_counters()
+        self.assertEqual(counters["users"], 5)
+        self.assertEqual(counters["active_chats"], 2)
+        self.assertEqual(counters["active_virtual_chats"], 1)
+        self.assertEqual(counters["virtual_users"], 1)
+        self.assertEqual(counters["engaged_users"], 5)
+        self.assertEqual(counters["banned"], 1)
+        self.assertEqual(counters["premium_purchases"], 2)
+        self.assertEqual(counters["premium_buyers"], 1)
+        self.assertEqual(counters["revenue_xtr"], 128)
+        self.assertEqual(counters["promo_users"], 1)
+        self.assertEqual(counters["promo_codes"], 1)
+        self.assertEqual(await self.db.rebuild_stats_counters(), counters)
+
+        stats = await self.db.stats()
+        self.assertEqual((stats["users"], stats["new_users_24h"], stats["premium_active"]), (5, 5, 2))
+
+    async def test_stats_rollups_cover_closed_hours_and_rerun_idempotently(self) -> None:
+        await self._create_human_pair(1, 2)
+        await self.db.end_chat_session(1, collect_feedback=False)
+        await self.db.create_user_if_missing(3)
+        await self.db.start_virtual_pair(3, -101)
+        await self.db.grant_paid_premium(1, 30, "premium_30")
+
+        now_ts = int(datetime.now(timezone.utc).timestamp())
+        self.assertEqual(await self.db.roll_up_stats(now_ts), await self.db.roll_up_stats(now_ts))
+        # The current hour is still open, so nothing from this test is rolled up yet.
+        early = [row async for row in self.db.iter_stats_rollups("day", 0, now_ts + 86400)]
+        self.assertEqual([row["new_users"] for row in early], [0] * len(early))
+
+        written = await self.db.roll_up_stats(now_ts + 3600)
+        self.assertGreaterEqual(written, 2)
+        hour_start = now_ts - now_ts % 3600
+        hours = [row async for row in self.db.iter_stats_rollups("hour", hour_start, hour_start + 1, page_size=1)]
+        days = [row async for row in self.db.iter_stats_rollups("day", 0, now_ts + 86400)]
+        for rows in (hours, days):
+            self.assertEqual(len(rows), 1)
+            row = rows[0]
+            self.assertEqual((row["new_users"], row["active_users"]), (3, 3))
+            self.assertEqual((row["chats_started"], row["human_chats"], row["virtual_chats"]), (2, 1, 1))
+            self.assertEqual((row["chats_ended"], row["purchases"], row["revenue_xtr"]), (1, 1, 99))
+
+        await self.db.roll_up_stats(now_ts + 3600)
+        rerun = [row async for row in self.db.iter_stats_rollups("day", 0, now_ts + 86400)]
+        self.assertEqual(dict(rerun[0]), dict(days[0]))
+
+    async def test_forbidden_sends_mark_users_unreachable_until_they_return(self) -> None:
+        for user_id in (1, 2, 3):
+            await self.db.create_user_if_missing(user_id)
+            await self.db.queue_user_for_search(user_id)
+        middleware = ReachabilityMiddleware(self.db)
+
+        async def make_request(bot, method):
+            raise TelegramForbiddenError(method=method, message="Forbidden: bot was blocked by the user")
+
+        with self.assertRaises(TelegramForbiddenError):
+            await middleware(make_request, None, SendMessage(chat_id=2, text="hi"))
+
+        user2 = await self.db.get_user_snapshot(2)
+        self.assertEqual((user2["reachable"], user2["state"]), (0, "idle"))
+        self.assertEqual(await self.db.get_active_user_ids(), [1, 3])
+        self.assertEqual([row["user_id"] for row in await self.db.get_match_candidates(1)], [3])
+        broadcast_id = await self.db.create_broadcast("news", "hi", None)
+        await self.db.enqueue_broadcast_recipients(broadcast_id, "news", 0, 10)
+        self.assertEqual(await self.db.get_pending_broadcast_recipients(broadcast_id, 10), [1, 3])
+
+        await self.db.touch_user_context(2, username="back")
+        await self.db.flush_user_touches()
+        self.assertEqual((await self.db.get_user_snapshot(2))["reachable"], 0)
+        self.assertTrue(await self.db.set_user_reachable(2, True))
+        self.assertEqual((await self.db.get_user_snapshot(2))["reachable"], 1)
+        self.assertFalse(await self.db.set_user_reachable(2, True))
+
+    async def test_buffered_touch_does_not_undo_a_block(self) -> None:
+        await self.db.create_user_if_missing(1)
+        await self.db.touch_user_context(1, username="sender")
+        self.assertTrue(await self.db.set_user_reachable(1, False))
+        await self.db.flush_user_touches()
+
+        user = await self.db.get_user_snapshot(1)
+        self.assertEqual((user["reachable"], user["username"]), (0, "sender"))
+
     async def test_connect_applies_legacy_schema_migrations(self) -> None:
         with tempfile.TemporaryDirectory() as tmp_dir:
             db_path = Path(tmp_dir) / "legacy.db"
@@ -172,10 +276,207 @@ CREATE TABLE reports (
                 self.assertIn("status", report_columns)
                 self.assertIn("resolved_at", report_columns)
                 self.assertIn("resolved_by", report_columns)
-                self.assertEqual(migration_versions, ["0001", "0002", "0003"])
+                self.assertEqual(migration_versions, ["0001", "0002", "0003", "0004", "0005", "0006", "0007", "0008", "0009"])
             finally:
                 await migrated_db.close()
 
+    async def test_epoch_migration_backfills_shadow_columns(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = str(Path(tmp_dir) / "epoch.db")
+            first = Database(db_path)
+            await first.connect()
+            try:
+                await first.create_user_if_missing(1)
+                await first.execute(
+                    "UPDATE users SET premium_until = ?, premium_until_ts = 0 WHERE user_id = ?",
+                    ("2099-01-01T00:00:00+00:00", 1),
+                )
+                await first.execute("DELETE FROM schema_migrations WHERE version = '0004'")
+            finally:
+                await first.close()
+
+            second = Database(db_path)
+            await second.connect()
+            try:
+                user = await second.get_user_snapshot(1)
+                self.assertEqual(user["premium_until_ts"], 4_070_908_800)
+                self.assertEqual(user["banned_until_ts"], 0)
+                self.assertTrue(is_premium_from_snapshot(user))
+            finally:
+                await second.close()
+
+    def test_user_snapshot_versions_never_repeat_after_trimming(self) -> None:
+        cache = UserSnapshotCache(capacity=1)
+        cache.invalidate(1)
+        version = cache.version(1)
+        # A write lands while the read is in flight, then user 1's version is trimmed and bumped again.
+        cache.invalidate(1)
+        cache.invalidate(2, 3)
+        cache.invalidate(1)
+        cache.store(1, {"state": "stale"}, version)
+        self.assertIsNone(cache.get(1))
+
+        cache.store(1, {"state": "fresh"}, cache.version(1))
+        self.assertEqual(cache.get(1), {"state": "fresh"})
+
+    async def test_user_snapshot_cache_is_invalidated_by_mutators(self) -> None:
+        await self.db.create_user_if_missing(1)
+        await self.db.create_user_if_missing(2)
+        first = await self.db.get_user_snapshot(1)
+        again = await self.db.get_user_snapshot(1)
+        self.assertIs(first, again)
+        self.assertEqual(self.db.get_user_cache_stats()["hits"], 1)
+
+        await self.db.set_lang(1, "en")
+        self.assertEqual((await self.db.get_user_snapshot(1))["lang"], "en")
+
+        await self.db.get_user_snapshot(2)
+        await self.db.queue_user_for_search(1)
+        await self.db.queue_user_for_search(2)
+        await self.db.finalize_match(1, 2, is_virtual=False)
+        self.assertEqual((await self.db.get_user_snapshot(1))["state"], "chatting")
+        self.assertEqual((await self.db.get_user_snapshot(2))["state"], "chatting")
+
+        await self.db.end_chat_session(2, collect_feedback=False)
+        self.assertEqual((await self.db.get_user_snapshot(1))["state"], "idle")
+
+    async def test_shared_database_instances_see_each_others_user_changes(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = str(Path(tmp_dir) / "shared.db")
+            webhook = Database(db_path, local_caches=False)
+            polling = Database(db_path)
+            other = Database(db_path)
+            for db in (webhook, polling, other):
+                await db.connect()
+            try:
+                await other.create_user_if_missing(1)
+                self.assertEqual((await webhook.get_user_snapshot(1))["is_banned"], 0)
+                self.assertEqual((await polling.get_user_snapshot(1))["reachable"], 1)
+
+                await other.set_banned(1, True)
+                await other.set_user_reachable(1, False)
+                self.assertEqual((await webhook.get_user_snapshot(1))["is_banned"], 1)
+                # The stale cached snapshot must not turn the unblock into a no-op.
+                self.assertTrue(await polling.set_user_reachable(1, True))
+                self.assertEqual((await other.get_user(1))["reachable"], 1)
+            finally:
+                for db in (webhook, polling, other):
+                    await db.close()
+
+    async def test_pair_routes_follow_pair_lifecycle(self) -> None:
+        await self._create_human_pair()
+        pair = await self.db.get_active_pair(1)
+        self.assertEqual(self.db._pair_routes.get(1), (int(pair["id"]), 2))
+        self.assertEqual(await get_partner(self.db, 2), (1, int(pair["id"])))
+
+        await self.db.skip_chat_session(1, skip_until="")
+        self.assertIsNone(self.db._pair_routes.get(1))
+        self.assertEqual(await get_partner(self.db, 2), (None, None))
+
+        await self.db.finalize_match(1, -101, is_virtual=True)
+        self.db._pair_routes.clear()
+        await self.db.reload_pair_routes()
+        route = self.db._pair_routes.get(1)
+        self.assertIsNotNone(route)
+        self.assertEqual(route[1], -101)
+        self.assertIsNone(self.db._pair_routes.get(-101))
+
+    async def test_webhook_instances_stop_relaying_chats_ended_elsewhere(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = str(Path(tmp_dir) / "routes.db")
+            first = Database(db_path, local_caches=False)
+            second = Database(db_path, local_caches=False)
+            for db in (first, second):
+                await db.connect()
+            try:
+                for user_id in (1, 2):
+                    await second.create_user_if_missing(user_id)
+                    await second.queue_user_for_search(user_id)
+                result = await second.finalize_match(1, 2, is_virtual=False)
+                self.assertEqual(await get_partner(first, 1), (2, result.pair_id))
+
+                await second.end_chat_session(2, collect_feedback=False)
+                self.assertEqual(await get_partner(first, 1), (None, None))
+                self.assertEqual(len(first._pair_routes), 0)
+            finally:
+                for db in (first, second):
+                    await db.close()
+
+    async def test_touch_user_context_is_coalesced_and_flushed_on_close(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = str(Path(tmp_dir) / "touch.db")
+            buffered = Database(db_path, touch_flush_interval_sec=60.0)
+            await buffered.connect()
+            try:
+                await buffered.create_user_if_missing(1)
+                await buffered.touch_user_context(1, username="first")
+                await buffered.touch_user_context(2, username="new")
+                self.assertEqual((await buffered.get_user(1))["username"], "")
+                self.assertIsNone(await buffered.get_user(2))
+            finally:
+                await buffered.close()
+
+            reopened = Database(db_path)
+            await reopened.connect()
+            try:
+                self.assertEqual((await reopened.get_user(1))["username"], "first")
+                self.assertEqual((await reopened.get_user(2))["username"], "new")
+            finally:
+                await reopened.close()
+
+    async def test_group_commit_shares_one_commit_between_writers(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            grouped = Database(
+                str(Path(tmp_dir) / "group.db"),
+                group_commit_ms=50.0,
+                group_commit_max_statements=3,
+                sqlite_synchronous="NORMAL",
+            )
+            await grouped.connect()
+            try:
+                await asyncio.gather(*(grouped.create_user_if_missing(user_id) for user_id in (1, 2, 3)))
+                self.assertIsNone(grouped._group_done)
+                self.assertEqual(len(await grouped.get_all_users()), 3)
+
+                await grouped.set_lang(1, "en")
+                self.assertEqual((await grouped.get_user(1))["lang"], "en")
+
+                with self.assertRaises(sqlite3.IntegrityError):
+                    await grouped.execute(
+                        "INSERT INTO users (user_id, created_at, state) VALUES (?, ?, ?)",
+                        (1, "2024-01-01T00:00:00+00:00", "idle"),
+                    )
+                lang_write = asyncio.create_task(grouped.set_lang(2, "de"))
+                await asyncio.sleep(0)
+                await grouped.queue_user_for_search(3)
+                await lang_write
+                self.assertEqual((await grouped.get_user(2))["lang"], "de")
+                self.assertEqual((await grouped.get_user(3))["state"], "searching")
+            finally:
+                await grouped.close()
+
+    async def test_file_database_reads_go_to_read_only_connections(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_db = Database(str(Path(tmp_dir) / "pool.db"), sqlite_readers=2)
+            await file_db.connect()
+            try:
+                self.assertEqual(len(file_db._readers), 2)
+                async with file_db.transaction() as connection:
+                    await file_db.execute(
+                        "INSERT INTO users (user_id, created_at, state) VALUES (?, ?, ?)",
+                        (7, "2024-01-01T00:00:00+00:00", "idle"),
+                        commit=False,
+                        connection=connection,
+                    )
+                    self.assertIsNone(await file_db.get_user(7))
+                self.assertIsNotNone(await file_db.get_user(7))
+
+                async with file_db._sqlite_reader() as reader:
+                    with self.assertRaises(sqlite3.OperationalError):
+                        await reader.execute("DELETE FROM users")
+            finally:
+                await file_db.close()
+
     async def test_relay_message_respects_partner_content_filter(self) -> None:
         await self._create_human_pair()
         await self.db.set_content_filter(2, True)
@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+
+from aiogram import Bot, Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Message, Update
+
+from src.bot.dispatcher import OrderedDispatcher
+from src.metrics import MetricsRegistry
+
+
+def _update(bot: Bot, update_id: int, user_id: int) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+                "text": str(update_id),
+            },
+        },
+        context={"bot": bot},
+    )
+
+
+class OrderedDispatcherTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.bot = Bot(token="123456:TEST")
+        self.handled: list[tuple[int, int]] = []
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+        self.release.set()
+        router = Router()
+
+        @router.message()
+        async def handler(message: Message) -> None:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            await self.release.wait()
+            # First messages of a user take longest, so reordering within a user would show up.
+            await asyncio.sleep(0.02 if message.message_id < 4 else 0.001)
+            self.handled.append((message.from_user.id, message.message_id))
+            self.running -= 1
+
+        self.router = router
+
+    async def asyncTearDown(self) -> None:
+        await self.bot.session.close()
+
+    async def test_messages_of_one_user_are_handled_in_order_across_concurrent_users(self) -> None:
+        dp = OrderedDispatcher(workers=4)
+        dp.include_router(self.router)
+        # Same shape as polling: one task per update, created in arrival order.
+        tasks = [
+            asyncio.create_task(dp.feed_update(self.bot, _update(self.bot, update_id, 10 + update_id % 3)))
+            for update_id in range(12)
+        ]
+        await asyncio.gather(*tasks)
+        await dp.close_workers()
+
+        for user_id in (10, 11, 12):
+            self.assertEqual(
+                [message_id for owner, message_id in self.handled if owner == user_id],
+                [update_id for update_id in range(12) if 10 + update_id % 3 == user_id],
+            )
+        self.assertGreater(self.max_running, 1)
+
+    async def test_flooding_user_is_shed_without_blocking_others(self) -> None:
+        metrics = MetricsRegistry(enabled=True)
+        dp = OrderedDispatcher(workers=2, queue_limit=100, user_queue_limit=3, metrics=metrics)
+        dp.include_router(self.router)
+        self.release.clear()
+
+        flood = [asyncio.create_task(dp.feed_update(self.bot, _update(self.bot, index, 7))) for index in range(5)]
+        other = asyncio.create_task(dp.feed_update(self.bot, _update(self.bot, 100, 8)))
+        await asyncio.sleep(0)
+        self.assertEqual(metrics.gauges()["dispatch_queue_depth"], 4)
+        self.release.set()
+        results = await asyncio.gather(*flood, other)
+        await dp.close_workers()
+
+        self.assertEqual([result is UNHANDLED for result in results], [False, False, False, True, True, False])
+        self.assertEqual(metrics.gauges()["dispatch_shed_total"], 2)
+        self.assertIn((8, 100), self.handled)
+        self.assertEqual(metrics.summary("dispatch_wait", "update")["count"], 4)
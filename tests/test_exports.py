@@ -0,0 +1,54 @@
+import csv
+import gzip
+import io
+import secrets
+import unittest
+
+from src.bot.utils.exports import gzip_csv_parts
+from src.db.database import Database
+
+
+async def _rows(count: int):
+    for index in range(count):
+        yield (index, secrets.token_hex(64))
+
+
+def _read_part(file) -> list[list[str]]:
+    file.seek(0)
+    return list(csv.reader(io.TextIOWrapper(gzip.GzipFile(fileobj=file, mode="rb"), encoding="utf-8", newline="")))
+
+
+class ExportTests(unittest.IsolatedAsyncioTestCase):
+    async def test_parts_split_at_the_size_limit_and_each_has_a_header(self) -> None:
+        parts = [
+            part
+            async for part in gzip_csv_parts(("id", "token"), _rows(2000), part_max_bytes=64 * 1024, spool_max_memory=1024)
+        ]
+        try:
+            self.assertGreater(len(parts), 1)
+            self.assertTrue(all(part.size < 64 * 1024 + 32 * 1024 for part in parts))
+            decoded = [_read_part(part.file) for part in parts]
+            self.assertTrue(all(rows[0] == ["id", "token"] for rows in decoded))
+            ids = [int(row[0]) for rows in decoded for row in rows[1:]]
+            self.assertEqual(ids, list(range(2000)))
+            self.assertEqual(sum(part.rows for part in parts), 2000)
+        finally:
+            for part in parts:
+                part.file.close()
+
+        empty = [part async for part in gzip_csv_parts(("id",), _rows(0))]
+        self.assertEqual((len(empty), _read_part(empty[0].file)), (1, [["id"]]))
+        empty[0].file.close()
+
+    async def test_export_rows_page_through_the_table_by_key(self) -> None:
+        db = Database(":memory:")
+        await db.connect()
+        try:
+            for user_id in (5, 1, 3, 4, 2):
+                await db.create_user_if_missing(user_id)
+            rows = [row async for row in db.iter_export_rows("users", page_size=2)]
+        finally:
+            await db.close()
+
+        self.assertEqual([row[0] for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(len(rows[0]), len(db.export_columns("users")))
@@ -1,7 +1,44 @@
 import asyncio
+import os
+import tempfile
 import unittest
 
+from benchmarks.match_load import run_scenario
+
+from src.bot.routers.match import match_queue_tick
+from src.config import Config
 from src.db.database import Database
+from src.db.locks import KeyedLockManager
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent_messages: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, reply_markup=None) -> None:
+        self.sent_messages.append((chat_id, text))
+
+
+class KeyedLockManagerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_disjoint_keys_run_concurrently_and_shared_keys_serialize(self) -> None:
+        locks = KeyedLockManager(stripes=64)
+        first_key, second_key = 1, 2
+        self.assertNotEqual(locks.stripes_for(first_key), locks.stripes_for(second_key))
+
+        events: list[str] = []
+
+        async def hold(name: str, *keys: int) -> None:
+            async with locks.hold(*keys):
+                events.append(f"{name}:in")
+                await asyncio.sleep(0.01)
+                events.append(f"{name}:out")
+
+        await asyncio.gather(hold("a", first_key), hold("b", second_key))
+        self.assertEqual(events[:2], ["a:in", "b:in"])
+
+        events.clear()
+        await asyncio.gather(hold("a", second_key, first_key), hold("b", first_key, second_key))
+        self.assertEqual(events, ["a:in", "a:out", "b:in", "b:out"])
 
 
 class MatchLoadTests(unittest.IsolatedAsyncioTestCase):
@@ -32,3 +69,54 @@ class MatchLoadTests(unittest.IsolatedAsyncioTestCase):
         self.assertTrue(all(close_results))
 
         self.assertEqual(await self.db.get_active_user_ids(), [])
+
+    async def test_batch_tick_pairs_whole_queue_in_one_pass(self) -> None:
+        config = Config(
+            token="test-token",
+            admin_ids=[],
+            db_path=":memory:",
+            redis_url=None,
+            promo_codes={},
+            trial_days=3,
+            telegram_proxy=None,
+            telegram_timeout_sec=60.0,
+            telegram_webhook_secret=None,
+        )
+        interests = {1: "music", 2: "games", 3: "", 4: "music", 5: "games"}
+        for user_id, raw in interests.items():
+            await self.db.create_user_if_missing(user_id)
+            await self.db.set_interests(user_id, raw)
+            await self.db.queue_user_for_search(user_id)
+
+        bot = FakeBot()
+        matched = await match_queue_tick(bot, self.db, config)
+
+        self.assertEqual(matched, 2)
+        pair = await self.db.get_active_pair(1)
+        self.assertEqual({pair["user1_id"], pair["user2_id"]}, {1, 4})
+        pair = await self.db.get_active_pair(2)
+        self.assertEqual({pair["user1_id"], pair["user2_id"]}, {2, 5})
+        self.assertEqual(await self.db.get_match_queue_size(), 1)
+        self.assertEqual(len(bot.sent_messages), 4)
+        self.assertEqual(await match_queue_tick(bot, self.db, config), 0)
+
+
+class MatchLoadBenchmarkTests(unittest.IsolatedAsyncioTestCase):
+    async def test_scenario_pairs_everyone_and_reports_phases(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = await run_scenario(
+                os.path.join(tmp, "bench.db"),
+                users=20,
+                messages_per_user=2,
+                concurrency=8,
+                tick_interval_sec=0.05,
+                match_timeout_sec=10.0,
+            )
+
+        self.assertEqual(result["search"]["pairs"], 10)
+        self.assertEqual(result["search"]["unmatched"], 0)
+        self.assertEqual(result["relay"]["updates"], 40)
+        self.assertEqual(result["end"]["updates"], 10)
+        for phase in ("search", "relay", "end"):
+            self.assertIn("p95", result[phase]["latency_ms"])
+            self.assertIn("db_statements_per_update", result[phase])
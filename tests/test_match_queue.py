@@ -0,0 +1,279 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.db.database import Database
+from src.db.interests import interests_mask
+from src.db.match_queue import MatchQueue
+from src.db.partner_index import PartnerIndex
+from src.db.queue_stats import MatchRateEstimator, RankIndex
+
+
+class MatchQueueTests(unittest.TestCase):
+    def test_candidates_walk_shared_buckets_and_queue_head(self) -> None:
+        queue = MatchQueue()
+        queue.add(
+            1,
+            joined_at="2024-01-01T00:00:01+00:00",
+            interests="music",
+            interests_mask=interests_mask("music"),
+        )
+        queue.add(
+            2,
+            joined_at="2024-01-01T00:00:02+00:00",
+            interests="games",
+            interests_mask=interests_mask("games"),
+        )
+        queue.add(
+            3,
+            joined_at="2024-01-01T00:00:03+00:00",
+            interests="music|books",
+            interests_mask=interests_mask("music|books"),
+        )
+        queue.add(4, joined_at="2024-01-01T00:00:04+00:00")
+
+        entries = queue.candidates(9, interests_mask("books"), now_ts=1_704_153_600, limit=1)
+
+        self.assertEqual([entry.user_id for entry in entries], [1, 3])
+
+    def test_banned_entries_and_self_are_skipped(self) -> None:
+        queue = MatchQueue()
+        queue.add(1, joined_at="2024-01-01T00:00:01+00:00", is_banned=True)
+        queue.add(2, joined_at="2024-01-01T00:00:02+00:00", banned_until_ts=4_070_908_800)
+        queue.add(3, joined_at="2024-01-01T00:00:03+00:00")
+
+        entries = queue.candidates(3, 0, now_ts=1_704_153_600, limit=10)
+        self.assertEqual(entries, [])
+
+        queue.update(2, banned_until_ts=0)
+        entries = queue.candidates(3, 0, now_ts=1_704_153_600, limit=10)
+        self.assertEqual([entry.user_id for entry in entries], [2])
+
+    def test_interest_update_rebuckets_entry(self) -> None:
+        queue = MatchQueue()
+        queue.add(
+            1,
+            joined_at="2024-01-01T00:00:01+00:00",
+            interests="music",
+            interests_mask=interests_mask("music"),
+        )
+        queue.add(
+            2,
+            joined_at="2024-01-01T00:00:02+00:00",
+            interests="music",
+            interests_mask=interests_mask("music"),
+        )
+        queue.update(1, interests="travel", interests_mask=interests_mask("travel"))
+
+        entries = queue.candidates(9, interests_mask("travel"), now_ts=1_704_153_600, limit=1)
+        self.assertEqual(entries[0].user_id, 1)
+        self.assertEqual(queue.get(1).interests, "travel")
+
+
+    def test_positions_follow_join_order_through_churn(self) -> None:
+        queue = MatchQueue()
+        for user_id in range(1, 6):
+            queue.add(user_id, joined_at=f"2024-01-01T00:00:0{user_id}+00:00")
+        queue.discard(2)
+        self.assertEqual([queue.position(user_id) for user_id in (1, 3, 4, 5)], [1, 2, 3, 4])
+        self.assertEqual(queue.position(2), 0)
+
+        queue.add(3, joined_at="2024-01-01T00:00:03+00:00", interests_mask=interests_mask("music"))
+        self.assertEqual(queue.position(3), 2)
+
+        # Enough churn to exhaust the index forces a renumbering; order must survive it.
+        for step in range(3000):
+            queue.add(100, joined_at=f"churn-{step}")
+            queue.discard(100)
+        queue.add(6, joined_at="2024-01-01T00:00:09+00:00")
+        self.assertEqual([queue.position(user_id) for user_id in (1, 3, 4, 5, 6)], [1, 2, 3, 4, 5])
+
+    def test_rank_index_grows_and_match_rate_drives_eta(self) -> None:
+        index = RankIndex(capacity=4)
+        for seq in (1, 3, 9):
+            index.add(seq)
+        index.remove(3)
+        self.assertEqual((index.rank(2), index.rank(9), len(index)), (1, 2, 2))
+
+        rate = MatchRateEstimator(window_sec=600)
+        self.assertIsNone(rate.eta_seconds(3, now=1000.0))
+        rate.record(1000.0, 2)
+        rate.record(1060.0, 4)
+        self.assertEqual(rate.eta_seconds(3, now=1120.0), 60)
+        self.assertIsNone(rate.eta_seconds(3, now=2000.0))
+
+
+class PartnerIndexTests(unittest.TestCase):
+    def test_record_updates_loaded_users_and_lru_evicts(self) -> None:
+        index = PartnerIndex(capacity=2)
+        index.store(1, [5])
+        index.store(2, [])
+        index.record(1, 2)
+
+        self.assertTrue(index.has_seen(1, 2))
+        self.assertTrue(index.has_seen(2, 1))
+        self.assertFalse(index.has_seen(1, 3))
+
+        index.get(1)
+        index.store(3, [])
+        self.assertEqual(index.missing([1, 2, 3]), [2])
+
+
+class DatabaseMatchQueueTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.db = Database(":memory:")
+        await self.db.connect()
+
+    async def asyncTearDown(self) -> None:
+        await self.db.close()
+
+    async def test_queue_mutations_keep_engine_in_sync(self) -> None:
+        for user_id in (1, 2, 3):
+            await self.db.create_user_if_missing(user_id)
+            await self.db.queue_user_for_search(user_id)
+        self.assertEqual(await self.db.get_match_queue_size(), 3)
+
+        await self.db.cancel_search(3)
+        candidates = await self.db.get_match_candidates(1)
+        self.assertEqual([row["user_id"] for row in candidates], [2])
+        self.assertEqual(candidates[0]["seen_before"], 0)
+
+        await self.db.finalize_match(1, 2, is_virtual=False)
+        self.assertEqual(await self.db.get_match_queue_size(), 0)
+
+        await self.db.skip_chat_session(1, skip_until="")
+        await self.db.queue_user_for_search(2)
+        candidates = await self.db.get_match_candidates(2)
+        self.assertEqual([row["user_id"] for row in candidates], [1])
+        self.assertEqual(candidates[0]["seen_before"], 1)
+
+    async def test_search_status_uses_engine_position(self) -> None:
+        for user_id in (1, 2, 3):
+            await self.db.create_user_if_missing(user_id)
+            await self.db.queue_user_for_search(user_id)
+
+        status = await self.db.get_search_status_snapshot(3)
+        self.assertEqual((status["position"], status["queue_size"]), (3, 3))
+        self.assertIsNone(status["eta_seconds"])
+
+        await self.db.finalize_match(1, 2, is_virtual=False)
+        status = await self.db.get_search_status_snapshot(3)
+        self.assertEqual((status["position"], status["queue_size"]), (1, 1))
+        self.assertIsNotNone(status["eta_seconds"])
+        self.assertEqual(await self.db.get_queue_position(1), 0)
+
+    async def test_premium_reaches_the_queue_only_after_commit(self) -> None:
+        await self.db.create_user_if_missing(1)
+        await self.db.queue_user_for_search(1)
+        connection = self.db._conn
+        commit = connection.commit
+
+        async def fail_commit() -> None:
+            raise RuntimeError("disk I/O error")
+
+        connection.commit = fail_commit
+        try:
+            with self.assertRaises(RuntimeError):
+                await self.db.grant_paid_premium(1, 30, "premium_30:100")
+        finally:
+            connection.commit = commit
+            await connection.rollback()
+        self.assertEqual(self.db._match_queue.get(1).premium_until_ts, 0)
+
+        await self.db.grant_paid_premium(1, 30, "premium_30:100")
+        self.assertGreater(self.db._match_queue.get(1).premium_until_ts, 0)
+
+    async def test_engine_is_rebuilt_from_queue_table_on_connect(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = str(Path(tmp_dir) / "queue.db")
+            first = Database(db_path)
+            await first.connect()
+            try:
+                for user_id in (1, 2):
+                    await first.create_user_if_missing(user_id)
+                    await first.queue_user_for_search(user_id)
+                await first.set_interests(2, "music")
+            finally:
+                await first.close()
+
+            second = Database(db_path)
+            await second.connect()
+            try:
+                self.assertEqual(await second.get_match_queue_size(), 2)
+                candidates = await second.get_match_candidates(1, interests_mask("music"))
+                self.assertEqual([row["user_id"] for row in candidates], [2])
+                self.assertEqual(candidates[0]["interests"], "music")
+            finally:
+                await second.close()
+
+    async def test_webhook_instances_match_against_the_shared_queue(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = str(Path(tmp_dir) / "shared.db")
+            first = Database(db_path, local_caches=False)
+            second = Database(db_path, local_caches=False)
+            for db in (first, second):
+                await db.connect()
+            try:
+                for db, user_id in ((first, 1), (second, 2), (second, 3)):
+                    await db.create_user_if_missing(user_id)
+                    await db.queue_user_for_search(user_id)
+                await second.set_interests(3, "music")
+                self.assertEqual(await first.get_queue_position(3), 3)
+                self.assertEqual(await first.get_queue_position(4), 0)
+                candidates = await first.get_match_candidates(1, interests_mask("music"))
+                self.assertEqual([row["user_id"] for row in candidates], [2, 3])
+                self.assertEqual(await first.get_match_queue_size(), 3)
+
+                self.assertEqual(len(await first.get_match_batch()), 3)
+                await second.finalize_match(2, 3, is_virtual=False)
+                self.assertEqual(await first.get_match_candidates(1), [])
+                self.assertEqual(await first.get_match_queue_size(), 1)
+                self.assertEqual((await first.stats())["queue"], 1)
+                status = await first.get_search_status_snapshot(1)
+                self.assertEqual((status["position"], status["queue_size"]), (1, 1))
+                self.assertEqual(len(first._match_queue), 0)
+
+                await second.end_chat_session(2, collect_feedback=False)
+                for user_id in (2, 3):
+                    await second.queue_user_for_search(user_id)
+                seen = {
+                    (user["user_id"], candidate["user_id"]): candidate["seen_before"]
+                    for user, candidates in await first.get_match_batch()
+                    for candidate in candidates
+                }
+                self.assertEqual((seen[(2, 3)], seen[(2, 1)]), (1, 0))
+                self.assertEqual(await first.get_partner_history(3), {2})
+            finally:
+                for db in (first, second):
+                    await db.close()
+
+    async def test_interest_overlap_uses_persisted_masks(self) -> None:
+        for user_id in (1, 2, 3):
+            await self.db.create_user_if_missing(user_id)
+        await self.db.set_interests(3, "games")
+        for user_id in (1, 2, 3):
+            await self.db.queue_user_for_search(user_id)
+        await self.db.set_interests(2, "music|books")
+
+        self.assertEqual(await self.db.get_queue_candidate_by_interest(1, "books"), 2)
+        self.assertEqual(await self.db.get_queue_candidate_by_interest(1, "games"), 3)
+        self.assertIsNone(await self.db.get_queue_candidate_by_interest(1, "travel"))
+
+        candidates = await self.db.get_match_candidates(1, interests_mask("books"), overlap_only=True)
+        self.assertEqual([row["user_id"] for row in candidates], [2])
+        candidates = await self.db.get_match_candidates(1, interests_mask("books"))
+        self.assertEqual([row["user_id"] for row in candidates], [2, 3])
+
+    async def test_partner_index_tracks_new_pairs_without_reloading(self) -> None:
+        for user_id in (1, 2, 3):
+            await self.db.create_user_if_missing(user_id)
+        self.assertEqual(await self.db.get_partner_history(1), set())
+
+        for user_id in (1, 2):
+            await self.db.queue_user_for_search(user_id)
+        await self.db.finalize_match(1, 2, is_virtual=False)
+        await self.db.end_chat_session(1, collect_feedback=False)
+
+        self.assertIn(1, self.db._partner_index)
+        self.assertEqual(await self.db.get_partner_history(1), {2})
+        self.assertEqual(await self.db.get_partner_history(2), {1})
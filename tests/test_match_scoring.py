@@ -0,0 +1,123 @@
+import itertools
+import random
+import unittest
+from time import time
+
+from src.bot.routers.match import _greedy_plan, _plan_batch_matches
+from src.bot.utils import match_scoring
+from src.bot.utils.interests import INTEREST_CODES, interests_mask
+from src.bot.utils.match_scoring import (
+    CandidateColumns,
+    build_candidate_columns,
+    pick_candidate,
+)
+from src.bot.utils.weighted_matching import max_weight_matching
+
+
+def _row(user_id: int, *, interests: str = "", wait: int = 0, premium: bool = False,
+         only_interest: bool = False, seen_before: bool = False) -> dict:
+    now = int(time())
+    return {
+        "user_id": user_id,
+        "interests": interests,
+        "interests_mask": interests_mask(interests),
+        "joined_at_ts": now - wait,
+        "premium_until_ts": now + 3600 if premium else 0,
+        "only_interest": 1 if only_interest else 0,
+        "seen_before": 1 if seen_before else 0,
+    }
+
+
+class MatchScoringTests(unittest.TestCase):
+    def test_interests_mask_follows_interest_codes(self) -> None:
+        self.assertEqual(interests_mask(""), 0)
+        self.assertEqual(interests_mask("movies"), 1)
+        self.assertEqual(interests_mask("music|Книги"), (1 << 1) | (1 << INTEREST_CODES.index("books")))
+
+    def test_fresh_overlap_wins_and_only_interest_is_respected(self) -> None:
+        columns = build_candidate_columns(
+            [
+                _row(1, interests="music", wait=600, seen_before=True),
+                _row(2, interests="games", wait=600),
+                _row(3, interests="music", wait=600),
+                _row(4, interests="books", wait=600, premium=True, only_interest=True),
+            ]
+        )
+        self.assertEqual(pick_candidate(columns, user_mask=interests_mask("music"), user_only=False, user_wait_seconds=600), 3)
+        self.assertIsNone(pick_candidate(columns, user_mask=0, user_only=True, user_wait_seconds=0))
+
+    def test_fallback_prefers_fresh_candidates_without_only_interest(self) -> None:
+        columns = build_candidate_columns(
+            [
+                _row(1, interests="books", wait=5, premium=True, only_interest=True),
+                _row(2, interests="games", wait=5, seen_before=True),
+                _row(3, interests="games", wait=5),
+            ]
+        )
+        self.assertEqual(pick_candidate(columns, user_mask=0, user_only=False, user_wait_seconds=5), 3)
+        self.assertIsNone(
+            pick_candidate(columns, user_mask=interests_mask("music"), user_only=False, user_wait_seconds=5)
+        )
+
+    @unittest.skipIf(match_scoring.np is None, "numpy is not installed")
+    def test_numpy_and_python_paths_agree(self) -> None:
+        rng = random.Random(7)
+        size = match_scoring.VECTORIZE_MIN_CANDIDATES * 4
+        columns = CandidateColumns(
+            user_ids=list(range(size)),
+            masks=[rng.randrange(1 << len(INTEREST_CODES)) * rng.randrange(2) for _ in range(size)],
+            premium=[rng.random() < 0.2 for _ in range(size)],
+            only_interest=[rng.random() < 0.05 for _ in range(size)],
+            wait_seconds=[rng.randrange(300) for _ in range(size)],
+            seen_before=[rng.random() < 0.5 for _ in range(size)],
+        )
+        for user_mask in (0, 1, 0b1010, 0b1111111):
+            for needs in (False, True):
+                self.assertEqual(
+                    match_scoring._pick_index_numpy(columns, user_mask, needs),
+                    match_scoring._pick_index_python(columns, user_mask, needs),
+                )
+
+    def test_batch_plan_pairs_everyone_where_greedy_stalls(self) -> None:
+        # B-C is the single best pair, but taking it strands A and D.
+        users = [
+            _row(1, interests="music"),
+            _row(2, interests="music|games", premium=True),
+            _row(3, interests="games|movies", premium=True),
+            _row(4, interests="movies"),
+        ]
+        batch = [(user, [other for other in users if other is not user]) for user in users]
+
+        self.assertEqual(sorted(_plan_batch_matches(batch)), [(1, 2), (3, 4)])
+        self.assertEqual(
+            _greedy_plan({(1, 2): (1, 245), (2, 3): (1, 250), (3, 4): (1, 245)}, {1: 0, 2: 1, 3: 2, 4: 3}),
+            [(2, 3)],
+        )
+
+    def test_weighted_matching_agrees_with_brute_force(self) -> None:
+        rng = random.Random(11)
+
+        def best_total(vertices: list[int], weights: dict[tuple[int, int], int]) -> int:
+            if not vertices:
+                return 0
+            first, rest = vertices[0], vertices[1:]
+            best = best_total(rest, weights)
+            for index, other in enumerate(rest):
+                if (first, other) in weights:
+                    best = max(best, weights[first, other] + best_total(rest[:index] + rest[index + 1:], weights))
+            return best
+
+        for _ in range(300):
+            size = rng.randint(2, 8)
+            edges = [
+                (i, j, rng.randint(0, 50))
+                for i, j in itertools.combinations(range(size), 2)
+                if rng.random() < 0.5
+            ]
+            if not edges:
+                continue
+            weights = {(i, j): weight for i, j, weight in edges}
+            mate = max_weight_matching(edges)
+            self.assertTrue(all(mate[partner] == vertex for vertex, partner in enumerate(mate) if partner >= 0))
+            total = sum(weights[vertex, partner] for vertex, partner in enumerate(mate) if vertex < partner)
+            self.assertEqual(total, best_total(list(range(size)), weights))
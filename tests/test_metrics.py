@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Chat, Message, Update, User
+
+from src.bot.middlewares.metrics import install_dispatcher_metrics
+from src.db.database import Database
+from src.db.slow_queries import param_shape
+from src.metrics import MetricsRegistry
+
+
+def _message_update(update_id: int, text: str) -> Update:
+    user = User(id=7, is_bot=False, first_name="Tester")
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=7, type="private"),
+            from_user=user,
+            text=text,
+        ),
+    )
+
+
+async def ping(message: Message) -> None:
+    return None
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_histogram_summary_and_prometheus_output(self) -> None:
+        metrics = MetricsRegistry(enabled=True, buckets=(0.01, 0.1, 1.0))
+        for seconds in (0.005, 0.005, 0.05, 2.0):
+            metrics.observe("query", "SELECT_USER", seconds)
+
+        summary = metrics.summary("query", "SELECT_USER")
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual(summary["p50_ms"], 10.0)
+        self.assertEqual(summary["max_ms"], 2000.0)
+
+        text = metrics.render_prometheus()
+        self.assertIn('ghostchat_query_seconds_bucket{name="SELECT_USER",le="0.01"} 2', text)
+        self.assertIn('ghostchat_query_seconds_bucket{name="SELECT_USER",le="+Inf"} 4', text)
+        self.assertIn('ghostchat_query_seconds_count{name="SELECT_USER"} 4', text)
+
+
+class MetricsHooksTests(unittest.IsolatedAsyncioTestCase):
+    async def test_database_times_queries_by_constant_name_only_when_enabled(self) -> None:
+        plain = Database(":memory:", metrics=MetricsRegistry())
+        self.assertNotIn("_fetchone_impl", vars(plain))
+
+        metrics = MetricsRegistry(enabled=True)
+        db = Database(":memory:", metrics=metrics)
+        await db.connect()
+        try:
+            await db.create_user_if_missing(1)
+            await db.get_user(1)
+        finally:
+            await db.close()
+
+        self.assertIn("SELECT_USER", metrics.series("query"))
+        self.assertTrue(any(name.startswith("INSERT_USER") for name in metrics.series("query")))
+
+    async def test_dispatcher_middlewares_time_updates_and_handlers(self) -> None:
+        metrics = MetricsRegistry(enabled=True)
+        dp = Dispatcher()
+        install_dispatcher_metrics(dp, metrics)
+        router = Router()
+        router.message()(ping)
+        dp.include_router(router)
+        bot = Bot(token="42:TEST")
+        try:
+            await dp.feed_update(bot, _message_update(1, "hello"))
+        finally:
+            await bot.session.close()
+
+        self.assertEqual(metrics.summary("update", "message")["count"], 1)
+        self.assertEqual(metrics.summary("handler", "test_metrics.ping")["count"], 1)
+
+    async def test_slow_queries_are_logged_once_with_their_plan(self) -> None:
+        db = Database(":memory:", slow_query_ms=0.0001)
+        await db.connect()
+        try:
+            await db.create_user_if_missing(1)
+            await db.fetchone("SELECT * FROM users WHERE user_id = ?", (1,))
+            await db.fetchone("SELECT * FROM users WHERE user_id = ?", (2,))
+            await asyncio.gather(*db._plan_tasks)
+        finally:
+            await db.close()
+
+        totals = {name: count for name, count, _ in db.slow_queries.totals()}
+        self.assertEqual(totals["SELECT_USER"], 2)
+        entry = next(entry for entry in db.slow_queries.entries() if entry.name == "SELECT_USER")
+        self.assertEqual(entry.param_shape, "(int)")
+        self.assertIn("users", entry.plan)
+        self.assertEqual(param_shape((1, None, "x")), "(int, null, str)")
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from time import monotonic
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from src.bot.middlewares.outbound import OutboundSchedulerMiddleware
+from src.bot.utils.outbound import LANE_BROADCAST, LANE_RELAY, OutboundScheduler, send_lane
+from src.metrics import MetricsRegistry
+
+
+class OutboundSchedulerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_relay_lane_is_granted_before_queued_broadcasts(self) -> None:
+        scheduler = OutboundScheduler(global_rate=20, chat_rate=100, chat_burst=10)
+        order: list[str] = []
+
+        async def send(name: str, chat_id: int, lane: str) -> None:
+            await scheduler.acquire(chat_id, lane)
+            order.append(name)
+
+        try:
+            tasks = [asyncio.create_task(send(f"b{index}", 1000 + index, LANE_BROADCAST)) for index in range(30)]
+            tasks.append(asyncio.create_task(send("relay", 1, LANE_RELAY)))
+            await asyncio.gather(*tasks)
+        finally:
+            await scheduler.close()
+
+        self.assertEqual(order[0], "relay")
+        self.assertEqual(scheduler.stats()["granted"], {"relay": 1, "match": 0, "broadcast": 30})
+
+    async def test_per_chat_bucket_spaces_sends_to_one_chat(self) -> None:
+        scheduler = OutboundScheduler(global_rate=1000, chat_rate=20, chat_burst=1, lane_limit=1)
+        started_at = monotonic()
+        try:
+            await asyncio.gather(*(scheduler.acquire(7, LANE_RELAY) for _ in range(4)))
+        finally:
+            await scheduler.close()
+
+        self.assertGreaterEqual(monotonic() - started_at, 0.14)
+        self.assertEqual(scheduler.stats()["blocked"][LANE_RELAY], 3)
+
+    async def test_middleware_retries_after_flood_wait_and_pauses_broadcasts(self) -> None:
+        metrics = MetricsRegistry(enabled=True)
+        scheduler = OutboundScheduler(global_rate=100, metrics=metrics)
+        middleware = OutboundSchedulerMiddleware(scheduler)
+        calls: list[str] = []
+
+        async def make_request(bot, method):
+            calls.append(type(method).__name__)
+            if len(calls) == 1:
+                raise TelegramRetryAfter(method=method, message="Flood control", retry_after=0)
+            return "ok"
+
+        try:
+            with send_lane(LANE_RELAY):
+                self.assertEqual(await middleware(make_request, None, SendMessage(chat_id=5, text="hi")), "ok")
+            self.assertEqual(await middleware(make_request, None, GetMe()), "ok")
+        finally:
+            await scheduler.close()
+
+        self.assertEqual(calls, ["SendMessage", "SendMessage", "GetMe"])
+        self.assertEqual(scheduler.stats()["retry_after"], 1)
+        self.assertEqual(metrics.summary("send_wait", LANE_RELAY)["count"], 2)
+        self.assertIn("ghostchat_send_retry_after_total 1", metrics.render_prometheus())
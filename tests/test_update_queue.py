@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+
+from src.bot.utils.update_queue import UpdateQueue, update_user_key
+from src.metrics import MetricsRegistry
+
+
+def _message(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "from": {"id": user_id}, "chat": {"id": user_id}, "text": "hi"},
+    }
+
+
+class UpdateQueueTests(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_of_one_user_run_in_order_while_users_run_concurrently(self) -> None:
+        handled: list[tuple[int, int]] = []
+        running = 0
+        max_running = 0
+
+        async def process(payload: dict) -> None:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            # Earlier updates sleep longer, so any reordering within a user would show up.
+            await asyncio.sleep(0.02 if payload["update_id"] % 3 == 0 else 0.001)
+            handled.append((update_user_key(payload), payload["update_id"]))
+            running -= 1
+
+        queue = UpdateQueue(process, workers=4)
+        for update_id in range(30):
+            self.assertTrue(await queue.put(_message(update_id, 100 + update_id % 4)))
+        await queue.close()
+
+        for user_id in range(100, 104):
+            self.assertEqual(
+                [update_id for key, update_id in handled if key == user_id],
+                [update_id for update_id in range(30) if 100 + update_id % 4 == user_id],
+            )
+        self.assertGreater(max_running, 1)
+        self.assertEqual(queue.stats()["pending"], 0)
+
+    async def test_full_queue_sheds_updates_and_reports_them(self) -> None:
+        release = asyncio.Event()
+
+        async def process(payload: dict) -> None:
+            await release.wait()
+
+        metrics = MetricsRegistry(enabled=True)
+        queue = UpdateQueue(process, workers=2, limit=3, metrics=metrics)
+        accepted = [await queue.put(_message(update_id, update_id)) for update_id in range(5)]
+        release.set()
+        await queue.close()
+
+        self.assertEqual(accepted, [True, True, True, False, False])
+        self.assertEqual(metrics.gauges()["update_queue_shed_total"], 2)
+        self.assertFalse(await queue.put(_message(9, 9)))
+
+    async def test_a_stuck_user_does_not_hold_up_unrelated_users(self) -> None:
+        stuck = asyncio.Event()
+        handled: list[int] = []
+        running = 0
+        max_running = 0
+
+        async def process(payload: dict) -> None:
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            if update_user_key(payload) == 1:
+                await stuck.wait()
+            else:
+                await asyncio.sleep(0.001)
+            handled.append(payload["update_id"])
+            running -= 1
+
+        queue = UpdateQueue(process, workers=2)
+        # Users 1, 3, 5 and 7 would all have shared one of two fixed workers.
+        for update_id, user_id in enumerate((1, 1, 3, 5, 7, 3)):
+            self.assertTrue(await queue.put(_message(update_id, user_id)))
+        for _ in range(50):
+            if len(handled) == 4:
+                break
+            await asyncio.sleep(0.005)
+
+        self.assertEqual(handled, [2, 3, 4, 5])
+        self.assertEqual(queue.pending, 2)
+        stuck.set()
+        await queue.close()
+        self.assertEqual(handled[4:], [0, 1])
+        self.assertEqual(max_running, 2)
+
+    def test_user_key_prefers_the_sender_and_falls_back_to_the_update_id(self) -> None:
+        self.assertEqual(update_user_key({"update_id": 1, "callback_query": {"id": "x", "from": {"id": 7}}}), 7)
+        self.assertEqual(
+            update_user_key({"update_id": 2, "my_chat_member": {"chat": {"id": 8}, "from": {"id": 8}}}),
+            8,
+        )
+        self.assertEqual(update_user_key({"update_id": 3, "poll": {"id": "p"}}), 3)